@@ -0,0 +1,195 @@
+import os
+import sys
+import json
+import shutil
+import argparse
+import tempfile
+import threading
+import statistics
+import time
+from functools import partial
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+import xarray as xr
+from shapely.geometry import Point
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import file_utils
+import cache_manager
+from grid_index import build_region_index, get_field_2d
+from region_stats import summarize_region
+from synthetic_data import GO5KM_GRID, generate_run, write_netcdf, grid_axes
+
+try:
+    import main
+except ImportError as e:
+    # Plots e find_extreme_* dependem de cartopy/geopandas
+    print(f"AVISO: main.py indisponível ({e}), etapas dependentes serão puladas")
+    main = None
+
+BASELINES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines.json")
+DEFAULT_TOLERANCE = 0.25
+BENCH_DATE = "20250101"
+
+# Polígono aproximado de Goiânia (o shapefile real não é necessário)
+CITY_CENTER = Point(-49.25, -16.68)
+CITY_POLYGON = CITY_CENTER.buffer(0.35)
+
+
+class _QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def start_file_server(directory):
+    """Sobe um servidor HTTP local servindo os arquivos sintéticos."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), partial(_QuietHandler, directory=directory))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def build_stages(workdir, hours):
+    """
+    Prepara os dados sintéticos e retorna as etapas a medir.
+
+    Returns:
+        tuple: ({nome: (setup ou None, função medida)}, servidor HTTP local);
+            etapas indisponíveis são omitidas
+    """
+    nc_file = write_netcdf(os.path.join(workdir, "saida_00.nc"), BENCH_DATE, 12)
+    ctl_path, _ = generate_run(os.path.join(workdir, "server"), BENCH_DATE, hours)[0]
+    lats, lons = grid_axes()
+    centro = CITY_POLYGON.centroid
+
+    with xr.open_dataset(nc_file) as ds:
+        field = get_field_2d(ds, "t2mj").values
+    flat = build_region_index(lats, lons, CITY_POLYGON, centro, 100)
+    var_info = {"unit": "°C", "brams_name": "t2mj"}
+
+    stages = {
+        "mask_build": (None, lambda: build_region_index(lats, lons, CITY_POLYGON, centro)),
+        "distance_filter": (None, lambda: build_region_index(lats, lons, CITY_POLYGON, centro, 100)),
+        "summarize_region": (None, lambda: summarize_region(field, lats, lons, flat, "temperature",
+                                                            var_info, "Goiânia", centro)),
+    }
+
+    if main is not None:
+        municipio_info = {"nome": "Goiânia", "poligono": CITY_POLYGON, "centro": centro, "alerts": {}}
+        stages["find_extreme_variables"] = (
+            None, lambda: main.find_extreme_variables(nc_file, municipio_info, None, 100))
+        stages["plot_temperature"] = (
+            None, lambda: main.plot_temperature(nc_file, BENCH_DATE, os.path.join(workdir, "t.png")))
+        stages["plot_humidity"] = (
+            None, lambda: main.plot_humidity(nc_file, BENCH_DATE, os.path.join(workdir, "h.png")))
+        if shutil.which("cdo"):
+            stages["convert_to_netcdf"] = (
+                None, lambda: main.convert_to_netcdf(ctl_path, os.path.join(workdir, "conv.nc")))
+
+    # Downloads contra um servidor local, sem depender da rede
+    server = start_file_server(os.path.join(workdir, "server"))
+    file_utils.CEMPA_BASE_URL = f"http://127.0.0.1:{server.server_address[1]}/"
+    client_dir = os.path.join(workdir, "client")
+    os.makedirs(client_dir, exist_ok=True)
+
+    def reset_downloads():
+        # Apaga também o índice do cache; senão as repetições só consultariam o SQLite
+        shutil.rmtree(os.path.join(client_dir, "tmp_files"), ignore_errors=True)
+        shutil.rmtree(os.path.join(client_dir, "files"), ignore_errors=True)
+        cache_manager._default_cache = None
+        os.chdir(client_dir)
+
+    stages["download"] = (reset_downloads, lambda: file_utils.download_cempa_files(BENCH_DATE, hours))
+    return stages, server
+
+
+def measure(setup, func, repeat):
+    """Executa a etapa repeat vezes e retorna a mediana e o mínimo em segundos."""
+    times = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return {"median": statistics.median(times), "min": min(times), "repeat": repeat}
+
+
+def compare_with_baselines(results, baselines, tolerance):
+    """Retorna as etapas cuja mediana excedeu a baseline além da tolerância."""
+    regressions = []
+    for name, result in results.items():
+        baseline = baselines.get(name)
+        if baseline is None:
+            print(f"{name:<24} {result['median'] * 1000:10.2f} ms   (sem baseline)")
+            continue
+        ratio = result["median"] / baseline
+        status = "REGRESSÃO" if ratio > 1 + tolerance else "ok"
+        print(f"{name:<24} {result['median'] * 1000:10.2f} ms   baseline {baseline * 1000:10.2f} ms   "
+              f"{ratio:5.2f}x {status}")
+        if status != "ok":
+            regressions.append(name)
+    return regressions
+
+
+def run(repeat=5, only=None, tolerance=DEFAULT_TOLERANCE, update_baselines=False, output=None, hours=4):
+    """
+    Executa o benchmark completo.
+
+    Returns:
+        int: Código de saída (1 se houver regressão)
+    """
+    cwd = os.getcwd()
+    workdir = tempfile.mkdtemp(prefix="cempa_bench_")
+    server = None
+    try:
+        print(f"Gerando dados sintéticos ({GO5KM_GRID['nx']}x{GO5KM_GRID['ny']}) em {workdir}...")
+        stages, server = build_stages(workdir, range(hours))
+        results = {}
+        for name, (setup, func) in stages.items():
+            if only and name not in only:
+                continue
+            results[name] = measure(setup, func, repeat)
+            os.chdir(cwd)
+    finally:
+        os.chdir(cwd)
+        if server is not None:
+            server.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    baselines = {}
+    if os.path.exists(BASELINES_PATH):
+        with open(BASELINES_PATH) as f:
+            baselines = json.load(f)
+
+    print(f"\n{'='*50}\nResultados (mediana de {repeat} execuções)\n{'='*50}")
+    regressions = compare_with_baselines(results, baselines, tolerance)
+
+    if output:
+        with open(output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if update_baselines:
+        baselines.update({name: result["median"] for name, result in results.items()})
+        with open(BASELINES_PATH, "w") as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+        print(f"\nBaselines atualizadas em {BASELINES_PATH}")
+        return 0
+
+    if regressions:
+        print(f"\nRegressões detectadas: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks do pipeline de alertas")
+    parser.add_argument("--repeat", type=int, default=5, help="Execuções por etapa")
+    parser.add_argument("--only", nargs="*", help="Executa apenas as etapas indicadas")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="Piora relativa tolerada antes de falhar (0.25 = 25%%)")
+    parser.add_argument("--hours", type=int, default=4, help="Horas baixadas na etapa de download")
+    parser.add_argument("--update-baselines", action="store_true", help="Grava as medianas como baseline")
+    parser.add_argument("--output", help="Salva os resultados em JSON")
+    args = parser.parse_args()
+
+    sys.exit(run(args.repeat, args.only, args.tolerance, args.update_baselines, args.output, args.hours))
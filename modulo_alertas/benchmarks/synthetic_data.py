@@ -0,0 +1,133 @@
+import os
+import datetime
+import numpy as np
+import xarray as xr
+
+# Grade aproximada do domínio Go5km (~5 km de resolução sobre Goiás)
+GO5KM_GRID = {
+    "nx": 300,
+    "ny": 300,
+    "lon0": -56.0,
+    "lat0": -23.0,
+    "step": 0.05
+}
+
+UNDEF = -9.99e+33
+
+CTL_TEMPLATE = """DSET ^{prefix}.gra
+OPTIONS little_endian
+UNDEF {undef}
+TITLE Dados sinteticos Go5km para benchmarks
+XDEF {nx} LINEAR {lon0} {step}
+YDEF {ny} LINEAR {lat0} {step}
+ZDEF 1 LEVELS 1000
+TDEF 1 LINEAR {hour:02d}:00Z{day:02d}{month}{year} 1hr
+VARS 2
+t2mj 0 99 Temperatura a 2m [C]
+rh 1 99 Umidade relativa [%]
+ENDVARS
+"""
+
+
+def file_prefix(date, hour):
+    """Nome base dos arquivos no mesmo padrão do servidor do CEMPA."""
+    return f"Go5km-A-{date[:4]}-{date[4:6]}-{date[6:8]}-{hour:02d}0000-g1"
+
+
+def grid_axes(grid=None):
+    grid = grid or GO5KM_GRID
+    lats = grid["lat0"] + grid["step"] * np.arange(grid["ny"])
+    lons = grid["lon0"] + grid["step"] * np.arange(grid["nx"])
+    return lats, lons
+
+
+def make_fields(date, hour, grid=None, seed=None):
+    """
+    Gera campos sintéticos de temperatura (°C) e umidade relativa (%) com
+    variação espacial e ciclo diurno plausíveis.
+
+    Returns:
+        tuple: (lats, lons, t2mj, rh) com os campos em float32 de forma (lat, lon)
+    """
+    lats, lons = grid_axes(grid)
+    rng = np.random.default_rng(seed if seed is not None else int(date) + hour)
+    lon_grid, lat_grid = np.meshgrid(lons, lats)
+
+    diurnal = np.sin((hour - 9) / 24 * 2 * np.pi)
+    t2mj = (26 + 7 * diurnal
+            + 3 * np.sin(lon_grid * 1.3) * np.cos(lat_grid * 0.9)
+            + rng.normal(0, 0.8, lon_grid.shape)).astype(np.float32)
+    rh = np.clip(70 - 25 * diurnal
+                 + 10 * np.cos(lon_grid * 0.7 + lat_grid)
+                 + rng.normal(0, 3, lon_grid.shape), 5, 100).astype(np.float32)
+    return lats, lons, t2mj, rh
+
+
+def write_ctl_gra(directory, date, hour, grid=None):
+    """
+    Escreve um par CTL/GRA no layout do BRAMS (float32 little-endian, t2mj e rh).
+
+    Returns:
+        tuple: (ctl_path, gra_path)
+    """
+    grid = grid or GO5KM_GRID
+    os.makedirs(directory, exist_ok=True)
+    prefix = file_prefix(date, hour)
+    ctl_path = os.path.join(directory, f"{prefix}.ctl")
+    gra_path = os.path.join(directory, f"{prefix}.gra")
+
+    _, _, t2mj, rh = make_fields(date, hour, grid)
+    with open(gra_path, "wb") as f:
+        t2mj.astype("<f4").tofile(f)
+        rh.astype("<f4").tofile(f)
+
+    month = datetime.date(int(date[:4]), int(date[4:6]), 1).strftime("%b").upper()
+    with open(ctl_path, "w") as f:
+        f.write(CTL_TEMPLATE.format(prefix=prefix, undef=UNDEF, hour=hour, day=int(date[6:8]),
+                                    month=month, year=date[:4], **grid))
+    return ctl_path, gra_path
+
+
+def write_netcdf(path, date, hour, grid=None):
+    """Escreve um NetCDF equivalente ao gerado por convert_to_netcdf (cdo import_binary)."""
+    lats, lons, t2mj, rh = make_fields(date, hour, grid)
+    time = np.array([np.datetime64(f"{date[:4]}-{date[4:6]}-{date[6:8]}T{hour:02d}:00")])
+
+    ds = xr.Dataset(
+        {
+            "t2mj": (("time", "lat", "lon"), t2mj[np.newaxis]),
+            "rh": (("time", "lev_2", "lat", "lon"), rh[np.newaxis, np.newaxis]),
+        },
+        coords={"time": time, "lev_2": [1000.0], "lat": lats, "lon": lons},
+    )
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    ds.to_netcdf(path)
+    return path
+
+
+def generate_run(directory, date, hours=range(24), grid=None):
+    """
+    Gera uma rodada completa no layout do servidor: {directory}/{date}00/<arquivos>.
+
+    Returns:
+        list: Pares (ctl_path, gra_path)
+    """
+    run_dir = os.path.join(directory, f"{date}00")
+    return [write_ctl_gra(run_dir, date, hour, grid) for hour in hours]
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Gera arquivos BRAMS sintéticos no formato Go5km")
+    parser.add_argument("output_dir")
+    parser.add_argument("--date", default=datetime.datetime.now().strftime("%Y%m%d"))
+    parser.add_argument("--hours", type=int, default=24)
+    parser.add_argument("--netcdf", action="store_true", help="Gera também saida_{hora}.nc")
+    args = parser.parse_args()
+
+    for ctl_path, _ in generate_run(args.output_dir, args.date, range(args.hours)):
+        print(f"Gerado: {ctl_path}")
+    if args.netcdf:
+        for hour in range(args.hours):
+            print(f"Gerado: {write_netcdf(os.path.join(args.output_dir, f'saida_{hour:02d}.nc'), args.date, hour)}")
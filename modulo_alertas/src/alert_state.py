@@ -0,0 +1,183 @@
+import os
+import time
+import sqlite3
+from contextlib import closing
+
+ALERT_STATE_DB = os.environ.get("ALERT_STATE_DB", "./files/alert_state.db")
+
+# Quanto o valor precisa voltar para dentro do limiar para o alerta ser encerrado
+HYSTERESIS = {
+    "temperature": 1.0,   # °C
+    "umidade": 3.0,       # pontos percentuais
+    "indice_calor": 1.0,
+    "ponto_orvalho": 1.0,
+    "risco_fogo": 0.2
+}
+# Excesso adicional sobre o limiar que eleva o alerta de nível
+ESCALATION_STEP = {
+    "temperature": 2.0,
+    "umidade": 5.0,
+    "indice_calor": 3.0,
+    "ponto_orvalho": 2.0,
+    "risco_fogo": 0.5
+}
+# Um alerta encerrado que volta a disparar dentro deste intervalo é reativado sem novo evento
+COOLDOWN_SECONDS = float(os.environ.get("ALERT_COOLDOWN_HOURS", 6)) * 3600
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS alert_state (
+    city TEXT NOT NULL,
+    variable TEXT NOT NULL,
+    limit_type TEXT NOT NULL,
+    threshold REAL NOT NULL,
+    active INTEGER NOT NULL,
+    level INTEGER NOT NULL,
+    last_value REAL,
+    raised_at REAL,
+    cleared_at REAL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (city, variable, limit_type, threshold)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_alert_state_active ON alert_state (active);
+"""
+
+
+def get_connection(db_path=None):
+    db_path = db_path or ALERT_STATE_DB
+    directory = os.path.dirname(db_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def _excess(obs):
+    """Quanto o valor ultrapassa o limiar (negativo quando está dentro do limite)."""
+    if obs["limite"] == "max":
+        return obs["valor"] - obs["limiar"]
+    return obs["limiar"] - obs["valor"]
+
+
+def alert_level(obs):
+    """Nível do alerta (1, 2, ...) conforme o excesso sobre o limiar."""
+    step = ESCALATION_STEP.get(obs["tipo_variavel"], float("inf"))
+    return 1 + int(_excess(obs) // step)
+
+
+def city_observations(resultados, alerts_by_city):
+    """
+    Converte resultados de summarize_region em observações para update_alert_state.
+
+    Args:
+        resultados (list): Resultados no formato de find_extreme_*
+        alerts_by_city (dict): {cidade: {variável: {"max": ..., "min": ...}}}
+    """
+    for r in resultados:
+        if not r:
+            continue
+        limites = alerts_by_city.get(r["municipio"], {}).get(r["tipo_variavel"], {})
+        for limite, extremo in (("max", "maximo"), ("min", "minimo")):
+            if limite in limites:
+                yield {
+                    "city": r["municipio"],
+                    "tipo_variavel": r["tipo_variavel"],
+                    "limite": limite,
+                    "limiar": limites[limite],
+                    "valor": r[extremo]["valor"],
+                }
+
+
+def update_alert_state(observations, now=None, cooldown=None, db_path=None):
+    """
+    Atualiza o estado dos alertas e retorna apenas as mudanças.
+
+    Cada observação é um dicionário com city, tipo_variavel, limite ("max"/"min"),
+    limiar e valor (campos extras são repassados no evento). Para cada chave
+    (city, variável, limite, limiar):
+
+    - "novo": o limiar foi ultrapassado e não havia alerta ativo (nem um
+      encerrado há menos de cooldown segundos)
+    - "escalado": o alerta ativo subiu de nível
+    - "encerrado": o valor voltou para dentro do limiar além da histerese
+
+    Observações sem alerta ativo e sem disparo são descartadas sem consulta ao
+    banco; as demais custam uma leitura pela chave primária. A atualização roda
+    em uma transação BEGIN IMMEDIATE, então execuções simultâneas não geram
+    eventos duplicados.
+
+    Returns:
+        list: Observações que geraram evento, com as chaves "evento" e "nivel"
+    """
+    now = now or time.time()
+    cooldown = COOLDOWN_SECONDS if cooldown is None else cooldown
+    eventos = []
+
+    with closing(get_connection(db_path)) as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            active = {
+                (row["city"], row["variable"], row["limit_type"], row["threshold"])
+                for row in conn.execute(
+                    "SELECT city, variable, limit_type, threshold FROM alert_state WHERE active = 1")
+            }
+
+            for obs in observations:
+                key = (obs["city"], obs["tipo_variavel"], obs["limite"], float(obs["limiar"]))
+                excess = _excess(obs)
+                triggered = excess > 0
+                if not triggered and key not in active:
+                    continue
+
+                state = conn.execute(
+                    "SELECT * FROM alert_state WHERE city = ? AND variable = ? AND limit_type = ? "
+                    "AND threshold = ?", key).fetchone()
+                level = alert_level(obs) if triggered else 0
+                evento = None
+
+                if state is None or not state["active"]:
+                    if not triggered:
+                        continue
+                    recent = state is not None and state["cleared_at"] and now - state["cleared_at"] < cooldown
+                    if not recent:
+                        evento = "novo"
+                    raised_at = state["raised_at"] if recent else now
+                    conn.execute(
+                        "INSERT OR REPLACE INTO alert_state (city, variable, limit_type, threshold, active, "
+                        "level, last_value, raised_at, cleared_at, updated_at) "
+                        "VALUES (?, ?, ?, ?, 1, ?, ?, ?, NULL, ?)",
+                        (*key, level, obs["valor"], raised_at, now))
+                    active.add(key)
+                elif -excess >= HYSTERESIS.get(obs["tipo_variavel"], 0):
+                    evento = "encerrado"
+                    conn.execute(
+                        "UPDATE alert_state SET active = 0, level = 0, last_value = ?, cleared_at = ?, "
+                        "updated_at = ? WHERE city = ? AND variable = ? AND limit_type = ? AND threshold = ?",
+                        (obs["valor"], now, now, *key))
+                    active.discard(key)
+                else:
+                    if level > state["level"]:
+                        evento = "escalado"
+                    conn.execute(
+                        "UPDATE alert_state SET level = MAX(level, ?), last_value = ?, updated_at = ? "
+                        "WHERE city = ? AND variable = ? AND limit_type = ? AND threshold = ?",
+                        (level, obs["valor"], now, *key))
+
+                if evento:
+                    eventos.append(dict(obs, evento=evento, nivel=level))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+    return eventos
+
+
+def get_active_alerts(db_path=None, prefix=""):
+    """Lista os alertas ativos no momento (opcionalmente só as chaves que começam com `prefix`)."""
+    with closing(get_connection(db_path)) as conn:
+        rows = conn.execute(
+            "SELECT * FROM alert_state WHERE active = 1 AND substr(city, 1, ?) = ? ORDER BY city, variable",
+            (len(prefix), prefix)).fetchall()
+    return [dict(row) for row in rows]
@@ -0,0 +1,209 @@
+import os
+import argparse
+import time
+from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+import xarray as xr
+from file_utils import download_cempa_files
+from cache_manager import get_cache
+from grid_index import build_region_index, get_field_2d, region_window, union_window, window_indices, read_window
+from region_stats import summarize_region
+from results_store import save_results, get_processed_hours
+from main import CITIES, VARIABLES, convert_to_netcdf, read_municipios_shapefile, update_cities_polygons
+
+BACKFILL_DIR = "./files/backfill"
+MAX_DISTANCE_KM = 100
+
+# Estado de cada processo: cidades recebidas do pai e índices da grade já construídos
+_worker_state = {}
+
+
+def _init_worker(cities):
+    _worker_state["cities"] = cities
+    _worker_state["grid_key"] = None
+    _worker_state["regions"] = None
+
+
+def _get_regions(lats, lons):
+    """
+    Constrói os índices das cidades uma vez por processo (e de novo só se a grade mudar).
+
+    Returns:
+        tuple: (janela que cobre todas as cidades ou None,
+            {cidade: (índices planos dentro da janela, centro)})
+    """
+    grid_key = (lats.size, lons.size, float(lats[0]), float(lats[-1]), float(lons[0]), float(lons[-1]))
+    if _worker_state["grid_key"] != grid_key:
+        shape = (lats.size, lons.size)
+        flats = {
+            city_name: build_region_index(lats, lons, info["polygon"], info["centro"], MAX_DISTANCE_KM)
+            for city_name, info in _worker_state["cities"].items()
+        }
+        window = union_window(region_window(flat, shape) for flat in flats.values())
+        regions = {}
+        if window is not None:
+            regions = {
+                city_name: (window_indices(flat, shape, window), _worker_state["cities"][city_name]["centro"])
+                for city_name, flat in flats.items()
+            }
+        _worker_state["regions"] = (window, regions)
+        _worker_state["grid_key"] = grid_key
+    return _worker_state["regions"]
+
+
+def process_hour(date, hour, keep_files=False):
+    """
+    Baixa, converte e reduz uma única hora.
+
+    Apenas um campo 2D fica em memória por vez e os arquivos são removidos ao
+    final, de modo que memória e disco não crescem com o tamanho do período.
+
+    Returns:
+        tuple: (data, hora, lista de resultados ou None)
+    """
+    files = download_cempa_files(date, [hour])
+    if not files:
+        return date, hour, None
+
+    ctl_path, gra_path = files[0]
+    os.makedirs(BACKFILL_DIR, exist_ok=True)
+    output_nc = os.path.join(BACKFILL_DIR, f"saida_{date}_{hour:02d}.nc")
+
+    converted = False
+    try:
+        converted = convert_to_netcdf(ctl_path, output_nc)
+        if not converted:
+            return date, hour, None
+        if keep_files:
+            get_cache().add(output_nc)
+
+        resultados = []
+        with xr.open_dataset(output_nc) as ds:
+            lats = ds.lat.values
+            lons = ds.lon.values
+            window, regions = _get_regions(lats, lons)
+            if window is None:
+                return date, hour, resultados
+
+            # Apenas o retângulo que cobre as cidades é lido de cada variável
+            y0, y1, x0, x1 = window
+            lats = lats[y0:y1]
+            lons = lons[x0:x1]
+
+            for var_type, var_info in VARIABLES.items():
+                if var_info["brams_name"] not in ds.data_vars:
+                    continue
+                field = read_window(get_field_2d(ds, var_info["brams_name"]), window)
+                for city_name, (flat, centro) in regions.items():
+                    resultado = summarize_region(field, lats, lons, flat, var_type, var_info,
+                                                 city_name, centro)
+                    if resultado:
+                        resultados.append(resultado)
+                del field
+        return date, hour, resultados
+    finally:
+        cache = get_cache()
+        for path in (ctl_path, gra_path, output_nc):
+            # Sem conversão, o .ctl/.gra (ausente ou corrompido) sai do cache para ser baixado de novo
+            if keep_files and converted:
+                cache.archive(path)
+            else:
+                cache.discard(path)
+
+
+def iter_tasks(start_date, end_date, hours, skip_existing):
+    """Gera os pares (data, hora) do período, sem materializar a lista inteira."""
+    done = get_processed_hours(start_date, end_date) if skip_existing else set()
+    current = datetime.strptime(start_date, "%Y%m%d")
+    end = datetime.strptime(end_date, "%Y%m%d")
+    while current <= end:
+        date = current.strftime("%Y%m%d")
+        for hour in hours:
+            if (date, hour) in done:
+                continue
+            yield date, hour
+        current += timedelta(days=1)
+
+
+def run_backfill(start_date, end_date, hours=None, workers=None, keep_files=False, skip_existing=True):
+    """
+    Reprocessa um período e grava os resultados no banco de resultados.
+
+    As horas são distribuídas entre os processos com um número limitado de
+    tarefas em andamento, então o consumo de memória é constante
+    independentemente do tamanho do período.
+
+    Args:
+        start_date (str): Data inicial YYYYMMDD
+        end_date (str): Data final YYYYMMDD (inclusiva)
+        hours (list, optional): Horas a processar. Se None, processa 0-23.
+        workers (int, optional): Número de processos. Se None, usa todos os núcleos.
+        keep_files (bool): Mantém os arquivos baixados e convertidos
+        skip_existing (bool): Pula horas que já possuem resultados gravados
+    """
+    hours = list(hours) if hours is not None else list(range(24))
+    workers = workers or os.cpu_count() or 1
+
+    municipios = read_municipios_shapefile()
+    if municipios is None or not update_cities_polygons(municipios):
+        print("Não foi possível carregar os polígonos dos municípios. Encerrando backfill.")
+        return False
+
+    cities = {
+        name: {"polygon": info["polygon"], "centro": info["centro"]}
+        for name, info in CITIES.items() if info["polygon"] is not None
+    }
+
+    max_in_flight = workers * 2
+    processed = failed = 0
+    pending = set()
+
+    def collect(done):
+        nonlocal processed, failed
+        for future in done:
+            try:
+                date, hour, resultados = future.result()
+            except Exception as e:
+                print(f"Erro ao processar hora no backfill: {e}")
+                failed += 1
+                continue
+            if resultados is None:
+                failed += 1
+                continue
+            save_results(date, hour, resultados)
+            processed += 1
+            print(f"Backfill: {date} {hour:02d}:00 concluído ({len(resultados)} resultado(s))")
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(cities,)) as executor:
+        for date, hour in iter_tasks(start_date, end_date, hours, skip_existing):
+            if len(pending) >= max_in_flight:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+            pending.add(executor.submit(process_hour, date, hour, keep_files))
+        collect(wait(pending).done)
+
+    print(f"\nBackfill finalizado: {processed} hora(s) processada(s), {failed} com falha")
+    return failed == 0
+
+
+def parse_hours(value):
+    """Converte "0-23" ou "0,6,12,18" em uma lista de horas."""
+    if "-" in value:
+        start, end = value.split("-")
+        return list(range(int(start), int(end) + 1))
+    return [int(h) for h in value.split(",")]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reprocessa um período de previsões do CEMPA")
+    parser.add_argument("--start", required=True, help="Data inicial (YYYYMMDD)")
+    parser.add_argument("--end", required=True, help="Data final (YYYYMMDD), inclusiva")
+    parser.add_argument("--hours", type=parse_hours, default=None, help="Horas, ex: 0-23 ou 0,12")
+    parser.add_argument("--workers", type=int, default=None, help="Número de processos")
+    parser.add_argument("--keep-files", action="store_true", help="Não remove os arquivos processados")
+    parser.add_argument("--reprocess", action="store_true", help="Reprocessa horas que já têm resultados")
+    args = parser.parse_args()
+
+    start_time = time.time()
+    run_backfill(args.start, args.end, args.hours, args.workers, args.keep_files, not args.reprocess)
+    print(f"Tempo total do backfill: {time.time() - start_time:.2f}s")
@@ -0,0 +1,322 @@
+import os
+import gzip
+import time
+import shutil
+import sqlite3
+from contextlib import closing
+from instrumentation import count
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+CACHE_INDEX = os.environ.get("CEMPA_CACHE_INDEX", "./files/cache_index.db")
+# Orçamento de disco para tmp_files e NetCDFs derivados (padrão: 20 GB)
+CACHE_MAX_BYTES = int(os.environ.get("CEMPA_CACHE_MAX_BYTES", 20 * 1024 ** 3))
+# Idade máxima das entradas em dias (0 = sem limite de idade)
+CACHE_MAX_AGE_DAYS = float(os.environ.get("CEMPA_CACHE_MAX_AGE_DAYS", 0))
+# Compressão aplicada ao arquivar: "none", "zstd" ou "gzip" (.ctl/.gra) e NetCDF4/zlib (.nc)
+CACHE_COMPRESSION = os.environ.get("CEMPA_CACHE_COMPRESSION", "none")
+
+SUFFIXES = {"zstd": ".zst", "gzip": ".gz"}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache_entries (
+    path TEXT PRIMARY KEY,
+    stored_path TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    stored_size INTEGER NOT NULL,
+    compression TEXT NOT NULL DEFAULT 'none',
+    created_at REAL NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_cache_entries_access ON cache_entries (last_access);
+"""
+
+
+def _compress_file(src, dst, compression):
+    if compression == "zstd":
+        with open(src, "rb") as fin, open(dst, "wb") as fout:
+            zstandard.ZstdCompressor(level=3).copy_stream(fin, fout)
+    else:
+        with open(src, "rb") as fin, gzip.open(dst, "wb", compresslevel=6) as fout:
+            shutil.copyfileobj(fin, fout, 1024 * 1024)
+
+
+def _decompress_file(src, dst, compression):
+    if compression == "zstd":
+        if zstandard is None:
+            raise RuntimeError(f"zstandard não instalado; não é possível restaurar {src}")
+        with open(src, "rb") as fin, open(dst, "wb") as fout:
+            zstandard.ZstdDecompressor().copy_stream(fin, fout)
+    else:
+        with gzip.open(src, "rb") as fin, open(dst, "wb") as fout:
+            shutil.copyfileobj(fin, fout, 1024 * 1024)
+
+
+def _compress_netcdf(path, complevel=4):
+    """Regrava um NetCDF como NetCDF4 com zlib; continua legível pelo xarray sem etapa extra."""
+    import xarray as xr
+
+    tmp_path = f"{path}.tmp"
+    with xr.open_dataset(path) as ds:
+        ds.load()
+        encoding = {name: {"zlib": True, "complevel": complevel} for name in ds.data_vars}
+        ds.to_netcdf(tmp_path, format="NETCDF4", encoding=encoding)
+    os.replace(tmp_path, path)
+
+
+class DiskCache:
+    """
+    Índice dos arquivos baixados (.ctl/.gra) e dos NetCDFs derivados.
+
+    O índice fica em SQLite: verificar se um arquivo já está disponível é uma
+    consulta pela chave primária, sem stat no disco. Apenas arquivos completos
+    são registrados (add é chamado depois do download/conversão), então uma
+    entrada presente também é uma entrada válida.
+
+    O índice é confiável no caminho principal: nenhuma consulta confere o
+    arquivo no disco. Arquivos apagados por fora do cache só são detectados
+    pela reconciliação periódica (sync).
+
+    O espaço total é mantido abaixo de max_bytes removendo as entradas menos
+    usadas recentemente (LRU) e, se max_age_days > 0, as mais antigas que o limite.
+    O total é acompanhado em memória a cada add e o orçamento só é aplicado
+    quando ele passa de max_bytes (ou ao fim de cada lote, por quem chama).
+    """
+
+    def __init__(self, index_path=None, max_bytes=None, max_age_days=None, compression=None):
+        self.index_path = index_path or CACHE_INDEX
+        self.max_bytes = CACHE_MAX_BYTES if max_bytes is None else max_bytes
+        self.max_age_days = CACHE_MAX_AGE_DAYS if max_age_days is None else max_age_days
+        self.compression = compression or CACHE_COMPRESSION
+        if self.compression == "zstd" and zstandard is None:
+            print("AVISO: zstandard não instalado, usando gzip para compressão do cache")
+            self.compression = "gzip"
+        # Estimativa do total em disco; lida do índice no primeiro add
+        self._total = None
+
+    def _connect(self):
+        directory = os.path.dirname(self.index_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(self.index_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(SCHEMA)
+        return conn
+
+    @staticmethod
+    def _key(path):
+        return os.path.abspath(path)
+
+    def add(self, path):
+        """Registra um arquivo completo no índice; o orçamento só é aplicado se o total passar do limite."""
+        size = os.path.getsize(path)
+        now = time.time()
+        key = self._key(path)
+        with closing(self._connect()) as conn, conn:
+            if self._total is None:
+                self._total = conn.execute(
+                    "SELECT COALESCE(SUM(stored_size), 0) FROM cache_entries").fetchone()[0]
+            previous = conn.execute("SELECT stored_size FROM cache_entries WHERE path = ?", (key,)).fetchone()
+            conn.execute(
+                "INSERT OR REPLACE INTO cache_entries "
+                "(path, stored_path, size, stored_size, compression, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, 'none', ?, ?)",
+                (key, key, size, size, now, now))
+        self._total += size - (previous["stored_size"] if previous else 0)
+        if self._total > self.max_bytes:
+            self.enforce_budget()
+
+    def restore(self, path):
+        """
+        Garante que o arquivo esteja disponível descomprimido no caminho original.
+
+        Para entradas não comprimidas é só a consulta ao índice (sem stat);
+        entradas arquivadas são descomprimidas.
+
+        Returns:
+            bool: False se o arquivo não estiver no cache
+        """
+        key = self._key(path)
+        with closing(self._connect()) as conn, conn:
+            entry = conn.execute("SELECT * FROM cache_entries WHERE path = ?", (key,)).fetchone()
+            if entry is None:
+                return False
+            if entry["compression"] not in SUFFIXES:
+                conn.execute("UPDATE cache_entries SET last_access = ? WHERE path = ?", (time.time(), key))
+            else:
+                try:
+                    _decompress_file(entry["stored_path"], key, entry["compression"])
+                except FileNotFoundError:
+                    conn.execute("DELETE FROM cache_entries WHERE path = ?", (key,))
+                    return False
+                os.remove(entry["stored_path"])
+                conn.execute(
+                    "UPDATE cache_entries SET stored_path = ?, stored_size = size, compression = 'none', "
+                    "last_access = ? WHERE path = ?", (key, time.time(), key))
+                if self._total is not None:
+                    self._total += entry["size"] - entry["stored_size"]
+                count("cache_restored")
+        return True
+
+    def archive(self, path):
+        """
+        Comprime um arquivo que não será mais usado nesta execução.
+
+        .ctl/.gra são comprimidos com zstd (ou gzip) e restaurados por restore
+        quando necessários; .nc é regravado como NetCDF4 comprimido e
+        continua legível diretamente.
+        """
+        if self.compression == "none":
+            return
+        key = self._key(path)
+        with closing(self._connect()) as conn, conn:
+            entry = conn.execute("SELECT * FROM cache_entries WHERE path = ?", (key,)).fetchone()
+        if entry is None or entry["compression"] != "none":
+            return
+
+        try:
+            if key.endswith(".nc"):
+                _compress_netcdf(key)
+                stored_path, compression = key, "netcdf4"
+            else:
+                stored_path = key + SUFFIXES[self.compression]
+                _compress_file(key, stored_path, self.compression)
+                os.remove(key)
+                compression = self.compression
+        except FileNotFoundError:
+            # Arquivo removido por fora do cache: a entrada deixa de valer
+            with closing(self._connect()) as conn, conn:
+                conn.execute("DELETE FROM cache_entries WHERE path = ?", (key,))
+            self._total = None
+            return
+
+        stored_size = os.path.getsize(stored_path)
+        count("cache_bytes_saved", entry["size"] - stored_size)
+        if self._total is not None:
+            self._total -= entry["size"] - stored_size
+        with closing(self._connect()) as conn, conn:
+            conn.execute("UPDATE cache_entries SET stored_path = ?, stored_size = ?, compression = ? "
+                         "WHERE path = ?", (stored_path, stored_size, compression, key))
+
+    def discard(self, path):
+        """Remove o arquivo (e sua versão arquivada) do disco e do índice."""
+        key = self._key(path)
+        with closing(self._connect()) as conn, conn:
+            entry = conn.execute("SELECT stored_path, stored_size FROM cache_entries WHERE path = ?",
+                                 (key,)).fetchone()
+            conn.execute("DELETE FROM cache_entries WHERE path = ?", (key,))
+        if entry and self._total is not None:
+            self._total -= entry["stored_size"]
+        for candidate in {key, entry["stored_path"] if entry else key}:
+            if os.path.exists(candidate):
+                os.remove(candidate)
+
+    def total_bytes(self):
+        with closing(self._connect()) as conn:
+            return conn.execute("SELECT COALESCE(SUM(stored_size), 0) FROM cache_entries").fetchone()[0]
+
+    def enforce_budget(self):
+        """
+        Remove entradas expiradas e, se o total ainda exceder max_bytes, as menos usadas.
+
+        Returns:
+            int: Bytes liberados
+        """
+        victims = []
+        with closing(self._connect()) as conn, conn:
+            if self.max_age_days:
+                cutoff = time.time() - self.max_age_days * 86400
+                victims.extend(conn.execute(
+                    "SELECT path, stored_path, stored_size FROM cache_entries WHERE last_access < ?",
+                    (cutoff,)).fetchall())
+                conn.execute("DELETE FROM cache_entries WHERE last_access < ?", (cutoff,))
+
+            total = conn.execute("SELECT COALESCE(SUM(stored_size), 0) FROM cache_entries").fetchone()[0]
+            if total > self.max_bytes:
+                for entry in conn.execute(
+                        "SELECT path, stored_path, stored_size FROM cache_entries ORDER BY last_access"):
+                    if total <= self.max_bytes:
+                        break
+                    victims.append(entry)
+                    total -= entry["stored_size"]
+                conn.executemany("DELETE FROM cache_entries WHERE path = ?",
+                                 [(entry["path"],) for entry in victims])
+            self._total = total
+
+        freed = 0
+        for entry in victims:
+            if os.path.exists(entry["stored_path"]):
+                os.remove(entry["stored_path"])
+            freed += entry["stored_size"]
+        if victims:
+            count("cache_evicted", len(victims))
+            count("cache_bytes_freed", freed)
+        return freed
+
+    def sync(self, directories):
+        """
+        Reconcilia o índice com o disco (varredura completa, para uso eventual).
+
+        Registra arquivos existentes que ainda não estão no índice e remove
+        entradas cujos arquivos foram apagados por fora.
+        """
+        with closing(self._connect()) as conn, conn:
+            indexed = {row["path"]: row["stored_path"]
+                       for row in conn.execute("SELECT path, stored_path FROM cache_entries")}
+            stored = set(indexed.values())
+            missing = [(path,) for path, stored_path in indexed.items() if not os.path.exists(stored_path)]
+            conn.executemany("DELETE FROM cache_entries WHERE path = ?", missing)
+
+            now = time.time()
+            for directory in directories:
+                if not os.path.isdir(directory):
+                    continue
+                # Inclui subdiretórios (ex: tmp_files/<rodada>)
+                for root, _, names in os.walk(directory):
+                    for name in names:
+                        path = os.path.abspath(os.path.join(root, name))
+                        if not name.endswith((".ctl", ".gra", ".nc")) or path in indexed or path in stored:
+                            continue
+                        stat = os.stat(path)
+                        conn.execute(
+                            "INSERT INTO cache_entries "
+                            "(path, stored_path, size, stored_size, compression, created_at, last_access) "
+                            "VALUES (?, ?, ?, ?, 'none', ?, ?)",
+                            (path, path, stat.st_size, stat.st_size, stat.st_mtime, stat.st_mtime))
+        self.enforce_budget()
+
+
+_default_cache = None
+
+
+def get_cache():
+    """Instância compartilhada configurada pelas variáveis de ambiente."""
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = DiskCache()
+    return _default_cache
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Manutenção do cache de arquivos do CEMPA")
+    parser.add_argument("--sync", nargs="*", default=None, metavar="DIR",
+                        help="Indexa os arquivos existentes (padrão: ./tmp_files ./files)")
+    parser.add_argument("--archive", action="store_true", help="Comprime todas as entradas do cache")
+    args = parser.parse_args()
+
+    cache = get_cache()
+    if args.sync is not None:
+        cache.sync(args.sync or ["./tmp_files", "./files"])
+    if args.archive:
+        with closing(cache._connect()) as conn:
+            paths = [row["path"] for row in conn.execute("SELECT path FROM cache_entries")]
+        for path in paths:
+            cache.archive(path)
+    cache.enforce_budget()
+    print(f"Cache: {cache.total_bytes() / 1024 ** 2:.1f} MB de {cache.max_bytes / 1024 ** 2:.1f} MB")
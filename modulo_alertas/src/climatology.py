@@ -0,0 +1,187 @@
+import os
+import csv
+import json
+import datetime
+from functools import lru_cache
+import numpy as np
+
+NORMALS_DIR = os.environ.get("NORMALS_DIR", "./files/normals")
+DAYS_PER_YEAR = 366
+
+# Dia do ano (base 0) do meio de cada mês, usado para interpolar as normais mensais
+MONTH_MID_DOY = np.array([14, 45, 74, 105, 135, 166, 196, 227, 258, 288, 319, 349], dtype=np.float64)
+
+# Desvio em relação à normal a partir do qual um alerta de anomalia é emitido
+ANOMALY_THRESHOLDS = {
+    "temperature": {
+        "max": 5,   # °C acima da máxima normal
+        "min": 5    # °C abaixo da mínima normal
+    },
+    "umidade": {
+        "max": 30,  # pontos percentuais acima da máxima normal
+        "min": 15   # pontos percentuais abaixo da mínima normal
+    }
+}
+
+
+def build_normals_index(csv_path, output_dir=None):
+    """
+    Gera o índice de normais climatológicas por município e dia do ano.
+
+    O CSV deve conter as colunas ibge_code, variable, month, max e min, com as
+    normais mensais do INMET associadas a cada município. Os valores mensais são
+    interpolados para os 366 dias do ano e gravados em float16.
+
+    Args:
+        csv_path (str): Caminho do CSV de normais mensais
+        output_dir (str, optional): Diretório de saída do índice
+    """
+    output_dir = output_dir or NORMALS_DIR
+    monthly = {}
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            key = (str(row["ibge_code"]), row["variable"])
+            values = monthly.setdefault(key, np.full((12, 2), np.nan))
+            values[int(row["month"]) - 1] = (float(row["max"]), float(row["min"]))
+
+    cities = sorted({code for code, _ in monthly})
+    variables = sorted({var for _, var in monthly})
+    city_rows = {code: i for i, code in enumerate(cities)}
+    var_cols = {var: i for i, var in enumerate(variables)}
+
+    normals = np.full((len(cities), len(variables), DAYS_PER_YEAR, 2), np.nan, dtype=np.float16)
+    days = np.arange(DAYS_PER_YEAR, dtype=np.float64)
+    for (code, var), values in monthly.items():
+        for k in range(2):
+            normals[city_rows[code], var_cols[var], :, k] = np.interp(
+                days, MONTH_MID_DOY, values[:, k], period=DAYS_PER_YEAR)
+
+    os.makedirs(output_dir, exist_ok=True)
+    np.save(os.path.join(output_dir, "normals.npy"), normals)
+    with open(os.path.join(output_dir, "normals.json"), "w", encoding="utf-8") as f:
+        json.dump({"cities": city_rows, "variables": var_cols}, f)
+
+    print(f"Índice de normais gerado: {len(cities)} município(s), {len(variables)} variável(is)")
+    return normals
+
+
+@lru_cache(maxsize=1)
+def load_normals(normals_dir=None):
+    """
+    Carrega o índice de normais uma única vez por processo (memória mapeada).
+
+    Returns:
+        tuple: (array de normais, {ibge_code: linha}, {variável: coluna}) ou None
+    """
+    normals_dir = normals_dir or NORMALS_DIR
+    normals_path = os.path.join(normals_dir, "normals.npy")
+    meta_path = os.path.join(normals_dir, "normals.json")
+    if not (os.path.exists(normals_path) and os.path.exists(meta_path)):
+        print(f"Índice de normais não encontrado em {normals_dir}, alertas de anomalia desativados")
+        return None
+
+    with open(meta_path, encoding="utf-8") as f:
+        meta = json.load(f)
+    normals = np.load(normals_path, mmap_mode="r")
+    return normals, meta["cities"], meta["variables"]
+
+
+def day_of_year(date):
+    """Dia do ano (base 0) de uma data YYYYMMDD, no calendário de 366 dias."""
+    month, day = int(date[4:6]), int(date[6:8])
+    # Ano bissexto fixo (2000) para que 29/02 tenha posição própria
+    return datetime.date(2000, month, day).timetuple().tm_yday - 1
+
+
+def compute_anomalies(ibge_codes, var_types, max_values, min_values, date, normals_dir=None):
+    """
+    Calcula as anomalias de todos os resultados em uma única operação vetorizada.
+
+    Args:
+        ibge_codes (list): Código IBGE de cada resultado
+        var_types (list): Tipo de variável de cada resultado
+        max_values (array): Máximos calculados
+        min_values (array): Mínimos calculados
+        date (str): Data no formato YYYYMMDD
+
+    Returns:
+        tuple: (anomalias do máximo, anomalias do mínimo), NaN onde não há normal; ou None
+    """
+    index = load_normals(normals_dir)
+    if index is None:
+        return None
+    normals, city_rows, var_cols = index
+
+    rows = np.array([city_rows.get(str(code), -1) for code in ibge_codes])
+    cols = np.array([var_cols.get(var, -1) for var in var_types])
+    known = (rows >= 0) & (cols >= 0)
+    doy = day_of_year(date)
+
+    baseline = np.full((len(rows), 2), np.nan, dtype=np.float32)
+    baseline[known] = normals[rows[known], cols[known], doy]
+
+    anomaly_max = np.asarray(max_values, dtype=np.float32) - baseline[:, 0]
+    anomaly_min = np.asarray(min_values, dtype=np.float32) - baseline[:, 1]
+    return anomaly_max, anomaly_min
+
+
+def check_anomaly_alerts(resultados, ibge_codes, date, thresholds=None, normals_dir=None):
+    """
+    Compara os resultados de uma hora com as normais climatológicas.
+
+    Args:
+        resultados (list): Dicionários retornados por find_extreme_*
+        ibge_codes (dict): Mapeamento nome do município -> código IBGE
+        date (str): Data no formato YYYYMMDD
+        thresholds (dict, optional): Desvios que disparam alerta por variável
+
+    Returns:
+        list: Alertas de anomalia
+    """
+    resultados = [r for r in resultados if r]
+    if not resultados:
+        return []
+    thresholds = thresholds or ANOMALY_THRESHOLDS
+
+    anomalies = compute_anomalies(
+        [ibge_codes[r["municipio"]] for r in resultados],
+        [r["tipo_variavel"] for r in resultados],
+        [r["maximo"]["valor"] for r in resultados],
+        [r["minimo"]["valor"] for r in resultados],
+        date, normals_dir)
+    if anomalies is None:
+        return []
+    anomaly_max, anomaly_min = anomalies
+
+    limit_max = np.array([thresholds.get(r["tipo_variavel"], {}).get("max", np.inf) for r in resultados])
+    limit_min = np.array([thresholds.get(r["tipo_variavel"], {}).get("min", np.inf) for r in resultados])
+    with np.errstate(invalid="ignore"):
+        above = anomaly_max > limit_max
+        below = -anomaly_min > limit_min
+
+    alertas = []
+    for limite, selected, anomaly in (("max", above, anomaly_max), ("min", below, anomaly_min)):
+        for i in np.flatnonzero(selected):
+            r = resultados[i]
+            extremo = r["maximo"] if limite == "max" else r["minimo"]
+            alertas.append({
+                "municipio": r["municipio"],
+                "tipo_variavel": r["tipo_variavel"],
+                "limite": limite,
+                "valor": extremo["valor"],
+                "anomalia": float(anomaly[i]),
+                "normal": float(extremo["valor"] - anomaly[i]),
+            })
+            print(f"ALERTA: {r['tipo_variavel']} em {r['municipio']} "
+                  f"{'acima' if limite == 'max' else 'abaixo'} da normal "
+                  f"({float(anomaly[i]):+.1f}{r.get('unidade', '')})")
+    return alertas
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) != 2:
+        print("Uso: python3 src/climatology.py <normais_mensais.csv>")
+        sys.exit(1)
+    build_normals_index(sys.argv[1])
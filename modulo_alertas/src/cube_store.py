@@ -0,0 +1,97 @@
+import os
+import json
+import numpy as np
+from dataset_pool import open_dataset
+from grid_index import get_field_2d
+from region_stats import get_region_index
+
+CUBE_DIR = os.environ.get("CUBE_DIR", "./files/cube")
+HOURS_PER_CUBE = 24
+
+
+def _cube_path(date, var_name, cube_dir=None):
+    return os.path.join(cube_dir or CUBE_DIR, date, f"{var_name}.npy")
+
+
+def open_cube(date, var_name, shape, cube_dir=None):
+    """
+    Abre (ou cria) o cubo diário de uma variável como memória mapeada.
+
+    O cubo tem forma (24, lat, lon) em float32 e horas ainda não processadas ficam com NaN.
+    """
+    path = _cube_path(date, var_name, cube_dir)
+    if os.path.exists(path):
+        return np.load(path, mmap_mode="r+")
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    cube = np.lib.format.open_memmap(path, mode="w+", dtype=np.float32,
+                                     shape=(HOURS_PER_CUBE,) + tuple(shape))
+    cube[:] = np.nan
+    return cube
+
+
+def write_hour_to_cube(nc_file, date, hour, variables, cube_dir=None):
+    """
+    Copia os campos de uma hora do NetCDF para os cubos diários.
+
+    Args:
+        nc_file (str): Caminho do arquivo NetCDF da hora
+        date (str): Data no formato YYYYMMDD
+        hour (int): Hora (0-23)
+        variables (dict): Mapeamento de variáveis (VARIABLES do main)
+        cube_dir (str, optional): Diretório base dos cubos
+    """
+    cube_dir = cube_dir or CUBE_DIR
+    try:
+        ds = open_dataset(nc_file)
+        for var_info in variables.values():
+            var_name = var_info["brams_name"]
+            if var_name not in ds.data_vars:
+                continue
+            data = get_field_2d(ds, var_name)
+            cube = open_cube(date, var_name, data.shape, cube_dir)
+            cube[int(hour)] = data.values.astype(np.float32)
+            cube.flush()
+            del cube
+
+            grid_path = os.path.join(cube_dir, "grid.npz")
+            if not os.path.exists(grid_path):
+                np.savez(grid_path, lat=data.lat.values, lon=data.lon.values)
+        return True
+    except Exception as e:
+        print(f"Erro ao gravar hora {hour} no cubo: {e}")
+        return False
+
+
+def write_region_indexes(cities, lats, lons, max_distance_km=None, cube_dir=None):
+    """
+    Grava os índices de células de cada município para consulta rápida.
+
+    Os índices ficam em regions.npz (uma chave por código IBGE) e o
+    mapeamento nome -> código em regions.json.
+    """
+    cube_dir = cube_dir or CUBE_DIR
+    os.makedirs(cube_dir, exist_ok=True)
+
+    indexes = {}
+    names = {}
+    for city_name, city_info in cities.items():
+        if city_info.get("polygon") is None:
+            continue
+        key = str(city_info["ibge_code"])
+        # Mesmo cache da análise por município (pré-carregado quando a grade não muda)
+        indexes[key] = get_region_index(lats, lons, {"nome": city_name, "poligono": city_info["polygon"],
+                                                     "centro": city_info["centro"]}, max_distance_km)
+        names[city_name] = key
+
+    # Chamado a cada grade nova: regrava também os eixos, para a API de consulta
+    # recarregar grade e índices juntos (arquivos trocados de uma vez com os.replace)
+    np.savez(os.path.join(cube_dir, "grid.tmp.npz"), lat=np.asarray(lats), lon=np.asarray(lons))
+    np.savez(os.path.join(cube_dir, "regions.tmp.npz"), **indexes)
+    with open(os.path.join(cube_dir, "regions.json.tmp"), "w", encoding="utf-8") as f:
+        json.dump(names, f, ensure_ascii=False)
+    for name in ("grid.npz", "regions.npz", "regions.json"):
+        tmp_name = name.replace(".npz", ".tmp.npz") if name.endswith(".npz") else f"{name}.tmp"
+        os.replace(os.path.join(cube_dir, tmp_name), os.path.join(cube_dir, name))
+    print(f"Índices de {len(indexes)} município(s) gravados em {cube_dir}")
+    return indexes
@@ -0,0 +1,91 @@
+import os
+import threading
+from collections import OrderedDict
+import xarray as xr
+from instrumentation import count
+
+# Máximo de arquivos NetCDF abertos ao mesmo tempo (os menos usados são fechados)
+MAX_OPEN_DATASETS = int(os.environ.get("CEMPA_MAX_OPEN_DATASETS", 4))
+
+
+class DatasetPool:
+    """
+    Handles de NetCDF compartilhados durante uma execução.
+
+    Cada arquivo horário é aberto uma única vez e reutilizado por
+    find_extreme_*, plot_*, pelo cubo e pela previsão por ponto. Os handles
+    são fechados de forma determinística: por release (ao terminar a hora),
+    ao ultrapassar max_open (o menos usado recentemente) ou por close.
+
+    Os handles não devem ser usados em blocos `with`, que os fechariam para
+    os demais usuários do pool.
+    """
+
+    def __init__(self, max_open=None):
+        self.max_open = max_open or MAX_OPEN_DATASETS
+        self._handles = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, path):
+        """Retorna o dataset do arquivo, abrindo-o apenas na primeira vez."""
+        key = os.path.abspath(path)
+        # O mtime invalida o handle quando o arquivo é regravado (ex: saida_{data}_{hora}.nc de uma rodada mais nova)
+        mtime = os.stat(key).st_mtime_ns
+        with self._lock:
+            entry = self._handles.get(key)
+            if entry is not None and entry[0] == mtime:
+                self._handles.move_to_end(key)
+                count("datasets_reused")
+                return entry[1]
+            if entry is not None:
+                entry[1].close()
+                del self._handles[key]
+
+            ds = xr.open_dataset(key)
+            self._handles[key] = (mtime, ds)
+            count("datasets_opened")
+            while len(self._handles) > self.max_open:
+                _, (_, oldest) = self._handles.popitem(last=False)
+                oldest.close()
+            return ds
+
+    def release(self, path):
+        """Fecha o handle de um arquivo (antes de removê-lo, regravá-lo ou comprimi-lo)."""
+        with self._lock:
+            entry = self._handles.pop(os.path.abspath(path), None)
+        if entry is not None:
+            entry[1].close()
+
+    def close(self):
+        with self._lock:
+            handles = list(self._handles.values())
+            self._handles.clear()
+        for _, ds in handles:
+            ds.close()
+
+    def __len__(self):
+        return len(self._handles)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+_pool = DatasetPool()
+
+
+def open_dataset(path):
+    """Abre (ou reutiliza) o dataset no pool da execução."""
+    return _pool.get(path)
+
+
+def release_dataset(path):
+    _pool.release(path)
+
+
+def close_datasets():
+    """Fecha todos os handles abertos (chamado ao final da execução)."""
+    _pool.close()
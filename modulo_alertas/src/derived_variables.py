@@ -0,0 +1,178 @@
+import numpy as np
+from dataset_pool import open_dataset
+from grid_index import get_field_2d, region_window, union_window, window_indices, read_window
+from region_stats import get_region_index, summarize_region
+from instrumentation import timed, count
+
+# Campos do BRAMS que podem ser usados como entrada
+RAW_INPUTS = {"t2mj", "rh"}
+
+# Variáveis derivadas e valores intermediários: {nome: {"inputs": (...), "func": f, "unit": ...}}
+DERIVED_VARIABLES = {}
+INTERMEDIATES = {}
+
+
+def derived(name, inputs, unit, registry=DERIVED_VARIABLES):
+    """
+    Registra uma variável derivada calculada a partir dos campos do BRAMS ou de
+    outros intermediários. A função recebe os arrays das entradas, na ordem
+    declarada, e deve ser vetorizada.
+    """
+    def decorator(func):
+        registry[name] = {"inputs": tuple(inputs), "func": func, "unit": unit}
+        return func
+    return decorator
+
+
+def intermediate(name, inputs):
+    return derived(name, inputs, None, INTERMEDIATES)
+
+
+@intermediate("es", inputs=("t2mj",))
+def saturation_vapor_pressure(t2mj):
+    """Pressão de vapor de saturação (hPa), fórmula de Magnus."""
+    return 6.112 * np.exp(17.67 * t2mj / (t2mj + 243.5))
+
+
+@intermediate("e", inputs=("es", "rh"))
+def vapor_pressure(es, rh):
+    """Pressão de vapor (hPa)."""
+    return es * np.clip(rh, 1e-3, 100) / 100
+
+
+@derived("ponto_orvalho", inputs=("e",), unit="°C")
+def dew_point(e):
+    gamma = np.log(e / 6.112)
+    return 243.5 * gamma / (17.67 - gamma)
+
+
+@derived("indice_calor", inputs=("t2mj", "rh"), unit="°C")
+def heat_index(t2mj, rh):
+    """Índice de calor (regressão de Rothfusz, NWS), com a fórmula simples abaixo de 80 °F."""
+    t = t2mj * 9 / 5 + 32
+    simple = 0.5 * (t + 61.0 + (t - 68.0) * 1.2 + rh * 0.094)
+    full = (-42.379 + 2.04901523 * t + 10.14333127 * rh - 0.22475541 * t * rh
+            - 6.83783e-3 * t * t - 5.481717e-2 * rh * rh + 1.22874e-3 * t * t * rh
+            + 8.5282e-4 * t * rh * rh - 1.99e-6 * t * t * rh * rh)
+    hi = np.where((simple + t) / 2 < 80, simple, full)
+    return (hi - 32) * 5 / 9
+
+
+@derived("risco_fogo", inputs=("t2mj", "rh"), unit="")
+def fire_risk(t2mj, rh):
+    """Índice de Angström: abaixo de 2,0 o risco de incêndio é alto; abaixo de 2,5, moderado."""
+    return rh / 20 + (27 - t2mj) / 10
+
+
+class DerivedEvaluator:
+    """
+    Avalia variáveis derivadas sob demanda em um conjunto de células.
+
+    Cada entrada (campo do BRAMS ou intermediário) é calculada uma única vez e
+    reaproveitada por todas as variáveis que dependem dela.
+    """
+
+    def __init__(self, loader):
+        """
+        Args:
+            loader (callable): loader(brams_name) -> valores do campo nas células
+        """
+        self.loader = loader
+        self.cache = {}
+
+    def get(self, name):
+        if name not in self.cache:
+            if name in RAW_INPUTS:
+                values = self.loader(name)
+            else:
+                spec = DERIVED_VARIABLES.get(name) or INTERMEDIATES.get(name)
+                if spec is None:
+                    raise KeyError(f"Variável derivada desconhecida: {name}")
+                values = spec["func"](*(self.get(dep) for dep in spec["inputs"]))
+            self.cache[name] = np.asarray(values, dtype=np.float32)
+        return self.cache[name]
+
+
+def subscribed_derived(cities):
+    """
+    Variáveis derivadas com limiares cadastrados em cada cidade.
+
+    Returns:
+        dict: {cidade: [variáveis derivadas]} apenas para cidades com alguma inscrição
+    """
+    subscricoes = {}
+    for name, info in cities.items():
+        variaveis = [var for var in info.get("alerts", {}) if var in DERIVED_VARIABLES]
+        if variaveis and info.get("polygon") is not None:
+            subscricoes[name] = variaveis
+    return subscricoes
+
+
+@timed()
+def summarize_derived(nc_file, cities, max_distance_km=None):
+    """
+    Calcula os extremos das variáveis derivadas apenas nas cidades inscritas.
+
+    As entradas são lidas somente na janela que cobre essas cidades e as
+    fórmulas são avaliadas apenas nas células das cidades (não na grade
+    inteira); os intermediários são compartilhados entre as variáveis.
+
+    Args:
+        nc_file (str): Caminho do arquivo NetCDF
+        cities (dict): CITIES de main.py (polygon, centro e alerts)
+        max_distance_km (float, optional): Distância máxima do centro
+
+    Returns:
+        list: Resultados no formato de find_extreme_* (tipo_variavel = nome da variável derivada)
+    """
+    subscricoes = subscribed_derived(cities)
+    if not subscricoes:
+        return []
+
+    ds = open_dataset(nc_file)
+    lats = ds.lat.values
+    lons = ds.lon.values
+    shape = (len(lats), len(lons))
+
+    flats = {}
+    for name in subscricoes:
+        municipio_info = {"nome": name, "poligono": cities[name]["polygon"],
+                          "centro": cities[name]["centro"]}
+        flats[name] = get_region_index(lats, lons, municipio_info, max_distance_km)
+
+    window = union_window(region_window(flat, shape) for flat in flats.values())
+    if window is None:
+        return []
+    locals_ = {name: window_indices(flat, shape, window) for name, flat in flats.items()}
+
+    # Células de todas as cidades inscritas, na janela
+    cells = np.unique(np.concatenate(list(locals_.values())))
+
+    def loader(brams_name):
+        values = read_window(get_field_2d(ds, brams_name), window)
+        count("bytes_read", values.nbytes)
+        return values.reshape(-1)[cells]
+
+    evaluator = DerivedEvaluator(loader)
+    y0, y1, x0, x1 = window
+    window_shape = (y1 - y0, x1 - x0)
+    window_lats = lats[y0:y1]
+    window_lons = lons[x0:x1]
+
+    resultados = []
+    for var_type in sorted({var for variaveis in subscricoes.values() for var in variaveis}):
+        # Espalha os valores calculados de volta na janela para reaproveitar summarize_region
+        field = np.full(window_shape[0] * window_shape[1], np.nan, dtype=np.float32)
+        field[cells] = evaluator.get(var_type)
+        field = field.reshape(window_shape)
+        var_info = {"unit": DERIVED_VARIABLES[var_type]["unit"], "brams_name": var_type}
+
+        for name, variaveis in subscricoes.items():
+            if var_type not in variaveis:
+                continue
+            resultado = summarize_region(field, window_lats, window_lons, locals_[name],
+                                         var_type, var_info, name, cities[name]["centro"])
+            if resultado:
+                resultados.append(resultado)
+    count("cells_evaluated", int(cells.size))
+    return resultados
@@ -0,0 +1,257 @@
+import os
+import json
+import time
+import sqlite3
+from abc import ABC, abstractmethod
+from contextlib import closing
+from instrumentation import count
+
+# sqlite:///caminho/para/fila.db ou redis://host:porta/db. O caminho padrão não depende
+# do diretório de execução, já que a fila é compartilhada com o modulo_divulgacao_alertas
+DEFAULT_QUEUE_PATH = os.path.normpath(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "files", "event_queue.db"))
+EVENT_QUEUE_URL = os.environ.get("EVENT_QUEUE_URL", f"sqlite:///{DEFAULT_QUEUE_PATH}")
+# Limite de eventos pendentes; acima dele publish espera (backpressure)
+EVENT_QUEUE_MAX_PENDING = int(os.environ.get("EVENT_QUEUE_MAX_PENDING", 100000))
+# Tempo até um lote consumido e não confirmado voltar para a fila
+EVENT_QUEUE_LEASE_SECONDS = 300
+
+
+class QueueFull(Exception):
+    """A fila continuou acima do limite durante todo o tempo de espera de publish."""
+
+
+class EventQueue(ABC):
+    """
+    Interface da fila de eventos entre o gerador de alertas e o envio.
+
+    O gerador chama publish; os workers de envio chamam consume, processam o
+    lote e confirmam com ack (ou devolvem com nack). Eventos consumidos e não
+    confirmados voltam para a fila quando o lease expira, então um worker que
+    cair no meio de um lote não perde eventos.
+    """
+
+    def __init__(self, topic="alerts", max_pending=None):
+        self.topic = topic
+        self.max_pending = EVENT_QUEUE_MAX_PENDING if max_pending is None else max_pending
+
+    def publish(self, events, timeout=30.0):
+        """
+        Publica um lote de eventos (dicionários serializáveis em JSON).
+
+        Se a fila estiver acima de max_pending, espera até `timeout` segundos
+        pelo consumo antes de levantar QueueFull.
+        """
+        events = list(events)
+        if not events:
+            return 0
+        deadline = time.monotonic() + timeout
+        while self.size() + len(events) > self.max_pending:
+            if time.monotonic() >= deadline:
+                raise QueueFull(f"Fila '{self.topic}' com {self.size()} eventos pendentes")
+            time.sleep(0.5)
+        self._push([json.dumps(event, ensure_ascii=False, default=str) for event in events])
+        count("events_published", len(events))
+        return len(events)
+
+    def consume(self, batch_size=100, wait=0.0):
+        """
+        Retorna até batch_size eventos como [(id, evento)], esperando até `wait`
+        segundos caso a fila esteja vazia.
+        """
+        deadline = time.monotonic() + wait
+        while True:
+            batch = self._pop(batch_size)
+            if batch or time.monotonic() >= deadline:
+                return [(event_id, json.loads(payload)) for event_id, payload in batch]
+            time.sleep(min(1.0, max(0.0, deadline - time.monotonic())))
+
+    @abstractmethod
+    def ack(self, ids):
+        """Confirma o processamento e remove os eventos da fila."""
+
+    @abstractmethod
+    def nack(self, ids, delay=60.0):
+        """Devolve os eventos para a fila após `delay` segundos."""
+
+    @abstractmethod
+    def size(self):
+        """Eventos pendentes ou reservados."""
+
+    @abstractmethod
+    def _push(self, payloads):
+        """Grava os eventos serializados."""
+
+    @abstractmethod
+    def _pop(self, batch_size):
+        """Reserva até batch_size eventos: [(id, payload)]."""
+
+
+class SQLiteQueue(EventQueue):
+    """Fila embutida em SQLite (WAL), segura para vários produtores e consumidores locais."""
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS events (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        topic TEXT NOT NULL,
+        payload TEXT NOT NULL,
+        available_at REAL NOT NULL,
+        attempts INTEGER NOT NULL DEFAULT 0
+    );
+    CREATE INDEX IF NOT EXISTS idx_events_ready ON events (topic, available_at, id);
+    """
+
+    def __init__(self, path, topic="alerts", max_pending=None):
+        super().__init__(topic, max_pending)
+        self.path = path
+
+    def _connect(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(self.SCHEMA)
+        return conn
+
+    def _push(self, payloads):
+        now = time.time()
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany("INSERT INTO events (topic, payload, available_at) VALUES (?, ?, ?)",
+                             [(self.topic, payload, now) for payload in payloads])
+            conn.execute("COMMIT")
+
+    def _pop(self, batch_size):
+        now = time.time()
+        with closing(self._connect()) as conn:
+            # BEGIN IMMEDIATE impede que dois consumidores reservem o mesmo lote
+            conn.execute("BEGIN IMMEDIATE")
+            rows = conn.execute(
+                "SELECT id, payload FROM events WHERE topic = ? AND available_at <= ? ORDER BY id LIMIT ?",
+                (self.topic, now, batch_size)).fetchall()
+            conn.executemany("UPDATE events SET available_at = ?, attempts = attempts + 1 WHERE id = ?",
+                             [(now + EVENT_QUEUE_LEASE_SECONDS, event_id) for event_id, _ in rows])
+            conn.execute("COMMIT")
+        return rows
+
+    def ack(self, ids):
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany("DELETE FROM events WHERE id = ?", [(event_id,) for event_id in ids])
+            conn.execute("COMMIT")
+        count("events_acked", len(ids))
+
+    def nack(self, ids, delay=60.0):
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany("UPDATE events SET available_at = ? WHERE id = ?",
+                             [(time.time() + delay, event_id) for event_id in ids])
+            conn.execute("COMMIT")
+
+    def size(self):
+        with closing(self._connect()) as conn:
+            return conn.execute("SELECT COUNT(*) FROM events WHERE topic = ?", (self.topic,)).fetchone()[0]
+
+
+class RedisQueue(EventQueue):
+    """
+    Fila em Redis (ou servidor compatível) para produtores e consumidores em máquinas diferentes.
+
+    Os eventos pendentes ficam em uma lista e os reservados em um hash com o
+    prazo do lease; requeue_expired devolve os reservados cujo lease expirou.
+    A retirada da lista e o registro do lease (e a devolução) são feitos em
+    scripts Lua, executados atomicamente pelo servidor: um worker que cair no
+    meio da operação não deixa eventos fora da lista e sem lease.
+    Requer o pacote redis (pip install redis) e Redis >= 2.6.
+    """
+
+    # KEYS: pendentes, reservados, payloads; ARGV: tamanho do lote, prazo do lease
+    POP_SCRIPT = """
+    local ids = redis.call('LRANGE', KEYS[1], 0, tonumber(ARGV[1]) - 1)
+    if #ids == 0 then
+        return {}
+    end
+    redis.call('LTRIM', KEYS[1], #ids, -1)
+    local result = {}
+    for _, id in ipairs(ids) do
+        redis.call('HSET', KEYS[2], id, ARGV[2])
+        table.insert(result, id)
+        table.insert(result, redis.call('HGET', KEYS[3], id))
+    end
+    return result
+    """
+    # KEYS: reservados, pendentes; ARGV: instante atual
+    REQUEUE_SCRIPT = """
+    local leased = redis.call('HGETALL', KEYS[1])
+    local requeued = 0
+    for i = 1, #leased, 2 do
+        if tonumber(leased[i + 1]) <= tonumber(ARGV[1]) then
+            redis.call('HDEL', KEYS[1], leased[i])
+            redis.call('RPUSH', KEYS[2], leased[i])
+            requeued = requeued + 1
+        end
+    end
+    return requeued
+    """
+
+    def __init__(self, url, topic="alerts", max_pending=None):
+        super().__init__(topic, max_pending)
+        try:
+            import redis
+        except ImportError as e:
+            raise ImportError("RedisQueue requer o pacote redis (pip install redis)") from e
+        self.client = redis.Redis.from_url(url)
+        self.pending_key = f"cempa:{topic}:pending"
+        self.leased_key = f"cempa:{topic}:leased"
+        self.payload_key = f"cempa:{topic}:payloads"
+        self.id_key = f"cempa:{topic}:next_id"
+        self._pop_script = self.client.register_script(self.POP_SCRIPT)
+        self._requeue_script = self.client.register_script(self.REQUEUE_SCRIPT)
+
+    def _push(self, payloads):
+        first = self.client.incrby(self.id_key, len(payloads)) - len(payloads) + 1
+        ids = [str(first + i) for i in range(len(payloads))]
+        pipe = self.client.pipeline()
+        pipe.hset(self.payload_key, mapping=dict(zip(ids, payloads)))
+        pipe.rpush(self.pending_key, *ids)
+        pipe.execute()
+
+    def _pop(self, batch_size):
+        self.requeue_expired()
+        deadline = time.time() + EVENT_QUEUE_LEASE_SECONDS
+        result = self._pop_script(keys=[self.pending_key, self.leased_key, self.payload_key],
+                                  args=[batch_size, deadline])
+        pairs = zip(result[::2], result[1::2])
+        return [(event_id.decode(), payload) for event_id, payload in pairs if payload is not None]
+
+    def requeue_expired(self):
+        """Devolve à fila os eventos reservados cujo lease expirou."""
+        return self._requeue_script(keys=[self.leased_key, self.pending_key], args=[time.time()])
+
+    def ack(self, ids):
+        if ids:
+            pipe = self.client.pipeline()
+            pipe.hdel(self.leased_key, *ids)
+            pipe.hdel(self.payload_key, *ids)
+            pipe.execute()
+        count("events_acked", len(ids))
+
+    def nack(self, ids, delay=60.0):
+        # Sem fila atrasada no Redis: o evento volta quando o lease expirar
+        if ids:
+            deadline = time.time() + delay
+            self.client.hset(self.leased_key, mapping={event_id: deadline for event_id in ids})
+
+    def size(self):
+        return self.client.hlen(self.payload_key)
+
+
+def get_queue(url=None, topic="alerts", max_pending=None):
+    """Cria a fila configurada em EVENT_QUEUE_URL (sqlite:///... ou redis://...)."""
+    url = url or EVENT_QUEUE_URL
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisQueue(url, topic, max_pending)
+    if url.startswith("sqlite:///"):
+        return SQLiteQueue(url[len("sqlite:///"):], topic, max_pending)
+    raise ValueError(f"Backend de fila não suportado: {url}")
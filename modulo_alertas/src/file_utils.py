@@ -2,6 +2,10 @@ import os
 import requests
 from urllib.parse import urljoin
 import datetime
+from instrumentation import timed, count
+from cache_manager import get_cache
+
+CEMPA_BASE_URL = os.environ.get("CEMPA_BASE_URL", "https://tatu.cempa.ufg.br/BRAMS-dataout/")
 
 def download_file(url, local_filepath):
     """Baixa um arquivo de uma URL para um caminho local."""
@@ -12,16 +16,76 @@ def download_file(url, local_filepath):
         with open(local_filepath, 'wb') as f:
             for chunk in r.iter_content(chunk_size=8192):
                 f.write(chunk)
+                count("bytes_downloaded", len(chunk))
     return local_filepath
 
+def lead_time_prefix(date, lead):
+    """
+    Nome base dos arquivos de uma hora de previsão da rodada 00z de `date`.
+
+    Os arquivos levam a data e a hora de validade (00z + lead horas), então as
+    horas 0-23 são o próprio dia e as seguintes, os dias seguintes.
+    """
+    valid = datetime.datetime.strptime(date, "%Y%m%d") + datetime.timedelta(hours=lead)
+    return f"Go5km-A-{valid:%Y-%m-%d-%H}0000-g1"
+
+
+def run_url(date):
+    """Diretório da rodada 00z de `date` no servidor."""
+    return urljoin(CEMPA_BASE_URL, f"{date}00/")
+
+
+def lead_paths(date, lead):
+    """Caminhos locais (.ctl, .gra) de uma hora de previsão; um diretório por rodada."""
+    files_dir = os.path.join("./tmp_files", f"{date}00")
+    file_prefix = lead_time_prefix(date, lead)
+    return os.path.join(files_dir, f"{file_prefix}.ctl"), os.path.join(files_dir, f"{file_prefix}.gra")
+
+
+def parse_valid_time(path):
+    """
+    Data e hora de validade a partir do nome de um arquivo baixado.
+
+    Returns:
+        tuple: (data YYYYMMDD, hora HH)
+    """
+    parts = os.path.basename(path).split('-')
+    return f"{parts[2]}{parts[3]}{parts[4]}", parts[5][:2]
+
+
+def remote_fingerprint(url, session=None, timeout=30):
+    """
+    Identifica a versão publicada de um arquivo sem baixá-lo (HEAD).
+
+    Returns:
+        str: ETag, ou Last-Modified + Content-Length; "" se o servidor não
+            informar nenhum dos dois; None se o arquivo não existir
+    """
+    try:
+        response = (session or requests).head(url, timeout=timeout, allow_redirects=True)
+    except requests.RequestException:
+        return None
+    if response.status_code != 200:
+        return None
+    headers = response.headers
+    if headers.get("ETag"):
+        return headers["ETag"]
+    if headers.get("Last-Modified") or headers.get("Content-Length"):
+        return f"{headers.get('Last-Modified', '')}|{headers.get('Content-Length', '')}"
+    return ""
+
+
+@timed()
 def download_cempa_files(date=None, hours=None):
     """
     Baixa arquivos CTL e GRA do servidor CEMPA para uma data específica.
-    Verifica se os arquivos já existem antes de baixar.
+    Verifica no índice do cache se os arquivos já existem antes de baixar
+    (arquivos arquivados com compressão são restaurados).
     
     Args:
-        date (str, optional): Data no formato YYYYMMDD. Se None, usa a data atual.
-        hours (list, optional): Lista de horas para baixar (0-23). Se None, baixa todas as horas.
+        date (str, optional): Data da rodada 00z no formato YYYYMMDD. Se None, usa a data atual.
+        hours (list, optional): Horas de previsão a baixar, contadas a partir das 00z da data
+            (0-23 é o próprio dia; 24 em diante, os dias seguintes). Se None, baixa as 24 horas do dia.
     """
     if date is None:
         date = datetime.datetime.now().strftime("%Y%m%d")
@@ -30,53 +94,59 @@ def download_cempa_files(date=None, hours=None):
         hours = range(24)
     
     downloaded_files = []
-    files_dir = "./tmp_files"
-    os.makedirs(files_dir, exist_ok=True)
+    cache = get_cache()
     
     for hour in hours:
-        hour_str = f"{hour:02d}"
-        base_url = f"https://tatu.cempa.ufg.br/BRAMS-dataout/{date}00/"
-        file_prefix = f"Go5km-A-{date[:4]}-{date[4:6]}-{date[6:8]}-{hour_str}0000-g1"
+        base_url = run_url(date)
+        file_prefix = lead_time_prefix(date, hour)
+        valid_date, hour_str = parse_valid_time(file_prefix)
+        label = f"{hour_str}:00" if valid_date == date else f"{hour_str}:00 de {valid_date[6:8]}/{valid_date[4:6]}"
         
         ctl_url = urljoin(base_url, f"{file_prefix}.ctl")
         gra_url = urljoin(base_url, f"{file_prefix}.gra")
         
-        ctl_path = os.path.join(files_dir, f"{file_prefix}.ctl")
-        gra_path = os.path.join(files_dir, f"{file_prefix}.gra")
+        # Um diretório por rodada: a mesma hora de validade aparece em rodadas diferentes
+        ctl_path, gra_path = lead_paths(date, hour)
         
-        if os.path.exists(ctl_path) and os.path.exists(gra_path):
-            print(f"\nArquivos para hora {hour_str}:00 já existem, pulando download...")
+        ctl_cached = cache.restore(ctl_path)
+        gra_cached = cache.restore(gra_path)
+        if ctl_cached and gra_cached:
+            print(f"\nArquivos para hora {label} já existem, pulando download...")
             downloaded_files.append((ctl_path, gra_path))
             continue
         
         try:
-            print(f"\nBaixando arquivos para hora {hour_str}:00...")
+            print(f"\nBaixando arquivos para hora {label}...")
             
-            # Baixa apenas o arquivo que não existe
-            if not os.path.exists(ctl_path):
+            # Baixa apenas o arquivo que não existe (só arquivos completos entram no cache)
+            if not ctl_cached:
                 print(f"Baixando {ctl_url}...")
                 download_file(ctl_url, ctl_path)
+                cache.add(ctl_path)
             else:
                 print(f"Arquivo CTL já existe: {ctl_path}")
             
-            if not os.path.exists(gra_path):
+            if not gra_cached:
                 print(f"Baixando {gra_url}...")
                 download_file(gra_url, gra_path)
+                cache.add(gra_path)
             else:
                 print(f"Arquivo GRA já existe: {gra_path}")
             
-            print(f"Downloads concluídos com sucesso para hora {hour_str}:00!")
+            print(f"Downloads concluídos com sucesso para hora {label}!")
+            count("files_downloaded", 2)
             downloaded_files.append((ctl_path, gra_path))
             
         except requests.RequestException as e:
-            print(f"Erro ao baixar arquivos para hora {hour_str}:00: {e}")
+            print(f"Erro ao baixar arquivos para hora {label}: {e}")
             # Remove arquivos parciais em caso de erro
-            if os.path.exists(ctl_path):
-                os.remove(ctl_path)
-            if os.path.exists(gra_path):
-                os.remove(gra_path)
+            cache.discard(ctl_path)
+            cache.discard(gra_path)
             continue
     
+    # Expiração por idade e orçamento aplicados uma vez por lote
+    cache.enforce_budget()
+    count("hours_available", len(downloaded_files))
     if downloaded_files:
         print(f"\nTotal de arquivos disponíveis: {len(downloaded_files)}")
         return downloaded_files
@@ -0,0 +1,207 @@
+import os
+import json
+import time
+import hashlib
+import sqlite3
+from contextlib import closing
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin
+import numpy as np
+import requests
+from file_utils import run_url, lead_time_prefix, remote_fingerprint
+from region_stats import export_region_indexes, import_region_indexes
+from instrumentation import count
+
+FORECAST_MANIFEST_DB = os.environ.get("CEMPA_FORECAST_MANIFEST_DB", "./files/forecast_manifest.db")
+# Horas de previsão procuradas a partir das 00z (padrão: 7 dias)
+FORECAST_HORIZON_HOURS = int(os.environ.get("CEMPA_FORECAST_HOURS", 168))
+# Requisições HEAD simultâneas e tempo máximo de cada uma ao procurar as horas publicadas
+FORECAST_PROBE_WORKERS = int(os.environ.get("CEMPA_FORECAST_PROBE_WORKERS", 8))
+FORECAST_PROBE_TIMEOUT = float(os.environ.get("CEMPA_FORECAST_PROBE_TIMEOUT", 5))
+# Índices de municípios por descritor de grade, reaproveitados entre rodadas
+GRID_CACHE_DIR = os.environ.get("CEMPA_GRID_CACHE_DIR", "./files/grid_cache")
+
+# Linhas do .ctl que definem a grade (TDEF muda a cada hora e fica de fora)
+GRID_KEYWORDS = ("XDEF", "YDEF", "ZDEF", "PDEF")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS forecast_leads (
+    run TEXT NOT NULL,
+    lead INTEGER NOT NULL,
+    valid_date TEXT NOT NULL,
+    hour TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    grid TEXT NOT NULL,
+    processed_at REAL NOT NULL,
+    PRIMARY KEY (run, lead)
+) WITHOUT ROWID;
+"""
+
+
+def get_connection(db_path=None):
+    db_path = db_path or FORECAST_MANIFEST_DB
+    directory = os.path.dirname(db_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def grid_signature(ctl_path):
+    """
+    Hash do descritor de grade do .ctl (XDEF/YDEF/ZDEF/PDEF).
+
+    Linhas de continuação (valores de LEVELS listados nas linhas seguintes)
+    entram no hash junto com a palavra-chave que as precede.
+    """
+    digest = hashlib.sha1()
+    in_grid = False
+    with open(ctl_path, encoding="latin-1") as f:
+        for line in f:
+            fields = line.split()
+            if not fields:
+                continue
+            keyword = fields[0].upper()
+            if keyword in GRID_KEYWORDS:
+                in_grid = True
+            elif keyword[0].isalpha():
+                in_grid = False
+            if in_grid:
+                digest.update(" ".join(fields).upper().encode("ascii", "replace") + b"\n")
+    return digest.hexdigest()[:16]
+
+
+def published_lead_times(date, horizon=None, session=None, workers=None):
+    """
+    Horas de previsão já publicadas da rodada 00z de `date`, com a versão de cada uma.
+
+    As horas são consultadas em paralelo, em blocos de `workers` horas,
+    inclusive as já processadas (para detectar republicações); como os
+    arquivos são publicados em ordem, a busca para no primeiro bloco com
+    uma hora ausente.
+
+    Returns:
+        dict: {hora de previsão: identificador da versão publicada (.ctl + .gra)}
+    """
+    horizon = FORECAST_HORIZON_HOURS if horizon is None else horizon
+    workers = workers or FORECAST_PROBE_WORKERS
+    base_url = run_url(date)
+    if session is None:
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=workers * 2)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+
+    def probe(lead):
+        prefix = lead_time_prefix(date, lead)
+        return [remote_fingerprint(urljoin(base_url, f"{prefix}.{ext}"), session, FORECAST_PROBE_TIMEOUT)
+                for ext in ("ctl", "gra")]
+
+    leads = list(range(horizon))
+    published = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for start in range(0, len(leads), workers):
+            block = leads[start:start + workers]
+            for lead, fingerprints in zip(block, executor.map(probe, block)):
+                if None in fingerprints:
+                    return published
+                published[lead] = "|".join(fingerprints) if all(fingerprints) else ""
+    return published
+
+
+def processed_lead_times(run, db_path=None):
+    """Horas de previsão da rodada já processadas: {hora de previsão: versão processada}."""
+    with closing(get_connection(db_path)) as conn:
+        return {row["lead"]: row["fingerprint"] for row in conn.execute(
+            "SELECT lead, fingerprint FROM forecast_leads WHERE run = ?", (run,))}
+
+
+def pending_lead_times(run, published, db_path=None):
+    """
+    Horas publicadas que ainda não foram processadas nesta rodada ou mudaram desde então.
+
+    Sem ETag/Last-Modified no servidor (identificador vazio) não há como
+    detectar mudanças, e a hora é processada uma única vez.
+
+    Returns:
+        dict: {hora de previsão: "nova" ou "alterada"}, em ordem crescente
+    """
+    processed = processed_lead_times(run, db_path)
+    pending = {}
+    for lead in sorted(published):
+        if lead not in processed:
+            pending[lead] = "nova"
+        elif published[lead] and processed[lead] and published[lead] != processed[lead]:
+            pending[lead] = "alterada"
+    count("leads_published", len(published))
+    count("leads_skipped", len(published) - len(pending))
+    return pending
+
+
+def mark_processed(run, lead, valid_date, hour, fingerprint, grid, db_path=None):
+    """Registra uma hora de previsão processada com a versão publicada usada."""
+    with closing(get_connection(db_path)) as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO forecast_leads "
+            "(run, lead, valid_date, hour, fingerprint, grid, processed_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (run, lead, valid_date, hour, fingerprint or "", grid, time.time()))
+
+
+def _polygon_hash(polygon):
+    return hashlib.sha1(polygon.wkb).hexdigest()
+
+
+def load_grid_indexes(signature, cities, cache_dir=None):
+    """
+    Pré-carrega os índices de municípios calculados em rodadas anteriores com a mesma grade.
+
+    Índices de municípios cujo polígono mudou são ignorados (e recalculados).
+
+    Returns:
+        int: Quantidade de índices carregados
+    """
+    directory = os.path.join(cache_dir or GRID_CACHE_DIR, signature)
+    manifest_path = os.path.join(directory, "regions.json")
+    if not os.path.exists(manifest_path):
+        return 0
+
+    with open(manifest_path, encoding="utf-8") as f:
+        entries = json.load(f)
+    polygons = {name: _polygon_hash(info["polygon"]) for name, info in cities.items()
+                if info.get("polygon") is not None}
+    valid = [entry for entry in entries if polygons.get(entry["key"][0]) == entry["polygon"]]
+    if not valid:
+        return 0
+    with np.load(os.path.join(directory, "regions.npz")) as arrays:
+        import_region_indexes((entry["key"], arrays[entry["array"]]) for entry in valid)
+    count("grid_indexes_reused", len(valid))
+    return len(valid)
+
+
+def save_grid_indexes(signature, cities, cache_dir=None):
+    """Grava os índices de municípios calculados nesta execução para as próximas rodadas."""
+    polygons = {name: _polygon_hash(info["polygon"]) for name, info in cities.items()
+                if info.get("polygon") is not None}
+    entries = []
+    arrays = {}
+    for key, flat in export_region_indexes():
+        if key[0] not in polygons:
+            continue
+        name = f"r{len(arrays)}"
+        arrays[name] = flat
+        entries.append({"key": list(key), "polygon": polygons[key[0]], "array": name})
+    if not entries:
+        return 0
+
+    directory = os.path.join(cache_dir or GRID_CACHE_DIR, signature)
+    os.makedirs(directory, exist_ok=True)
+    # Grava em arquivos temporários e troca, para não deixar um par npz/json inconsistente
+    np.savez(os.path.join(directory, "regions.tmp.npz"), **arrays)
+    with open(os.path.join(directory, "regions.json.tmp"), "w", encoding="utf-8") as f:
+        json.dump(entries, f, ensure_ascii=False)
+    os.replace(os.path.join(directory, "regions.tmp.npz"), os.path.join(directory, "regions.npz"))
+    os.replace(os.path.join(directory, "regions.json.tmp"), os.path.join(directory, "regions.json"))
+    return len(entries)
@@ -0,0 +1,215 @@
+import numpy as np
+import shapely
+from instrumentation import timed, count
+
+
+def get_field_2d(ds, var_name, time_idx=0):
+    """
+    Retorna a variável como DataArray 2D (lat, lon).
+
+    Seleciona o tempo indicado e a primeira camada de qualquer dimensão extra
+    (ex: lev_2 da umidade relativa), do mesmo modo que os plots.
+    """
+    data = ds[var_name].isel(time=time_idx)
+    extra_dims = [dim for dim in data.dims if dim not in ("lat", "lon")]
+    if extra_dims:
+        data = data.isel({dim: 0 for dim in extra_dims})
+    return data
+
+
+def _axis_positions(axis, values):
+    """
+    Converte coordenadas em posições fracionárias ao longo de um eixo.
+
+    Pontos fora do eixo recebem NaN. Funciona com eixos crescentes ou decrescentes.
+    """
+    axis = np.asarray(axis, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64)
+    positions = np.arange(axis.size, dtype=np.float64)
+
+    if axis[0] > axis[-1]:
+        axis = axis[::-1]
+        positions = positions[::-1]
+
+    result = np.interp(values, axis, positions)
+    result[(values < axis[0]) | (values > axis[-1])] = np.nan
+    return result
+
+
+@timed()
+def build_point_index(lats, lons, point_lats, point_lons, method="nearest"):
+    """
+    Pré-calcula os índices da grade para uma lista de coordenadas.
+
+    O índice é calculado uma única vez e reutilizado em todas as horas,
+    já que a grade Go5km não muda entre arquivos.
+
+    Args:
+        lats (array): Eixo de latitudes da grade
+        lons (array): Eixo de longitudes da grade
+        point_lats (array): Latitudes dos pontos
+        point_lons (array): Longitudes dos pontos
+        method (str): "nearest" (célula mais próxima) ou "bilinear"
+    """
+    if method not in ("nearest", "bilinear"):
+        raise ValueError(f"Método de interpolação inválido: {method}")
+
+    lats = np.asarray(lats)
+    lons = np.asarray(lons)
+    pos_y = _axis_positions(lats, point_lats)
+    pos_x = _axis_positions(lons, point_lons)
+    valid = ~(np.isnan(pos_y) | np.isnan(pos_x))
+
+    # Pontos fora da grade apontam para a célula 0 e são descartados via "valid"
+    pos_y = np.where(valid, pos_y, 0.0)
+    pos_x = np.where(valid, pos_x, 0.0)
+
+    count("points", int(valid.size))
+    index = {
+        "method": method,
+        "shape": (lats.size, lons.size),
+        "valid": valid,
+    }
+
+    if method == "nearest":
+        index["iy"] = np.rint(pos_y).astype(np.intp)
+        index["ix"] = np.rint(pos_x).astype(np.intp)
+    else:
+        iy0 = np.clip(np.floor(pos_y).astype(np.intp), 0, max(lats.size - 2, 0))
+        ix0 = np.clip(np.floor(pos_x).astype(np.intp), 0, max(lons.size - 2, 0))
+        index["iy"] = iy0
+        index["ix"] = ix0
+        index["iy1"] = np.minimum(iy0 + 1, lats.size - 1)
+        index["ix1"] = np.minimum(ix0 + 1, lons.size - 1)
+        index["wy"] = (pos_y - iy0).astype(np.float32)
+        index["wx"] = (pos_x - ix0).astype(np.float32)
+
+    return index
+
+
+def gather_points(field, index):
+    """
+    Extrai os valores de todos os pontos do índice de uma só vez.
+
+    Aceita campos 2D (lat, lon) ou com dimensões extras à esquerda
+    (ex: horas, lat, lon). Pontos fora da grade retornam NaN.
+    """
+    field = np.asarray(field)
+    if field.shape[-2:] != tuple(index["shape"]):
+        raise ValueError(
+            f"Campo com forma {field.shape[-2:]} não corresponde ao índice {tuple(index['shape'])}"
+        )
+
+    if index["method"] == "nearest":
+        values = field[..., index["iy"], index["ix"]].astype(np.float32)
+    else:
+        wy = index["wy"]
+        wx = index["wx"]
+        v00 = field[..., index["iy"], index["ix"]]
+        v01 = field[..., index["iy"], index["ix1"]]
+        v10 = field[..., index["iy1"], index["ix"]]
+        v11 = field[..., index["iy1"], index["ix1"]]
+        values = ((1 - wy) * ((1 - wx) * v00 + wx * v01)
+                  + wy * ((1 - wx) * v10 + wx * v11)).astype(np.float32)
+
+    values[..., ~index["valid"]] = np.nan
+    return values
+
+
+@timed()
+def build_region_index(lats, lons, polygon, centro, max_distance_km=None):
+    """
+    Pré-calcula os índices planos (flat) das células da grade dentro de um município.
+
+    Substitui a máscara construída ponto a ponto com shapely por um teste
+    vetorizado, feito uma única vez por grade.
+
+    Args:
+        lats (array): Eixo de latitudes da grade
+        lons (array): Eixo de longitudes da grade
+        polygon (shapely.Geometry): Polígono do município
+        centro (shapely.Point): Centro do município
+        max_distance_km (float, optional): Distância máxima do centro em km
+
+    Returns:
+        np.ndarray: Índices planos das células selecionadas (ordem crescente)
+    """
+    lats = np.asarray(lats)
+    lons = np.asarray(lons)
+    lon_grid, lat_grid = np.meshgrid(lons, lats)
+
+    # Restringe o teste de pertinência ao retângulo envolvente do polígono
+    minx, miny, maxx, maxy = polygon.bounds
+    candidates = np.flatnonzero(
+        (lon_grid >= minx) & (lon_grid <= maxx) & (lat_grid >= miny) & (lat_grid <= maxy)
+    )
+    cand_lon = lon_grid.ravel()[candidates]
+    cand_lat = lat_grid.ravel()[candidates]
+
+    inside = shapely.contains_xy(polygon, cand_lon, cand_lat)
+    if max_distance_km is not None:
+        # Mesma aproximação usada no restante do módulo (1 grau ~ 111 km)
+        distances = np.hypot(cand_lon - centro.x, cand_lat - centro.y) * 111
+        inside &= distances <= max_distance_km
+
+    count("cells", int(inside.sum()))
+    return candidates[inside].astype(np.int64)
+
+
+def region_window(flat, shape):
+    """
+    Retângulo (janela) da grade que contém todas as células de uma região.
+
+    Returns:
+        tuple: (y0, y1, x0, x1) com limites finais exclusivos, ou None se a região for vazia
+    """
+    if len(flat) == 0:
+        return None
+    iy, ix = np.divmod(flat, shape[1])
+    return int(iy.min()), int(iy.max()) + 1, int(ix.min()), int(ix.max()) + 1
+
+
+def bounds_window(lats, lons, bounds, margin=0):
+    """
+    Janela da grade que cobre um retângulo (minx, miny, maxx, maxy), com `margin` células extras.
+
+    Returns:
+        tuple: (y0, y1, x0, x1), ou None se o retângulo estiver fora da grade
+    """
+    minx, miny, maxx, maxy = bounds
+    pos_y = _axis_positions(lats, [miny, maxy])
+    pos_x = _axis_positions(lons, [minx, maxx])
+    if np.isnan(pos_y).any() or np.isnan(pos_x).any():
+        return None
+    # Polígonos menores que uma célula ainda recebem ao menos a célula que os contém
+    y0, y1 = int(np.floor(pos_y.min())), int(np.ceil(pos_y.max())) + 1
+    x0, x1 = int(np.floor(pos_x.min())), int(np.ceil(pos_x.max())) + 1
+    return (max(y0 - margin, 0), min(y1 + margin, len(lats)),
+            max(x0 - margin, 0), min(x1 + margin, len(lons)))
+
+
+def union_window(windows):
+    """Menor janela que contém todas as janelas informadas (ignora None)."""
+    windows = [w for w in windows if w is not None]
+    if not windows:
+        return None
+    return (min(w[0] for w in windows), max(w[1] for w in windows),
+            min(w[2] for w in windows), max(w[3] for w in windows))
+
+
+def window_indices(flat, shape, window):
+    """Converte índices planos da grade inteira em índices planos dentro da janela."""
+    y0, _, x0, x1 = window
+    iy, ix = np.divmod(flat, shape[1])
+    return ((iy - y0) * (x1 - x0) + (ix - x0)).astype(np.int64)
+
+
+def read_window(data, window):
+    """
+    Lê do disco apenas a janela de um DataArray 2D (lat, lon).
+
+    A seleção é feita antes de acessar .values, de modo que o xarray lê
+    somente o recorte do arquivo.
+    """
+    y0, y1, x0, x1 = window
+    return data.isel(lat=slice(y0, y1), lon=slice(x0, x1)).values
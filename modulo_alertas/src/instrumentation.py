@@ -0,0 +1,235 @@
+import os
+import sys
+import json
+import time
+import resource
+import threading
+from functools import wraps
+from datetime import datetime, timezone
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Métricas desativadas por padrão: CEMPA_METRICS=1 ativa a coleta
+ENABLED = os.environ.get("CEMPA_METRICS", "").lower() in ("1", "true", "yes")
+METRICS_LOG = os.environ.get("CEMPA_METRICS_LOG")          # arquivo JSON lines (padrão: stderr)
+PROMETHEUS_FILE = os.environ.get("CEMPA_METRICS_PROM")     # arquivo texto para o node_exporter
+PROMETHEUS_PORT = os.environ.get("CEMPA_METRICS_PORT")     # endpoint HTTP /metrics
+
+# Orçamentos de latência do README (em segundos)
+STAGE_BUDGETS = {
+    "process_hour": 10,   # processamento em até 10 s após o recebimento
+    "run": 300,           # verificação diária em até 5 minutos após a coleta
+    "dispatch_time_to_send_sev3": 300   # alertas urgentes entregues em até 5 minutos
+}
+
+_lock = threading.Lock()
+_local = threading.local()
+_totals = {}
+_log_file = None
+
+
+class _Counts(dict):
+    """Contadores de uma etapa; chaves ausentes valem 0 (permite m["itens"] += 1)."""
+
+    def __missing__(self, key):
+        return 0
+
+
+class _NullRecord(_Counts):
+    """Registro descartável usado quando as métricas estão desativadas."""
+
+    def __setitem__(self, key, value):
+        pass
+
+
+class _NullStage:
+    def __enter__(self):
+        return _NullRecord()
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+def _peak_rss_bytes():
+    # ru_maxrss é em KB no Linux e em bytes no macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _emit(event):
+    global _log_file
+    line = json.dumps(event, ensure_ascii=False, default=str)
+    with _lock:
+        if METRICS_LOG:
+            if _log_file is None:
+                _log_file = open(METRICS_LOG, "a", encoding="utf-8")
+            _log_file.write(line + "\n")
+            _log_file.flush()
+        else:
+            print(line, file=sys.stderr)
+
+
+def _accumulate(name, duration, counts):
+    with _lock:
+        total = _totals.setdefault(name, {"count": 0, "seconds": 0.0, "max_seconds": 0.0, "items": {}})
+        total["count"] += 1
+        total["seconds"] += duration
+        total["max_seconds"] = max(total["max_seconds"], duration)
+        for key, value in counts.items():
+            if isinstance(value, (int, float)):
+                total["items"][key] = total["items"].get(key, 0) + value
+
+
+class _Stage:
+    def __init__(self, name, labels):
+        self.name = name
+        self.labels = labels
+        self.counts = _Counts()
+
+    def __enter__(self):
+        stack = getattr(_local, "stack", None)
+        if stack is None:
+            stack = _local.stack = []
+        stack.append(self.counts)
+        self.start = time.perf_counter()
+        return self.counts
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.perf_counter() - self.start
+        _local.stack.pop()
+        _finish(self.name, duration, self.labels, self.counts, exc_type is None)
+        return False
+
+
+def _finish(name, duration, labels, counts, ok=True):
+    _accumulate(name, duration, counts)
+
+    event = {
+        "ts": datetime.now(timezone.utc).isoformat(),
+        "stage": name,
+        "duration_s": round(duration, 6),
+        "peak_rss_bytes": _peak_rss_bytes(),
+        "ok": ok,
+    }
+    if labels:
+        event["labels"] = labels
+    if counts:
+        event["counts"] = counts
+    budget = STAGE_BUDGETS.get(name)
+    if budget is not None:
+        event["budget_s"] = budget
+        event["over_budget"] = duration > budget
+    _emit(event)
+
+
+def stage(name, **labels):
+    """
+    Mede uma etapa do pipeline.
+
+    Uso:
+        with stage("download_cempa_files", date=date) as m:
+            m["files"] = len(arquivos)
+
+    Quando as métricas estão desativadas retorna um contexto vazio.
+    """
+    if not ENABLED:
+        return _NULL_STAGE
+    return _Stage(name, labels)
+
+
+def count(key, value=1):
+    """Soma um contador (bytes, itens...) à etapa ativa mais interna, se houver."""
+    if not ENABLED:
+        return
+    stack = getattr(_local, "stack", None)
+    if stack:
+        stack[-1][key] = stack[-1].get(key, 0) + value
+
+
+def record(name, duration, **labels):
+    """Registra uma etapa cuja duração (em segundos) foi medida pelo chamador."""
+    if ENABLED:
+        _finish(name, duration, labels, {})
+
+
+def timed(name=None):
+    """Decorador que mede cada chamada da função como uma etapa."""
+    def decorator(func):
+        stage_name = name or func.__name__
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return func(*args, **kwargs)
+            with _Stage(stage_name, {}):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def render_prometheus():
+    """Formata as métricas acumuladas no formato texto do Prometheus."""
+    lines = [
+        "# HELP cempa_stage_duration_seconds Tempo gasto em cada etapa do pipeline",
+        "# TYPE cempa_stage_duration_seconds summary",
+    ]
+    with _lock:
+        totals = {name: dict(total, items=dict(total["items"])) for name, total in _totals.items()}
+
+    for name, total in sorted(totals.items()):
+        lines.append(f'cempa_stage_duration_seconds_sum{{stage="{name}"}} {total["seconds"]:.6f}')
+        lines.append(f'cempa_stage_duration_seconds_count{{stage="{name}"}} {total["count"]}')
+    lines.append("# HELP cempa_stage_duration_seconds_max Maior duração observada por etapa")
+    lines.append("# TYPE cempa_stage_duration_seconds_max gauge")
+    for name, total in sorted(totals.items()):
+        lines.append(f'cempa_stage_duration_seconds_max{{stage="{name}"}} {total["max_seconds"]:.6f}')
+    lines.append("# HELP cempa_stage_items_total Contadores registrados pelas etapas (bytes, itens)")
+    lines.append("# TYPE cempa_stage_items_total counter")
+    for name, total in sorted(totals.items()):
+        for item, value in sorted(total["items"].items()):
+            lines.append(f'cempa_stage_items_total{{stage="{name}",item="{item}"}} {value}')
+    lines.append("# HELP cempa_peak_rss_bytes Pico de memória residente do processo")
+    lines.append("# TYPE cempa_peak_rss_bytes gauge")
+    lines.append(f"cempa_peak_rss_bytes {_peak_rss_bytes()}")
+    return "\n".join(lines) + "\n"
+
+
+def write_prometheus(path=None):
+    """Grava as métricas em arquivo (escrita atômica para o textfile collector)."""
+    path = path or PROMETHEUS_FILE
+    if not ENABLED or not path:
+        return
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(render_prometheus())
+    os.replace(tmp_path, path)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path != "/metrics":
+            self.send_response(404)
+            self.end_headers()
+            return
+        body = render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(port=None):
+    """Expõe /metrics em uma thread separada (útil no modo contínuo)."""
+    port = port or PROMETHEUS_PORT
+    if not ENABLED or not port:
+        return None
+    server = ThreadingHTTPServer(("0.0.0.0", int(port)), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"Métricas disponíveis em http://0.0.0.0:{port}/metrics")
+    return server
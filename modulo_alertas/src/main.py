@@ -13,8 +13,27 @@ from shapely.geometry import Point
 from functools import lru_cache
 import hashlib
 import time
-from file_utils import download_cempa_files
+from file_utils import download_cempa_files, lead_paths, parse_valid_time
+from cache_manager import get_cache
+from dataset_pool import open_dataset, release_dataset, close_datasets
+from point_forecast import (fetch_registered_points, build_point_index_from_file,
+                            evaluate_points, point_observations, POINT_PREFIX)
+from alert_state import update_alert_state, city_observations, get_active_alerts
+from threshold_index import fetch_user_thresholds, build_threshold_index, user_observations, USER_PREFIX
+from event_queue import get_queue, QueueFull
+from cube_store import write_hour_to_cube, write_region_indexes
+from results_store import save_results
+from climatology import check_anomaly_alerts
+from grid_index import get_field_2d
+from region_stats import read_region, summarize_region, clear_region_cache
+from forecast_manifest import (published_lead_times, pending_lead_times, mark_processed, grid_signature,
+                               load_grid_indexes, save_grid_indexes)
+from shared_fields import summarize_cities_shared
+from derived_variables import summarize_derived, DERIVED_VARIABLES
+from thumbnails import city_thumbnail
+from instrumentation import timed, count, record, write_prometheus, start_metrics_server
 from datetime import datetime 
+from concurrent.futures import ProcessPoolExecutor
 
 
 CITIES = {
@@ -43,11 +62,21 @@ CITIES = {
             "umidade": {
                 "max": 100,
                 "min": 20
+            },
+            "indice_calor": {
+                "max": 40
+            },
+            "risco_fogo": {
+                "min": 2.0
             }
         }
     }
 }
 
+# Processos usados para analisar as cidades de cada hora (1 = sequencial).
+# Com mais de um, os campos são decodificados uma vez e compartilhados entre os processos.
+CITY_WORKERS = int(os.environ.get("CEMPA_CITY_WORKERS", "1"))
+
 VARIABLES = {
     "temperature": {
         "unit": "°C",
@@ -81,6 +110,7 @@ def clear_cache():
     """Limpa o cache quando necessário"""
     get_cached_variable.cache_clear()
 
+@timed()
 def convert_to_netcdf(ctl_path, output_nc):
     """Converte CTL/GRA para NetCDF usando CDO."""
     comando = [
@@ -95,6 +125,7 @@ def convert_to_netcdf(ctl_path, output_nc):
         print(f"Erro ao executar comando: {e}")
         return False
 
+@timed()
 def plot_temperature(nc_file, date, output_image=None):
     """
     Cria um plot de temperatura a partir dos dados NetCDF.
@@ -104,11 +135,8 @@ def plot_temperature(nc_file, date, output_image=None):
         date (str): Data no formato YYYYMMDD00
         output_image (str, optional): Caminho para salvar a imagem. Se None, mostra o plot.
     """
-    ds = xr.open_dataset(nc_file, 
-                        chunks={'time': 1},  # Carrega apenas um timestep por vez
-                        cache=False,         # Evita cache desnecessário
-                        decode_times=False)  # Desativa decodificação de tempos se não necessário
-    data = ds['rh'].isel(time=0)
+    ds = open_dataset(nc_file)  # Mesmo handle usado por find_extreme_* na hora
+    data = get_field_2d(ds, 'rh')
 
     colors = [
         '#0000b2', '#005ce6', '#008c8c', '#008000', 
@@ -155,6 +183,7 @@ def plot_temperature(nc_file, date, output_image=None):
         plt.show()
     plt.close()
 
+@timed()
 def plot_humidity(nc_file, date, output_image=None):
     """
     Cria um plot de umidade relativa a partir dos dados NetCDF.
@@ -164,11 +193,8 @@ def plot_humidity(nc_file, date, output_image=None):
         date (str): Data no formato YYYYMMDD00
         output_image (str, optional): Caminho para salvar a imagem. Se None, mostra o plot.
     """
-    ds = xr.open_dataset(nc_file, 
-                        chunks={'time': 1},  # Carrega apenas um timestep por vez
-                        cache=False,         # Evita cache desnecessário
-                        decode_times=False)  # Desativa decodificação de tempos se não necessário
-    data = ds['rh'].isel(time=0)
+    ds = open_dataset(nc_file)  # Mesmo handle usado por find_extreme_* na hora
+    data = get_field_2d(ds, 'rh')
     
     # Verificar e imprimir as dimensões para debug
     print(f"Dimensões dos dados: {data.dims}")
@@ -225,6 +251,7 @@ def plot_humidity(nc_file, date, output_image=None):
         plt.show()
     plt.close()
 
+@timed()
 def find_extreme_variables(nc_file, municipio_info, var_types=None, max_distance_km=50):
     """
     Encontra os valores máximos e mínimos de múltiplas variáveis dentro dos limites do município.
@@ -236,8 +263,8 @@ def find_extreme_variables(nc_file, municipio_info, var_types=None, max_distance
         max_distance_km (float): Distância máxima em km do centro do município para considerar um ponto válido
     """
     try:
-        # Abrir o dataset uma única vez
-        ds = xr.open_dataset(nc_file)
+        # Handle compartilhado do pool (aberto uma única vez por arquivo)
+        ds = open_dataset(nc_file)
         
         # Se var_types não for especificado, usar todas as variáveis disponíveis
         if var_types is None:
@@ -251,15 +278,6 @@ def find_extreme_variables(nc_file, municipio_info, var_types=None, max_distance
             print(f"Variáveis disponíveis: {list(ds.data_vars.keys())}")
             return None
             
-        # Criar máscara do município uma única vez
-        first_var = ds[var_names[0]].isel(time=0)
-        lons, lats = np.meshgrid(first_var.lon.values, first_var.lat.values)
-        points = np.column_stack((lons.flatten(), lats.flatten()))
-        
-        # Criar máscara vetorizada para pontos dentro do polígono
-        mask = np.array([municipio_info['poligono'].contains(Point(lon, lat)) 
-                        for lon, lat in points]).reshape(lons.shape)
-        
         # Processar todas as variáveis
         resultados = {}
         for var_type in var_types:
@@ -267,29 +285,22 @@ def find_extreme_variables(nc_file, municipio_info, var_types=None, max_distance
             var_name = var_info['brams_name']
             var_unit = var_info['unit']
             
-            # Obter dados e aplicar máscara
-            data = ds[var_name].isel(time=0)
-            masked_data = np.where(mask, data.values, np.nan)
-            
-            # Criar array de distâncias do centro
-            lons, lats = np.meshgrid(data.lon.values, data.lat.values)
-            distances = np.array([
-                Point(lon, lat).distance(municipio_info['centro']) * 111  # Converter para km
-                for lon, lat in zip(lons.flatten(), lats.flatten())
-            ]).reshape(lons.shape)
-            
-            # Aplicar máscara de distância
-            distance_mask = distances <= max_distance_km
-            masked_data = np.where(distance_mask, masked_data, np.nan)
+            # Ler apenas a janela do município (máscara + distância calculadas uma vez por grade)
+            region = read_region(get_field_2d(ds, var_name), municipio_info, max_distance_km)
+            resultado = None
+            if region is not None:
+                values, lats, lons, local = region
+                count("bytes_read", values.nbytes)
+                resultado = summarize_region(values, lats, lons, local, var_type, var_info,
+                                             municipio_info['nome'], municipio_info['centro'])
             
             # Verificar se há dados válidos após a filtragem
-            if np.all(np.isnan(masked_data)):
+            if resultado is None:
                 print(f"AVISO: Nenhum dado válido encontrado para {var_type} dentro do raio de {max_distance_km}km")
                 continue
             
-            # Encontrar valores extremos
-            max_value = float(np.nanmax(masked_data))
-            min_value = float(np.nanmin(masked_data))
+            max_value = resultado['maximo']['valor']
+            min_value = resultado['minimo']['valor']
             
             # Verificar valores fisicamente possíveis
             if var_type == 'umidade':
@@ -298,46 +309,10 @@ def find_extreme_variables(nc_file, municipio_info, var_types=None, max_distance
                     # Ajustar para limites físicos
                     min_value = max(min_value, 0)
                     max_value = min(max_value, 100)
+                    resultado['minimo'].update(valor=min_value, valor_formatado=f"{min_value:.1f}{var_unit}")
+                    resultado['maximo'].update(valor=max_value, valor_formatado=f"{max_value:.1f}{var_unit}")
             
-            # Encontrar índices dos valores extremos
-            max_indices = np.unravel_index(np.nanargmax(masked_data), masked_data.shape)
-            min_indices = np.unravel_index(np.nanargmin(masked_data), masked_data.shape)
-            
-            # Obter coordenadas dos pontos extremos
-            max_lat = float(data.lat.values[max_indices[0]])
-            max_lon = float(data.lon.values[max_indices[1]])
-            min_lat = float(data.lat.values[min_indices[0]])
-            min_lon = float(data.lon.values[min_indices[1]])
-            
-            # Calcular distâncias do centro
-            max_point = Point(max_lon, max_lat)
-            min_point = Point(min_lon, min_lat)
-            max_distancia_centro = max_point.distance(municipio_info['centro']) * 111
-            min_distancia_centro = min_point.distance(municipio_info['centro']) * 111
-            
-            # Formatar resultados
-            resultados[var_type] = {
-                "tipo_variavel": var_type,
-                "nome_variavel": var_name,
-                "maximo": {
-                    "valor": max_value,
-        "latitude": max_lat,
-        "longitude": max_lon,
-                    "localizacao": f"Lat: {max_lat:.2f}°, Lon: {max_lon:.2f}°",
-                    "valor_formatado": f"{max_value:.1f}{var_unit}",
-                    "distancia_centro_km": max_distancia_centro
-                },
-                "minimo": {
-                    "valor": min_value,
-                    "latitude": min_lat,
-                    "longitude": min_lon,
-                    "localizacao": f"Lat: {min_lat:.2f}°, Lon: {min_lon:.2f}°",
-                    "valor_formatado": f"{min_value:.1f}{var_unit}",
-                    "distancia_centro_km": min_distancia_centro
-                },
-                "municipio": municipio_info['nome'],
-                "unidade": var_unit
-            }
+            resultados[var_type] = resultado
             
             # Verificar alertas
             if var_type in municipio_info.get('alerts', {}):
@@ -349,12 +324,12 @@ def find_extreme_variables(nc_file, municipio_info, var_types=None, max_distance
             
             # Imprimir resultados
             print(f"\nValores extremos de {var_type} em {municipio_info['nome']}:")
-            print(f"Máximo: {resultados[var_type]['maximo']['valor_formatado']}")
-            print(f"Localização do máximo: {resultados[var_type]['maximo']['localizacao']}")
-            print(f"Distância do centro (máximo): {max_distancia_centro:.1f} km")
-            print(f"Mínimo: {resultados[var_type]['minimo']['valor_formatado']}")
-            print(f"Localização do mínimo: {resultados[var_type]['minimo']['localizacao']}")
-            print(f"Distância do centro (mínimo): {min_distancia_centro:.1f} km")
+            print(f"Máximo: {resultado['maximo']['valor_formatado']}")
+            print(f"Localização do máximo: {resultado['maximo']['localizacao']}")
+            print(f"Distância do centro (máximo): {resultado['maximo']['distancia_centro_km']:.1f} km")
+            print(f"Mínimo: {resultado['minimo']['valor_formatado']}")
+            print(f"Localização do mínimo: {resultado['minimo']['localizacao']}")
+            print(f"Distância do centro (mínimo): {resultado['minimo']['distancia_centro_km']:.1f} km")
         
         return resultados
         
@@ -365,79 +340,30 @@ def find_extreme_variables(nc_file, municipio_info, var_types=None, max_distance
         print(traceback.format_exc())
         return None
 
+@timed()
 def find_extreme_humidity(nc_file, municipio_info, max_distance_km=50):
     """
     Encontra os valores máximos e mínimos de umidade relativa dentro dos limites do município.
     """
     try:
-        ds = xr.open_dataset(nc_file)
-        data = ds['rh'].isel(time=0)
+        ds = open_dataset(nc_file)
         
         # Selecionar a camada correta (mesmo que no plot)
-        if len(data.dims) > 2:
-            data = data.isel(lev_2=0)
-        
-        # Criar máscara do município
-        lons, lats = np.meshgrid(data.lon.values, data.lat.values)
-        points = np.column_stack((lons.flatten(), lats.flatten()))
-        mask = np.array([municipio_info['poligono'].contains(Point(lon, lat)) 
-                        for lon, lat in points]).reshape(lons.shape)
-        
-        # Aplicar máscara aos dados
-        masked_data = np.where(mask, data.values, np.nan)
+        data = get_field_2d(ds, 'rh')
         
-        # Criar array de distâncias do centro
-        distances = np.array([
-            Point(lon, lat).distance(municipio_info['centro']) * 111
-            for lon, lat in zip(lons.flatten(), lats.flatten())
-        ]).reshape(lons.shape)
-        
-        # Aplicar máscara de distância
-        distance_mask = distances <= max_distance_km
-        masked_data = np.where(distance_mask, masked_data, np.nan)
-        
-        # Encontrar valores extremos
-        max_value = float(np.nanmax(masked_data))
-        min_value = float(np.nanmin(masked_data))
-
-        # Encontrar índices dos valores extremos
-        max_indices = np.unravel_index(np.nanargmax(masked_data), masked_data.shape)
-        min_indices = np.unravel_index(np.nanargmin(masked_data), masked_data.shape)
-        
-        # Obter coordenadas
-        max_lat = float(data.lat.values[max_indices[0]])
-        max_lon = float(data.lon.values[max_indices[1]])
-        min_lat = float(data.lat.values[min_indices[0]])
-        min_lon = float(data.lon.values[min_indices[1]])
-        
-        # Calcular distâncias
-        max_point = Point(max_lon, max_lat)
-        min_point = Point(min_lon, min_lat)
-        max_distancia_centro = max_point.distance(municipio_info['centro']) * 111
-        min_distancia_centro = min_point.distance(municipio_info['centro']) * 111
+        # Ler apenas a janela do município (máscara + distância calculadas uma vez por grade)
+        region = read_region(data, municipio_info, max_distance_km)
+        if region is None:
+            return None
+        values, lats, lons, local = region
+        count("bytes_read", values.nbytes)
+        resultado = summarize_region(values, lats, lons, local, 'umidade', VARIABLES['umidade'],
+                                     municipio_info['nome'], municipio_info['centro'])
+        if resultado is None:
+            return None
         
-        resultado = {
-            "tipo_variavel": "umidade",
-            "nome_variavel": "rh",
-            "maximo": {
-                "valor": max_value,
-                "latitude": max_lat,
-                "longitude": max_lon,
-                "localizacao": f"Lat: {max_lat:.2f}°, Lon: {max_lon:.2f}°",
-                "valor_formatado": f"{max_value:.1f}%",
-                "distancia_centro_km": max_distancia_centro
-            },
-            "minimo": {
-                "valor": min_value,
-                "latitude": min_lat,
-                "longitude": min_lon,
-                "localizacao": f"Lat: {min_lat:.2f}°, Lon: {min_lon:.2f}°",
-                "valor_formatado": f"{min_value:.1f}%",
-                "distancia_centro_km": min_distancia_centro
-            },
-            "municipio": municipio_info['nome'],
-            "unidade": "%"
-        }
+        max_value = resultado['maximo']['valor']
+        min_value = resultado['minimo']['valor']
         
         # Verificar alertas
         if "umidade" in municipio_info.get('alerts', {}):
@@ -453,6 +379,7 @@ def find_extreme_humidity(nc_file, municipio_info, max_distance_km=50):
         print(f"Erro ao calcular valores extremos de umidade: {e}")
         return None
 
+@timed()
 def find_extreme_temperature(nc_file, municipio_info, max_distance_km=50):
     """
     Encontra os valores máximos e mínimos de temperatura dentro dos limites do município.
@@ -463,8 +390,8 @@ def find_extreme_temperature(nc_file, municipio_info, max_distance_km=50):
         max_distance_km (float): Distância máxima em km do centro do município para considerar um ponto válido
     """
     try:
-        # Abrir o dataset uma única vez
-        ds = xr.open_dataset(nc_file)
+        # Handle compartilhado do pool (aberto uma única vez por arquivo)
+        ds = open_dataset(nc_file)
         
         # Verificar se a variável existe no arquivo
         var_name = VARIABLES['temperature']['brams_name']
@@ -473,77 +400,22 @@ def find_extreme_temperature(nc_file, municipio_info, max_distance_km=50):
             print(f"Variáveis disponíveis: {list(ds.data_vars.keys())}")
             return None
             
-        # Criar máscara do município uma única vez
-        data = ds[var_name].isel(time=0)
-        lons, lats = np.meshgrid(data.lon.values, data.lat.values)
-        points = np.column_stack((lons.flatten(), lats.flatten()))
-        
-        # Criar máscara vetorizada para pontos dentro do polígono
-        mask = np.array([municipio_info['poligono'].contains(Point(lon, lat)) 
-                        for lon, lat in points]).reshape(lons.shape)
-        
-        # Obter dados e aplicar máscara
-        masked_data = np.where(mask, data.values, np.nan)
-        
-        # Criar array de distâncias do centro
-        lons, lats = np.meshgrid(data.lon.values, data.lat.values)
-        distances = np.array([
-            Point(lon, lat).distance(municipio_info['centro']) * 111  # Converter para km
-            for lon, lat in zip(lons.flatten(), lats.flatten())
-        ]).reshape(lons.shape)
-        
-        # Aplicar máscara de distância
-        distance_mask = distances <= max_distance_km
-        masked_data = np.where(distance_mask, masked_data, np.nan)
+        # Ler apenas a janela do município (máscara + distância calculadas uma vez por grade)
+        region = read_region(get_field_2d(ds, var_name), municipio_info, max_distance_km)
+        resultado = None
+        if region is not None:
+            values, lats, lons, local = region
+            count("bytes_read", values.nbytes)
+            resultado = summarize_region(values, lats, lons, local, 'temperature', VARIABLES['temperature'],
+                                         municipio_info['nome'], municipio_info['centro'])
         
         # Verificar se há dados válidos após a filtragem
-        if np.all(np.isnan(masked_data)):
+        if resultado is None:
             print(f"AVISO: Nenhum dado válido encontrado para temperatura dentro do raio de {max_distance_km}km")
             return None
         
-        # Encontrar valores extremos
-        max_value = float(np.nanmax(masked_data))
-        min_value = float(np.nanmin(masked_data))
-        
-        # Encontrar índices dos valores extremos
-        max_indices = np.unravel_index(np.nanargmax(masked_data), masked_data.shape)
-        min_indices = np.unravel_index(np.nanargmin(masked_data), masked_data.shape)
-        
-        # Obter coordenadas dos pontos extremos
-        max_lat = float(data.lat.values[max_indices[0]])
-        max_lon = float(data.lon.values[max_indices[1]])
-        min_lat = float(data.lat.values[min_indices[0]])
-        min_lon = float(data.lon.values[min_indices[1]])
-        
-        # Calcular distâncias do centro
-        max_point = Point(max_lon, max_lat)
-        min_point = Point(min_lon, min_lat)
-        max_distancia_centro = max_point.distance(municipio_info['centro']) * 111
-        min_distancia_centro = min_point.distance(municipio_info['centro']) * 111
-        
-        # Formatar resultados
-        resultado = {
-            "tipo_variavel": "temperature",
-            "nome_variavel": var_name,
-            "maximo": {
-                "valor": max_value,
-                "latitude": max_lat,
-                "longitude": max_lon,
-                "localizacao": f"Lat: {max_lat:.2f}°, Lon: {max_lon:.2f}°",
-                "valor_formatado": f"{max_value:.1f}°C",
-                "distancia_centro_km": max_distancia_centro
-            },
-            "minimo": {
-                "valor": min_value,
-                "latitude": min_lat,
-                "longitude": min_lon,
-                "localizacao": f"Lat: {min_lat:.2f}°, Lon: {min_lon:.2f}°",
-                "valor_formatado": f"{min_value:.1f}°C",
-                "distancia_centro_km": min_distancia_centro
-            },
-            "municipio": municipio_info['nome'],
-            "unidade": "°C"
-        }
+        max_value = resultado['maximo']['valor']
+        min_value = resultado['minimo']['valor']
         
         # Verificar alertas
         if "temperature" in municipio_info.get('alerts', {}):
@@ -557,10 +429,10 @@ def find_extreme_temperature(nc_file, municipio_info, max_distance_km=50):
         print(f"\nValores extremos de temperatura em {municipio_info['nome']}:")
         print(f"Máximo: {resultado['maximo']['valor_formatado']}")
         print(f"Localização do máximo: {resultado['maximo']['localizacao']}")
-        print(f"Distância do centro (máximo): {max_distancia_centro:.1f} km")
+        print(f"Distância do centro (máximo): {resultado['maximo']['distancia_centro_km']:.1f} km")
         print(f"Mínimo: {resultado['minimo']['valor_formatado']}")
         print(f"Localização do mínimo: {resultado['minimo']['localizacao']}")
-        print(f"Distância do centro (mínimo): {min_distancia_centro:.1f} km")
+        print(f"Distância do centro (mínimo): {resultado['minimo']['distancia_centro_km']:.1f} km")
         
         return resultado
         
@@ -571,6 +443,33 @@ def find_extreme_temperature(nc_file, municipio_info, max_distance_km=50):
         print(traceback.format_exc())
         return None
 
+def check_city_alerts(resultado, alerts):
+    """
+    Imprime os extremos de um resultado de summarize_region e os alertas da cidade.
+
+    Usado no modo paralelo (CITY_WORKERS > 1), em que os resultados chegam
+    prontos dos processos filhos.
+    """
+    var_type = resultado['tipo_variavel']
+    var_unit = resultado['unidade']
+    max_value = resultado['maximo']['valor']
+    min_value = resultado['minimo']['valor']
+
+    if var_type in alerts:
+        alert_thresholds = alerts[var_type]
+        if max_value > alert_thresholds.get('max', float('inf')):
+            print(f"ALERTA: {var_type} acima do limite máximo ({alert_thresholds['max']}{var_unit})")
+        if min_value < alert_thresholds.get('min', float('-inf')):
+            print(f"ALERTA: {var_type} abaixo do limite mínimo ({alert_thresholds['min']}{var_unit})")
+
+    print(f"\nValores extremos de {var_type} em {resultado['municipio']}:")
+    print(f"Máximo: {resultado['maximo']['valor_formatado']}")
+    print(f"Localização do máximo: {resultado['maximo']['localizacao']}")
+    print(f"Distância do centro (máximo): {resultado['maximo']['distancia_centro_km']:.1f} km")
+    print(f"Mínimo: {resultado['minimo']['valor_formatado']}")
+    print(f"Localização do mínimo: {resultado['minimo']['localizacao']}")
+    print(f"Distância do centro (mínimo): {resultado['minimo']['distancia_centro_km']:.1f} km")
+
 def read_municipios_shapefile():
     """Lê o shapefile dos municípios de Goiás."""
     # Obter caminho absoluto
@@ -633,6 +532,7 @@ def update_cities_polygons(municipios_gdf):
         # Limpar o cache anterior se existir
         if hasattr(find_municipio_by_code, 'cache'):
             del find_municipio_by_code.cache
+        clear_region_cache()
         
         # Processar todas as cidades de uma vez
         resultados = {}
@@ -663,14 +563,33 @@ def update_cities_polygons(municipios_gdf):
 
 if __name__ == "__main__":
     start_time = time.time()
+    start_metrics_server()
+    city_executor = ProcessPoolExecutor(max_workers=CITY_WORKERS) if CITY_WORKERS > 1 else None
+    grid = None
     
     try:
-        # Usar a data atual
-        date = datetime.now().strftime("%Y%m%d")  # Formato: YYYYMMDD
-        print(f"Usando data: {date[:4]}-{date[4:6]}-{date[6:8]}")
-        
-        # Baixar todos os arquivos do dia
-        downloaded_files = download_cempa_files(date)
+        # Usar a rodada 00z da data atual
+        run_date = datetime.now().strftime("%Y%m%d")  # Formato: YYYYMMDD
+        print(f"Usando rodada: {run_date[:4]}-{run_date[4:6]}-{run_date[6:8]} 00z")
+
+        # Horas de previsão publicadas (todo o horizonte) e, delas, as novas ou alteradas
+        published = published_lead_times(run_date)
+        if not published:
+            print("Nenhuma hora de previsão publicada. Encerrando execução.")
+            exit(1)
+        pending = pending_lead_times(run_date, published)
+        print(f"{len(published)} hora(s) de previsão publicada(s), {len(pending)} a processar")
+        if not pending:
+            print("Todas as horas publicadas já foram processadas. Encerrando execução.")
+            exit(0)
+
+        # Arquivos republicados: descarta a cópia local para baixar a nova versão
+        for lead, status in pending.items():
+            if status == "alterada":
+                for path in lead_paths(run_date, lead):
+                    get_cache().discard(path)
+
+        downloaded_files = download_cempa_files(run_date, list(pending))
         
         if not downloaded_files:
             print("Nenhum arquivo foi baixado. Encerrando execução.")
@@ -691,23 +610,88 @@ if __name__ == "__main__":
                         print(f"Código IBGE: {city_info['ibge_code']}")
                         print(f"Centro: Lat {city_info['centro'].y:.4f}°, Lon {city_info['centro'].x:.4f}°")
 
+        # Buscar coordenadas cadastradas pelos usuários (previsão por ponto)
+        registered_points = fetch_registered_points()
+        # Limiares personalizados dos usuários, ordenados para busca binária
+        user_index, threshold_users = build_threshold_index(fetch_user_thresholds())
+        # Variáveis derivadas são calculadas nas cidades com limiar da cidade ou de algum usuário
+        derived_cities = {name: dict(info, alerts={**{var: {} for (city, var) in user_index
+                                                      if city == name and var in DERIVED_VARIABLES},
+                                                   **info.get('alerts', {})})
+                          for name, info in CITIES.items()}
+        point_index = None
+        region_indexes_written = False
+        leads = {lead_paths(run_date, lead)[0]: lead for lead in pending}
+
         # Processar cada par de arquivos (CTL e GRA)
         for ctl_path, gra_path in downloaded_files:
-            # Extrair a hora do nome do arquivo
-            hour = ctl_path.split('-')[-2][:2]  # Pega os dois primeiros dígitos da hora
-            print(f"\nProcessando arquivos da hora {hour}:00...")
+            # Data e hora de validade a partir do nome do arquivo
+            date, hour = parse_valid_time(ctl_path)
+            print(f"\nProcessando arquivos de {date[6:8]}/{date[4:6]} {hour}:00...")
+            hour_start = time.time()
+
+            # Os índices dos municípios dependem só da grade: reaproveitados entre rodadas
+            # enquanto o descritor do .ctl não mudar (o dos pontos é refeito a cada grade)
+            signature = grid_signature(ctl_path)
+            if signature != grid:
+                if grid is not None:
+                    save_grid_indexes(grid, CITIES)
+                    clear_region_cache()
+                loaded = load_grid_indexes(signature, CITIES)
+                if loaded:
+                    print(f"Índices de {loaded} município(s) reaproveitados da grade {signature}")
+                grid = signature
+                point_index = None
+                region_indexes_written = False
             
-            # Converter para NetCDF
-            output_nc = f"./files/saida_{hour}.nc"
-            if convert_to_netcdf(ctl_path, output_nc):
+            # Converter para NetCDF (um arquivo por data e hora de validade)
+            output_nc = f"./files/saida_{date}_{hour}.nc"
+            converted = convert_to_netcdf(ctl_path, output_nc)
+            if converted:
+                get_cache().add(output_nc)
+
+                # Gravar a hora no cubo diário usado pela API de consulta
+                write_hour_to_cube(output_nc, date, hour, VARIABLES)
+                if not region_indexes_written:
+                    ds = open_dataset(output_nc)
+                    write_region_indexes(CITIES, ds.lat.values, ds.lon.values)
+                    region_indexes_written = True
+
                 # Gerar plot de umidade relativa
                 # output_plot = f"./files/humidity_plot_{date}_{hour}.png"
                 # print(f"\nGerando plot de umidade relativa para {hour}:00...")
                 # plot_humidity(output_nc, f"{date}{hour}00", output_plot)
+
+                # Avaliar todos os pontos cadastrados de uma só vez
+                if registered_points is not None:
+                    if point_index is None:
+                        point_index = build_point_index_from_file(output_nc, registered_points)
+                    point_values = evaluate_points(output_nc, point_index, VARIABLES)
+                    # Apenas alertas novos ou escalados desde as últimas execuções são publicados
+                    # na fila; o envio (resumos por inscrito) fica a cargo do dispatch_worker.py
+                    point_events = update_alert_state(point_observations(
+                        point_values, registered_points, get_active_alerts(prefix=POINT_PREFIX)))
+                    print(f"\n{len(registered_points['ids'])} pontos avaliados para {hour}:00, "
+                          f"{len(point_events)} evento(s) de alerta")
+                    try:
+                        get_queue().publish(dict(e, date=date, hour=hour)
+                                            for e in point_events if e['evento'] != 'encerrado')
+                    except QueueFull as e:
+                        print(f"AVISO: alertas da hora {hour}:00 não publicados: {e}")
                 
                 # Processar todas as cidades para este horário
+                hour_results = []
+                if city_executor is not None:
+                    cities = {name: {'polygon': info['polygon'], 'centro': info['centro']}
+                              for name, info in CITIES.items() if info['polygon'] is not None}
+                    hour_results = summarize_cities_shared(output_nc, cities, VARIABLES, city_executor,
+                                                           CITY_WORKERS, 100)
+                    for resultado in hour_results:
+                        check_city_alerts(resultado, CITIES[resultado['municipio']].get('alerts', {}))
+                    save_results(date, hour, hour_results)
+
                 for city_name, city_info in CITIES.items():
-                    if city_info['polygon'] is not None:
+                    if city_executor is None and city_info['polygon'] is not None:
                         print(f"\nAnalisando {city_name} para {hour}:00...")
 
                         # Analisar temperatura
@@ -726,6 +710,10 @@ if __name__ == "__main__":
                             'alerts': city_info.get('alerts', {})
                         }, 100)
 
+                        # Guardar estatísticas para reaproveitamento (plots, alertas, API, histórico)
+                        save_results(date, hour, [temperature_result, umid_result])
+                        hour_results.extend([temperature_result, umid_result])
+
                         # Imprimir resultados da umidade (a temperatura já imprime seus resultados)
                         if umid_result:
                             print(f"\nValores extremos de umidade em {city_name} para {hour}:00:")
@@ -736,12 +724,72 @@ if __name__ == "__main__":
                             print(f"Localização do mínimo: {umid_result['minimo']['localizacao']}")
                             print(f"Distância do centro (mínimo): {umid_result['minimo']['distancia_centro_km']:.1f} km")
 
+                # Variáveis derivadas (índice de calor, risco de fogo...) apenas nas cidades inscritas
+                derived_results = summarize_derived(output_nc, derived_cities, 100)
+                if derived_results:
+                    save_results(date, hour, derived_results)
+                    hour_results.extend(derived_results)
+                    for resultado in derived_results:
+                        check_city_alerts(resultado, CITIES[resultado['municipio']].get('alerts', {}))
+
+                # Registrar mudanças nos alertas das cidades (novos, escalados ou encerrados)
+                city_events = update_alert_state(city_observations(
+                    hour_results, {name: info.get('alerts', {}) for name, info in CITIES.items()}))
+                for evento in city_events:
+                    print(f"EVENTO: alerta {evento['evento']} - {evento['tipo_variavel']} em {evento['city']} "
+                          f"({evento['limite']} {evento['limiar']}, valor {evento['valor']:.1f})")
+
+                # Limiares personalizados: só os usuários em alerta (ou com alerta ativo) são avaliados
+                if threshold_users:
+                    user_events = update_alert_state(user_observations(
+                        user_index, threshold_users, hour_results, get_active_alerts(prefix=USER_PREFIX)))
+                    # Uma miniatura por (cidade, variável, hora), compartilhada pelos destinatários
+                    for evento in user_events:
+                        if evento['evento'] != 'encerrado':
+                            evento['thumbnail'] = city_thumbnail(
+                                output_nc, evento['municipio'], CITIES[evento['municipio']]['polygon'],
+                                evento['tipo_variavel'], date, hour)
+                    try:
+                        get_queue().publish(dict(e, date=date, hour=hour)
+                                            for e in user_events if e['evento'] != 'encerrado')
+                    except QueueFull as e:
+                        print(f"AVISO: alertas personalizados da hora {hour}:00 não publicados: {e}")
+
+                # Comparar todas as cidades com as normais climatológicas de uma só vez
+                check_anomaly_alerts(hour_results,
+                                     {name: info['ibge_code'] for name, info in CITIES.items()},
+                                     date)
+
+            # Arquivos da hora já processados: fechar o NetCDF e comprimir (se configurado)
+            release_dataset(output_nc)
+            get_cache().archive(output_nc)
+
+            # Horas com falha na conversão continuam pendentes para a próxima execução;
+            # o .ctl/.gra sai do cache (pode estar ausente ou corrompido) para ser baixado de novo
+            for path in (ctl_path, gra_path):
+                if converted:
+                    get_cache().archive(path)
+                else:
+                    get_cache().discard(path)
+            if converted:
+                mark_processed(run_date, leads[ctl_path], date, hour, published[leads[ctl_path]], grid)
+            record("process_hour", time.time() - hour_start, hour=hour)
+
     finally:
+        if grid is not None:
+            save_grid_indexes(grid, CITIES)
+        close_datasets()
+        get_cache().enforce_budget()
+        if city_executor is not None:
+            city_executor.shutdown()
+
         # Limpar o cache ao finalizar
         if hasattr(find_municipio_by_code, 'cache'):
             del find_municipio_by_code.cache
         
         # Calcular e mostrar o tempo total de execução
         execution_time = time.time() - start_time
+        record("run", execution_time)
+        write_prometheus()
         print(f"\n{'='*50}\nTempo total de execução:\n"
               f"{f'{int(execution_time//3600)}h {int((execution_time%3600)//60)}m {execution_time%60:.2f}s' if execution_time >= 3600 else f'{int(execution_time//60)}m {execution_time%60:.2f}s' if execution_time >= 60 else f'{execution_time:.2f}s'}\n{'='*50}")
\ No newline at end of file
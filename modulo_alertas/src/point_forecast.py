@@ -0,0 +1,173 @@
+import os
+import numpy as np
+import requests
+from dataset_pool import open_dataset
+from grid_index import build_point_index, gather_points, get_field_2d
+
+USERS_API_URL = os.environ.get("USERS_API_URL", "http://localhost:4000")
+# Prefixo das chaves de pontos no estado dos alertas
+POINT_PREFIX = "ponto:"
+
+# Limiares usados para pontos cadastrados (mesmos valores padrão das cidades)
+DEFAULT_POINT_ALERTS = {
+    "temperature": {
+        "max": 35,
+        "min": 14
+    },
+    "umidade": {
+        "max": 100,
+        "min": 20
+    }
+}
+
+
+def fetch_registered_points(api_url=None):
+    """
+    Busca no módulo de usuários todos os usuários com coordenada cadastrada.
+
+    Returns:
+        dict: Arrays com ids, emails, latitudes e longitudes dos pontos, ou None
+    """
+    api_url = api_url or USERS_API_URL
+    try:
+        response = requests.get(f"{api_url}/users/points", timeout=30)
+        if response.status_code == 404:
+            print("Nenhum ponto cadastrado pelos usuários.")
+            return None
+        response.raise_for_status()
+        return points_from_records(response.json())
+    except requests.RequestException as e:
+        print(f"Erro ao buscar pontos cadastrados: {e}")
+        return None
+
+
+def points_from_records(records):
+    """Converte a lista de usuários retornada pela API em arrays NumPy."""
+    if not records:
+        return None
+    return {
+        "ids": np.array([r["id"] for r in records]),
+        "emails": [r["email"] for r in records],
+        "latitudes": np.array([r["latitude"] for r in records], dtype=np.float64),
+        "longitudes": np.array([r["longitude"] for r in records], dtype=np.float64),
+    }
+
+
+def build_point_index_from_file(nc_file, points, var_name="t2mj", method="nearest"):
+    """
+    Cria o índice de pontos a partir dos eixos lat/lon de um arquivo NetCDF.
+
+    Como a grade é a mesma para todas as horas, basta chamar uma vez por execução.
+    """
+    ds = open_dataset(nc_file)
+    data = get_field_2d(ds, var_name)
+    index = build_point_index(data.lat.values, data.lon.values,
+                              points["latitudes"], points["longitudes"], method)
+
+    outside = int((~index["valid"]).sum())
+    if outside:
+        print(f"AVISO: {outside} ponto(s) cadastrado(s) fora da grade Go5km")
+    return index
+
+
+def evaluate_points(nc_file, point_index, variables, var_types=None):
+    """
+    Obtém o valor de cada variável em todos os pontos cadastrados.
+
+    Args:
+        nc_file (str): Caminho do arquivo NetCDF
+        point_index (dict): Índice criado por build_point_index_from_file
+        variables (dict): Mapeamento de variáveis (VARIABLES do main)
+        var_types (list): Tipos de variáveis a avaliar. Se None, avalia todas.
+
+    Returns:
+        dict: {tipo_variavel: array com um valor por ponto}
+    """
+    if var_types is None:
+        var_types = list(variables.keys())
+
+    valores = {}
+    ds = open_dataset(nc_file)
+    for var_type in var_types:
+        var_name = variables[var_type]["brams_name"]
+        if var_name not in ds.data_vars:
+            print(f"Erro: Variável '{var_name}' não encontrada no arquivo NetCDF")
+            continue
+        field = get_field_2d(ds, var_name).values
+        valores[var_type] = gather_points(field, point_index)
+    return valores
+
+
+def check_point_alerts(valores, points, thresholds=None):
+    """
+    Compara os valores de todos os pontos com os limiares de forma vetorizada.
+
+    Apenas os pontos em alerta são convertidos em dicionários.
+
+    Returns:
+        list: Alertas com id, email, variável, tipo de limite, valor e limiar
+    """
+    thresholds = thresholds or DEFAULT_POINT_ALERTS
+    alertas = []
+    for var_type, values in valores.items():
+        limites = thresholds.get(var_type, {})
+        with np.errstate(invalid="ignore"):
+            acima = values > limites.get("max", np.inf)
+            abaixo = values < limites.get("min", -np.inf)
+
+        for limite, selecionados in (("max", acima), ("min", abaixo)):
+            for i in np.flatnonzero(selecionados):
+                alertas.append({
+                    "usuario_id": int(points["ids"][i]),
+                    "email": points["emails"][i],
+                    "latitude": float(points["latitudes"][i]),
+                    "longitude": float(points["longitudes"][i]),
+                    "tipo_variavel": var_type,
+                    "limite": limite,
+                    "valor": float(values[i]),
+                    "limiar": limites[limite],
+                })
+    return alertas
+
+
+def point_observations(valores, points, active=(), thresholds=None):
+    """
+    Gera observações para update_alert_state sem percorrer todos os pontos.
+
+    Como em check_point_alerts, os pontos em alerta são selecionados com
+    máscaras; a eles se somam apenas os pontos com alerta ativo, necessários
+    para encerrar o alerta. Os pontos são identificados como "ponto:<id>".
+
+    Args:
+        valores (dict): Retorno de evaluate_points
+        points (dict): Pontos cadastrados (fetch_registered_points)
+        active (list): Alertas ativos de pontos (get_active_alerts(prefix=POINT_PREFIX))
+        thresholds (dict, optional): Limiares; padrão DEFAULT_POINT_ALERTS
+    """
+    thresholds = thresholds or DEFAULT_POINT_ALERTS
+    ids = np.asarray(points["ids"])
+    ativos = {}
+    for row in active:
+        ativos.setdefault((row["variable"], row["limit_type"]), []).append(int(row["city"][len(POINT_PREFIX):]))
+
+    for var_type, values in valores.items():
+        limites = thresholds.get(var_type, {})
+        for limite in ("max", "min"):
+            if limite not in limites:
+                continue
+            with np.errstate(invalid="ignore"):
+                selecionados = values > limites[limite] if limite == "max" else values < limites[limite]
+            if (var_type, limite) in ativos:
+                selecionados |= np.isin(ids, ativos[(var_type, limite)]) & ~np.isnan(values)
+            for i in np.flatnonzero(selecionados):
+                yield {
+                    "city": f"{POINT_PREFIX}{int(ids[i])}",
+                    "usuario_id": int(ids[i]),
+                    "email": points["emails"][i],
+                    "latitude": float(points["latitudes"][i]),
+                    "longitude": float(points["longitudes"][i]),
+                    "tipo_variavel": var_type,
+                    "limite": limite,
+                    "valor": float(values[i]),
+                    "limiar": limites[limite],
+                }
@@ -0,0 +1,171 @@
+import numpy as np
+from grid_index import build_region_index, region_window, window_indices, read_window
+
+
+def reduce_region(field, flat, percentiles=None):
+    """
+    Reduz um campo nas células de uma região em uma única passada.
+
+    Apenas as células da região são copiadas (em float32); nenhum temporário do
+    tamanho da grade é criado, ao contrário da sequência np.where/nanmax/nanargmax.
+
+    Args:
+        field (np.ndarray): Campo 2D (lat, lon)
+        flat (np.ndarray): Índices planos das células da região
+        percentiles (list, optional): Percentis a calcular (0-100)
+
+    Returns:
+        dict: count, min, max, argmin, argmax (índices planos na grade), mean e
+            percentiles; apenas count quando não há valores válidos
+    """
+    field = np.asarray(field)
+    if field.flags.c_contiguous:
+        values = field.reshape(-1).take(flat)
+    else:
+        values = field[np.unravel_index(flat, field.shape)]
+    values = values.astype(np.float32, copy=False)
+
+    nan = np.isnan(values)
+    if nan.any():
+        keep = np.flatnonzero(~nan)
+        values = values[keep]
+        flat = flat[keep]
+
+    stats = {"count": int(values.size)}
+    if values.size == 0:
+        return stats
+
+    i_min = int(values.argmin())
+    i_max = int(values.argmax())
+    stats.update({
+        "min": float(values[i_min]),
+        "max": float(values[i_max]),
+        "argmin": int(flat[i_min]),
+        "argmax": int(flat[i_max]),
+        "mean": float(values.mean(dtype=np.float64)),
+    })
+    if percentiles:
+        stats["percentiles"] = dict(zip(percentiles, np.percentile(values, percentiles).tolist()))
+    return stats
+
+
+def get_region_index(lats, lons, municipio_info, max_distance_km=None):
+    """
+    Retorna os índices planos do município, calculando-os apenas uma vez por grade.
+    """
+    if not hasattr(get_region_index, 'cache'):
+        get_region_index.cache = {}
+
+    key = (municipio_info['nome'], len(lats), len(lons),
+           float(lats[0]), float(lons[0]), max_distance_km)
+    if key not in get_region_index.cache:
+        get_region_index.cache[key] = build_region_index(
+            lats, lons, municipio_info['poligono'], municipio_info['centro'], max_distance_km)
+    return get_region_index.cache[key]
+
+
+def get_region_window(lats, lons, municipio_info, max_distance_km=None):
+    """
+    Retorna a janela do município e os índices das suas células dentro da janela.
+
+    Returns:
+        tuple: (janela (y0, y1, x0, x1) ou None, índices planos locais)
+    """
+    if not hasattr(get_region_window, 'cache'):
+        get_region_window.cache = {}
+
+    key = (municipio_info['nome'], len(lats), len(lons),
+           float(lats[0]), float(lons[0]), max_distance_km)
+    if key not in get_region_window.cache:
+        shape = (len(lats), len(lons))
+        flat = get_region_index(lats, lons, municipio_info, max_distance_km)
+        window = region_window(flat, shape)
+        local = window_indices(flat, shape, window) if window is not None else flat
+        get_region_window.cache[key] = (window, local)
+    return get_region_window.cache[key]
+
+
+def read_region(data, municipio_info, max_distance_km=None):
+    """
+    Lê apenas o recorte do município de um DataArray 2D (lat, lon).
+
+    Returns:
+        tuple: (valores da janela, latitudes da janela, longitudes da janela,
+            índices locais das células) ou None se o município não tiver células
+    """
+    lats = data.lat.values
+    lons = data.lon.values
+    window, local = get_region_window(lats, lons, municipio_info, max_distance_km)
+    if window is None:
+        return None
+
+    y0, y1, x0, x1 = window
+    return read_window(data, window), lats[y0:y1], lons[x0:x1], local
+
+
+def export_region_indexes():
+    """Índices calculados nesta execução: [(chave, índices planos)]."""
+    return list(getattr(get_region_index, 'cache', {}).items())
+
+
+def import_region_indexes(entries):
+    """Pré-carrega índices calculados em outra execução (mesma grade e polígonos)."""
+    if not hasattr(get_region_index, 'cache'):
+        get_region_index.cache = {}
+    for key, flat in entries:
+        get_region_index.cache.setdefault(tuple(key), flat)
+
+
+def clear_region_cache():
+    """Descarta os índices calculados (ex: quando os polígonos são atualizados)."""
+    for func in (get_region_index, get_region_window):
+        if hasattr(func, 'cache'):
+            del func.cache
+
+
+def summarize_region(field, lats, lons, flat, var_type, var_info, municipio_nome, centro):
+    """
+    Calcula os extremos de uma variável nas células pré-selecionadas de um município.
+
+    Retorna um dicionário no mesmo formato de find_extreme_temperature/find_extreme_humidity.
+
+    Args:
+        field (np.ndarray): Campo 2D (lat, lon) da janela do município (read_region)
+        lats (array): Latitudes da janela (não as da grade inteira)
+        lons (array): Longitudes da janela (não as da grade inteira)
+        flat (np.ndarray): Índices planos das células do município, locais à janela
+            (o quarto item de read_region). Índices da grade inteira só valem se
+            field/lats/lons também forem a grade inteira.
+        var_type (str): Tipo de variável (chave de VARIABLES)
+        var_info (dict): Entrada de VARIABLES para a variável
+        municipio_nome (str): Nome do município
+        centro (shapely.Point): Centro do município
+    """
+    stats = reduce_region(field, flat)
+    if stats["count"] == 0:
+        print(f"AVISO: Nenhum dado válido encontrado para {var_type} em {municipio_nome}")
+        return None
+
+    nx = len(lons)
+
+    def extremo(valor, flat_idx):
+        iy, ix = divmod(flat_idx, nx)
+        lat = float(lats[iy])
+        lon = float(lons[ix])
+        return {
+            "valor": valor,
+            "latitude": lat,
+            "longitude": lon,
+            "localizacao": f"Lat: {lat:.2f}°, Lon: {lon:.2f}°",
+            "valor_formatado": f"{valor:.1f}{var_info['unit']}",
+            "distancia_centro_km": float(np.hypot(lon - centro.x, lat - centro.y) * 111)
+        }
+
+    return {
+        "tipo_variavel": var_type,
+        "nome_variavel": var_info["brams_name"],
+        "maximo": extremo(stats["max"], stats["argmax"]),
+        "minimo": extremo(stats["min"], stats["argmin"]),
+        "municipio": municipio_nome,
+        "unidade": var_info["unit"]
+    }
@@ -0,0 +1,167 @@
+import os
+import sqlite3
+from contextlib import closing
+
+RESULTS_DB = os.environ.get("RESULTS_DB", "./files/results.db")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS city_stats (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    date TEXT NOT NULL,
+    hour INTEGER NOT NULL,
+    city TEXT NOT NULL,
+    variable TEXT NOT NULL,
+    unit TEXT,
+    max_value REAL,
+    max_lat REAL,
+    max_lon REAL,
+    max_distance_km REAL,
+    min_value REAL,
+    min_lat REAL,
+    min_lon REAL,
+    min_distance_km REAL,
+    created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_city_stats_lookup ON city_stats (city, variable, date, hour);
+CREATE INDEX IF NOT EXISTS idx_city_stats_date ON city_stats (date, hour);
+"""
+
+COLUMNS = ("date", "hour", "city", "variable", "unit",
+           "max_value", "max_lat", "max_lon", "max_distance_km",
+           "min_value", "min_lat", "min_lon", "min_distance_km")
+
+# Seleciona apenas a gravação mais recente de cada (data, hora, cidade, variável),
+# já que a tabela só recebe inserções (reprocessamentos geram novas linhas)
+LATEST_ROWS = """
+SELECT {columns} FROM city_stats
+WHERE id IN (
+    SELECT MAX(id) FROM city_stats
+    WHERE {where}
+    GROUP BY date, hour, city, variable
+)
+ORDER BY date, hour, city, variable
+"""
+
+
+def get_connection(db_path=None):
+    """Abre o banco de resultados, criando as tabelas e índices se necessário."""
+    db_path = db_path or RESULTS_DB
+    directory = os.path.dirname(db_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    conn = sqlite3.connect(db_path, timeout=30)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def _result_to_row(date, hour, resultado):
+    maximo = resultado["maximo"]
+    minimo = resultado["minimo"]
+    return (
+        date, int(hour), resultado["municipio"], resultado["tipo_variavel"], resultado.get("unidade"),
+        maximo["valor"], maximo["latitude"], maximo["longitude"], maximo["distancia_centro_km"],
+        minimo["valor"], minimo["latitude"], minimo["longitude"], minimo["distancia_centro_km"],
+    )
+
+
+def save_results(date, hour, resultados, db_path=None):
+    """
+    Grava os resultados de find_extreme_* para uma hora.
+
+    Args:
+        date (str): Data no formato YYYYMMDD
+        hour (int): Hora (0-23)
+        resultados (list): Dicionários retornados por find_extreme_temperature,
+            find_extreme_humidity ou os valores de find_extreme_variables
+    """
+    rows = [_result_to_row(date, hour, r) for r in resultados if r]
+    if not rows:
+        return 0
+
+    try:
+        with closing(get_connection(db_path)) as conn, conn:
+            conn.executemany(
+                f"INSERT INTO city_stats ({', '.join(COLUMNS)}) "
+                f"VALUES ({', '.join('?' for _ in COLUMNS)})",
+                rows,
+            )
+        return len(rows)
+    except sqlite3.Error as e:
+        print(f"Erro ao gravar resultados no banco: {e}")
+        return 0
+
+
+def get_results(date, hour, city=None, db_path=None):
+    """
+    Retorna os resultados já calculados de uma hora, evitando refazer as reduções.
+
+    Returns:
+        list: Um dicionário por (cidade, variável)
+    """
+    where = "date = ? AND hour = ?"
+    params = [date, int(hour)]
+    if city is not None:
+        where += " AND city = ?"
+        params.append(city)
+
+    with closing(get_connection(db_path)) as conn, conn:
+        rows = conn.execute(LATEST_ROWS.format(columns=", ".join(COLUMNS), where=where), params)
+        return [dict(row) for row in rows]
+
+
+def _history_filter(city, variable, start_date, end_date):
+    where = "city = ? AND variable = ?"
+    params = [city, variable]
+    if start_date:
+        where += " AND date >= ?"
+        params.append(start_date)
+    if end_date:
+        where += " AND date <= ?"
+        params.append(end_date)
+    return where, params
+
+
+def query_history(city, variable, start_date=None, end_date=None, db_path=None):
+    """
+    Retorna o histórico horário de uma variável em uma cidade.
+
+    Args:
+        city (str): Nome do município
+        variable (str): Tipo de variável (ex: "temperature", "umidade")
+        start_date (str, optional): Data inicial YYYYMMDD (inclusiva)
+        end_date (str, optional): Data final YYYYMMDD (inclusiva)
+    """
+    where, params = _history_filter(city, variable, start_date, end_date)
+    with closing(get_connection(db_path)) as conn, conn:
+        rows = conn.execute(LATEST_ROWS.format(columns=", ".join(COLUMNS), where=where), params)
+        return [dict(row) for row in rows]
+
+
+def query_daily_extremes(city, variable, start_date=None, end_date=None, db_path=None):
+    """
+    Agrega o histórico por dia (máximo e mínimo diários) para análise de tendência.
+
+    Returns:
+        list: Dicionários com date, max_value, min_value e hours (horas disponíveis)
+    """
+    where, params = _history_filter(city, variable, start_date, end_date)
+    query = f"""
+        SELECT date, MAX(max_value) AS max_value, MIN(min_value) AS min_value, COUNT(*) AS hours
+        FROM ({LATEST_ROWS.format(columns="date, max_value, min_value", where=where)})
+        GROUP BY date
+        ORDER BY date
+    """
+    with closing(get_connection(db_path)) as conn, conn:
+        return [dict(row) for row in conn.execute(query, params)]
+
+
+def get_processed_hours(start_date, end_date, db_path=None):
+    """Retorna o conjunto de (data, hora) que já possuem resultados no período."""
+    with closing(get_connection(db_path)) as conn, conn:
+        rows = conn.execute(
+            "SELECT DISTINCT date, hour FROM city_stats WHERE date >= ? AND date <= ?",
+            (start_date, end_date))
+        return {(row["date"], row["hour"]) for row in rows}
@@ -0,0 +1,203 @@
+import os
+import uuid
+import tempfile
+import numpy as np
+from dataset_pool import open_dataset
+from multiprocessing import shared_memory
+from grid_index import get_field_2d
+from region_stats import get_region_window, summarize_region
+from instrumentation import timed, count
+
+# "shm" usa multiprocessing.shared_memory; "mmap" usa arquivos .npy de rascunho
+# (útil quando /dev/shm é pequeno, como nos containers com o padrão de 64 MB)
+SHARED_FIELDS_BACKEND = os.environ.get("CEMPA_SHARED_BACKEND", "shm")
+SCRATCH_DIR = os.environ.get("CEMPA_SCRATCH_DIR", tempfile.gettempdir())
+
+
+class SharedFields:
+    """
+    Campos 2D de uma hora decodificados uma única vez pelo processo pai.
+
+    Os processos filhos recebem apenas os descritores (nome, forma, dtype) e
+    acessam os dados sem cópia com attach_field. Use como gerenciador de
+    contexto para liberar a memória compartilhada ao final da hora:
+
+        with SharedFields.from_netcdf(nc_file, ["t2mj", "rh"]) as fields:
+            executor.submit(worker, fields.descriptors, ...)
+    """
+
+    def __init__(self, backend=None, scratch_dir=None):
+        self.backend = backend or SHARED_FIELDS_BACKEND
+        self.scratch_dir = scratch_dir or SCRATCH_DIR
+        self.descriptors = {}
+        self._segments = []
+
+    @classmethod
+    @timed("share_fields")
+    def from_netcdf(cls, nc_file, var_names, backend=None, scratch_dir=None):
+        fields = cls(backend, scratch_dir)
+        try:
+            ds = open_dataset(nc_file)
+            fields.descriptors["lat"] = fields.put("lat", ds.lat.values)
+            fields.descriptors["lon"] = fields.put("lon", ds.lon.values)
+            for var_name in var_names:
+                if var_name not in ds.data_vars:
+                    continue
+                values = get_field_2d(ds, var_name).values
+                count("bytes_read", values.nbytes)
+                fields.descriptors[var_name] = fields.put(var_name, values)
+        except Exception:
+            fields.close()
+            raise
+        return fields
+
+    def put(self, name, values):
+        """Copia um array para um segmento compartilhado e retorna seu descritor."""
+        values = np.ascontiguousarray(values)
+        if self.backend == "mmap":
+            os.makedirs(self.scratch_dir, exist_ok=True)
+            path = os.path.join(self.scratch_dir, f"cempa_{name}_{uuid.uuid4().hex}.npy")
+            target = np.lib.format.open_memmap(path, mode="w+", dtype=values.dtype, shape=values.shape)
+            target[...] = values
+            target.flush()
+            del target
+            self._segments.append(path)
+            return ("mmap", path, values.shape, values.dtype.str)
+
+        shm = shared_memory.SharedMemory(create=True, size=max(values.nbytes, 1))
+        np.ndarray(values.shape, dtype=values.dtype, buffer=shm.buf)[...] = values
+        self._segments.append(shm)
+        return ("shm", shm.name, values.shape, values.dtype.str)
+
+    def close(self):
+        """Libera os segmentos (apenas o processo que os criou deve chamar)."""
+        for segment in self._segments:
+            if isinstance(segment, str):
+                if os.path.exists(segment):
+                    os.remove(segment)
+            else:
+                segment.close()
+                segment.unlink()
+        self._segments = []
+        self.descriptors = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+def attach_field(descriptor):
+    """
+    Abre um campo compartilhado sem copiá-lo.
+
+    Returns:
+        tuple: (array somente leitura, handle a ser passado para detach_field)
+    """
+    backend, name, shape, dtype = descriptor
+    if backend == "mmap":
+        values = np.load(name, mmap_mode="r")
+        return values, None
+
+    # Os filhos do pool compartilham o resource_tracker do pai, que continua
+    # responsável por remover o segmento
+    shm = shared_memory.SharedMemory(name=name)
+    values = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+    values.flags.writeable = False
+    return values, shm
+
+
+def detach_field(handle):
+    if handle is not None:
+        handle.close()
+
+
+def summarize_cities(descriptors, cities, variables, max_distance_km=None):
+    """
+    Reduz as cidades indicadas a partir dos campos compartilhados (executado nos filhos).
+
+    Args:
+        descriptors (dict): SharedFields.descriptors
+        cities (dict): {nome: {"polygon": ..., "centro": ...}}
+        variables (dict): VARIABLES de main.py
+        max_distance_km (float, optional): Distância máxima do centro
+
+    Returns:
+        list: Resultados no formato de find_extreme_* (cidades sem dados são omitidas)
+    """
+    handles = []
+    lats = lons = field = None
+    try:
+        lats, handle = attach_field(descriptors["lat"])
+        handles.append(handle)
+        lons, handle = attach_field(descriptors["lon"])
+        handles.append(handle)
+
+        regions = {}
+        for city_name, info in cities.items():
+            municipio_info = {"nome": city_name, "poligono": info["polygon"], "centro": info["centro"]}
+            regions[city_name] = get_region_window(lats, lons, municipio_info, max_distance_km)
+
+        resultados = []
+        for var_type, var_info in variables.items():
+            descriptor = descriptors.get(var_info["brams_name"])
+            if descriptor is None:
+                continue
+            field, handle = attach_field(descriptor)
+            handles.append(handle)
+
+            for city_name, (window, local) in regions.items():
+                if window is None:
+                    continue
+                y0, y1, x0, x1 = window
+                resultado = summarize_region(field[y0:y1, x0:x1], lats[y0:y1], lons[x0:x1], local,
+                                             var_type, var_info, city_name, cities[city_name]["centro"])
+                if resultado:
+                    resultados.append(resultado)
+        return resultados
+    finally:
+        # As views precisam ser descartadas antes de fechar os segmentos
+        lats = lons = field = None
+        for handle in handles:
+            detach_field(handle)
+
+
+def split_cities(cities, parts):
+    """Divide as cidades em até `parts` grupos de tamanho semelhante."""
+    names = list(cities)
+    parts = max(1, min(parts, len(names)))
+    return [{name: cities[name] for name in names[i::parts]} for i in range(parts)]
+
+
+@timed()
+def summarize_cities_shared(nc_file, cities, variables, executor, workers, max_distance_km=None,
+                            backend=None):
+    """
+    Decodifica os campos da hora uma vez e distribui as cidades entre os processos.
+
+    Cada processo acessa os mesmos campos sem cópia, então a memória não cresce
+    com o número de processos e o NetCDF não é lido novamente por cada um.
+
+    Args:
+        nc_file (str): Caminho do arquivo NetCDF
+        cities (dict): {nome: {"polygon": ..., "centro": ...}}
+        variables (dict): VARIABLES de main.py
+        executor (ProcessPoolExecutor): Pool reaproveitado entre as horas
+        workers (int): Número de grupos de cidades
+        max_distance_km (float, optional): Distância máxima do centro
+
+    Returns:
+        list: Resultados de todas as cidades
+    """
+    var_names = [info["brams_name"] for info in variables.values()]
+    with SharedFields.from_netcdf(nc_file, var_names, backend) as fields:
+        futures = [
+            executor.submit(summarize_cities, fields.descriptors, group, variables, max_distance_km)
+            for group in split_cities(cities, workers)
+        ]
+        resultados = []
+        for future in futures:
+            resultados.extend(future.result())
+    return resultados
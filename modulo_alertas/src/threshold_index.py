@@ -0,0 +1,128 @@
+import numpy as np
+import requests
+from point_forecast import USERS_API_URL
+
+# Prefixo das chaves de usuários no estado dos alertas
+USER_PREFIX = "usuario:"
+
+
+def fetch_user_thresholds(api_url=None):
+    """
+    Busca no módulo de usuários os limiares personalizados de todos os usuários.
+
+    Returns:
+        list: Registros com user_id, email, city, variable, limit_type e value, ou None
+    """
+    api_url = api_url or USERS_API_URL
+    try:
+        response = requests.get(f"{api_url}/users/thresholds", timeout=30)
+        if response.status_code == 404:
+            print("Nenhum limiar personalizado cadastrado.")
+            return None
+        response.raise_for_status()
+        return response.json()
+    except requests.RequestException as e:
+        print(f"Erro ao buscar limiares personalizados: {e}")
+        return None
+
+
+def build_threshold_index(records):
+    """
+    Ordena os limiares por (cidade, variável, tipo de limite).
+
+    Com os limiares ordenados, os usuários em alerta para um valor são sempre
+    uma fatia contígua encontrada por busca binária (ver recipients).
+
+    Returns:
+        tuple: ({(cidade, variável): {"max"|"min": {"values", "user_ids", "emails"}}},
+                {user_id: (email, cidade)})
+    """
+    grupos = {}
+    users = {}
+    for r in records or []:
+        grupos.setdefault((r["city"], r["variable"]), {}).setdefault(r["limit_type"], []).append(r)
+        users[r["user_id"]] = (r["email"], r["city"])
+
+    index = {}
+    for key, por_limite in grupos.items():
+        index[key] = {}
+        for limit_type, itens in por_limite.items():
+            values = np.array([r["value"] for r in itens], dtype=np.float64)
+            order = np.argsort(values, kind="stable")
+            index[key][limit_type] = {
+                "values": values[order],
+                "user_ids": np.array([r["user_id"] for r in itens])[order],
+                "emails": np.array([r["email"] for r in itens], dtype=object)[order],
+            }
+    return index, users
+
+
+def recipients(index, city, variable, limit_type, value):
+    """
+    Usuários cujo limiar foi ultrapassado por `value`, em O(log n + k).
+
+    Para "max" são os limiares menores que o máximo calculado (início do array
+    ordenado); para "min", os maiores que o mínimo calculado (final do array).
+
+    Returns:
+        tuple: (limiares, user_ids, emails) da fatia em alerta
+    """
+    entry = index.get((city, variable), {}).get(limit_type)
+    if entry is None:
+        return np.empty(0), np.empty(0, dtype=int), np.empty(0, dtype=object)
+
+    if limit_type == "max":
+        fatia = slice(0, np.searchsorted(entry["values"], value, side="left"))
+    else:
+        fatia = slice(np.searchsorted(entry["values"], value, side="right"), None)
+    return entry["values"][fatia], entry["user_ids"][fatia], entry["emails"][fatia]
+
+
+def user_observations(index, users, resultados, active=()):
+    """
+    Gera observações para update_alert_state a partir dos extremos das cidades.
+
+    Inclui apenas os usuários em alerta (fatias de recipients) e os alertas de
+    usuários ainda ativos, para que possam ser encerrados; os demais usuários
+    não são percorridos. Cada usuário é identificado como "usuario:<id>".
+
+    Args:
+        index, users: Retorno de build_threshold_index
+        resultados (list): Resultados no formato de find_extreme_*
+        active (list): Alertas ativos de usuários (get_active_alerts(prefix=USER_PREFIX))
+    """
+    extremos = {}
+    for r in resultados:
+        if r:
+            extremos[(r["municipio"], r["tipo_variavel"], "max")] = r["maximo"]["valor"]
+            extremos[(r["municipio"], r["tipo_variavel"], "min")] = r["minimo"]["valor"]
+
+    vistos = set()
+    for (city, variable, limit_type), valor in extremos.items():
+        limiares, user_ids, emails = recipients(index, city, variable, limit_type, valor)
+        for limiar, user_id, email in zip(limiares.tolist(), user_ids.tolist(), emails.tolist()):
+            vistos.add((user_id, variable, limit_type, limiar))
+            yield _observation(user_id, email, city, variable, limit_type, limiar, valor)
+
+    for row in active:
+        user_id = int(row["city"][len(USER_PREFIX):])
+        if (user_id, row["variable"], row["limit_type"], row["threshold"]) in vistos or user_id not in users:
+            continue
+        email, city = users[user_id]
+        valor = extremos.get((city, row["variable"], row["limit_type"]))
+        if valor is not None:
+            yield _observation(user_id, email, city, row["variable"], row["limit_type"],
+                               row["threshold"], valor)
+
+
+def _observation(user_id, email, city, variable, limit_type, limiar, valor):
+    return {
+        "city": f"{USER_PREFIX}{user_id}",
+        "municipio": city,
+        "usuario_id": user_id,
+        "email": email,
+        "tipo_variavel": variable,
+        "limite": limit_type,
+        "limiar": limiar,
+        "valor": valor,
+    }
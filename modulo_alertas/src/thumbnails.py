@@ -0,0 +1,174 @@
+import os
+import io
+import hashlib
+import numpy as np
+import matplotlib.colors as mcolors
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from PIL import Image
+from dataset_pool import open_dataset
+from grid_index import get_field_2d, bounds_window, read_window
+from cache_manager import get_cache
+from instrumentation import timed, count
+
+THUMBNAIL_DIR = os.environ.get("CEMPA_THUMBNAIL_DIR", "./files/thumbnails")
+# png (paleta de 64 cores) ou webp
+THUMBNAIL_FORMAT = os.environ.get("CEMPA_THUMBNAIL_FORMAT", "png").lower()
+# Tamanho máximo de cada miniatura; a resolução é reduzida até caber
+THUMBNAIL_MAX_BYTES = int(os.environ.get("CEMPA_THUMBNAIL_MAX_BYTES", 30 * 1024))
+THUMBNAIL_INCHES = 2.4
+THUMBNAIL_DPI = 100
+THUMBNAIL_MIN_DPI = 40
+# Células da grade além do retângulo do município
+THUMBNAIL_MARGIN = 3
+# Incrementar ao mudar o desenho, para não reaproveitar miniaturas antigas
+STYLE_VERSION = 1
+
+# Mesmas cores e níveis de plot_temperature/plot_humidity
+THUMBNAIL_STYLES = {
+    "temperature": {
+        "brams_name": "t2mj",
+        "colors": ['#0000b2', '#005ce6', '#008c8c', '#008000', '#66b032',
+                   '#ffff00', '#ffaa00', '#ff5500', '#cc0000', '#7f0000'],
+        "levels": np.arange(14, 39, 1),
+        "label": "Temperatura [°C]"
+    },
+    "umidade": {
+        "brams_name": "rh",
+        "colors": ['#ffff00', '#ffcc00', '#ff9900', '#ff6600', '#00cc00', '#009900',
+                   '#006600', '#003300', '#0000ff', '#000099', '#000066'],
+        "levels": np.arange(0, 101, 5),
+        "label": "Umidade Relativa [%]"
+    }
+}
+
+# Miniaturas já resolvidas nesta execução: {(cidade, variável, arquivo, mtime, formato, orçamento): caminho}
+_rendered = {}
+
+
+def _polygon_rings(polygon):
+    """Contornos externos do polígono (ou de cada parte de um MultiPolygon)."""
+    parts = getattr(polygon, "geoms", [polygon])
+    return [np.asarray(part.exterior.coords) for part in parts]
+
+
+def _draw(values, lats, lons, polygon, style, title, dpi):
+    fig = Figure(figsize=(THUMBNAIL_INCHES, THUMBNAIL_INCHES), dpi=dpi)
+    FigureCanvasAgg(fig)
+    ax = fig.add_axes([0.02, 0.16, 0.96, 0.74])
+    cmap = mcolors.LinearSegmentedColormap.from_list("thumb", style["colors"], N=len(style["levels"]) + 1)
+    norm = mcolors.BoundaryNorm(style["levels"], cmap.N, extend="both")
+    mesh = ax.pcolormesh(lons, lats, values, cmap=cmap, norm=norm, shading="nearest")
+    for ring in _polygon_rings(polygon):
+        ax.plot(ring[:, 0], ring[:, 1], color="black", linewidth=0.8)
+    ax.set_xlim(lons.min(), lons.max())
+    ax.set_ylim(lats.min(), lats.max())
+    ax.set_aspect("equal")
+    ax.set_xticks([])
+    ax.set_yticks([])
+    ax.set_title(title, fontsize=7)
+    cax = fig.add_axes([0.08, 0.07, 0.84, 0.04])
+    cbar = fig.colorbar(mesh, cax=cax, orientation="horizontal")
+    cbar.ax.tick_params(labelsize=5, length=2)
+    cbar.set_label(style["label"], fontsize=5)
+
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="png", dpi=dpi)
+    return buffer.getvalue()
+
+
+def _encode(png_bytes, fmt):
+    """Comprime a imagem: PNG com paleta reduzida ou WebP com perdas."""
+    image = Image.open(io.BytesIO(png_bytes)).convert("RGB")
+    buffer = io.BytesIO()
+    if fmt == "webp":
+        image.save(buffer, format="WEBP", quality=70, method=6)
+    else:
+        image.quantize(colors=64).save(buffer, format="PNG", optimize=True)
+    return buffer.getvalue()
+
+
+def render_thumbnail(values, lats, lons, polygon, var_type, title, fmt=None, max_bytes=None):
+    """
+    Desenha o recorte do campo com o contorno do município.
+
+    A resolução começa em THUMBNAIL_DPI e é reduzida até a imagem caber em
+    max_bytes (ou chegar a THUMBNAIL_MIN_DPI).
+
+    Returns:
+        bytes: Imagem codificada
+    """
+    fmt = fmt or THUMBNAIL_FORMAT
+    max_bytes = max_bytes or THUMBNAIL_MAX_BYTES
+    style = THUMBNAIL_STYLES[var_type]
+    dpi = THUMBNAIL_DPI
+    while True:
+        data = _encode(_draw(values, lats, lons, polygon, style, title, dpi), fmt)
+        if len(data) <= max_bytes or dpi <= THUMBNAIL_MIN_DPI:
+            return data
+        dpi = max(THUMBNAIL_MIN_DPI, int(dpi * 0.8))
+
+
+@timed()
+def city_thumbnail(nc_file, city, polygon, var_type, date, hour, fmt=None, max_bytes=None):
+    """
+    Miniatura de uma variável recortada no município, para anexar aos e-mails.
+
+    A imagem é renderizada uma vez por (cidade, variável, hora) e gravada com o
+    hash do seu conteúdo de entrada (recorte do campo, polígono, título e
+    formato) no nome, então é compartilhada por todos os destinatários e resumos
+    e não é redesenhada quando os mesmos dados são processados novamente.
+
+    Args:
+        nc_file (str): Caminho do arquivo NetCDF da hora
+        city (str): Nome do município
+        polygon (shapely.Geometry): Polígono do município
+        var_type (str): Variável em THUMBNAIL_STYLES (temperature, umidade)
+        date (str): Data no formato YYYYMMDD
+        hour (str): Hora (00-23)
+
+    Returns:
+        str: Caminho absoluto da miniatura, ou None se a variável não tiver estilo ou o município estiver fora da grade
+    """
+    if var_type not in THUMBNAIL_STYLES or polygon is None:
+        return None
+    fmt = fmt or THUMBNAIL_FORMAT
+    max_bytes = max_bytes or THUMBNAIL_MAX_BYTES
+    memo_key = (city, var_type, os.path.abspath(nc_file), os.stat(nc_file).st_mtime_ns, fmt, max_bytes)
+    if memo_key in _rendered:
+        return _rendered[memo_key]
+
+    ds = open_dataset(nc_file)
+    lats = ds.lat.values
+    lons = ds.lon.values
+    window = bounds_window(lats, lons, polygon.bounds, THUMBNAIL_MARGIN)
+    if window is None:
+        return None
+    y0, y1, x0, x1 = window
+    values = np.ascontiguousarray(read_window(get_field_2d(ds, THUMBNAIL_STYLES[var_type]["brams_name"]),
+                                              window), dtype=np.float32)
+    title = f"{city} - {date[6:8]}/{date[4:6]} {int(hour):02d}:00"
+
+    digest = hashlib.sha256()
+    for part in (f"{STYLE_VERSION}|{var_type}|{fmt}|{max_bytes}|{title}".encode("utf-8"),
+                 polygon.wkb, values.tobytes()):
+        digest.update(part)
+    digest = digest.hexdigest()
+    # Caminho absoluto: o worker de envio roda em outro diretório
+    path = os.path.abspath(os.path.join(THUMBNAIL_DIR, digest[:2], f"{digest}.{fmt}"))
+
+    if os.path.exists(path):
+        count("thumbnails_reused")
+    else:
+        data = render_thumbnail(values, lats[y0:y1], lons[x0:x1], polygon, var_type, title, fmt, max_bytes)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        get_cache().add(path)
+        count("thumbnails_rendered")
+        count("bytes_written", len(data))
+
+    _rendered[memo_key] = path
+    return path
@@ -0,0 +1,6 @@
+from src import create_app
+
+app = create_app()
+
+if __name__ == '__main__':
+    app.run(host='0.0.0.0', port=4001)
\ No newline at end of file
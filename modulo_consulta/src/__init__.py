@@ -0,0 +1,14 @@
+from flask import Flask
+from os import environ
+
+def create_app():
+    app = Flask(__name__)
+    app.config['CUBE_DIR'] = environ.get('CUBE_DIR', '../modulo_alertas/files/cube')
+
+    from .services import CubeService
+    CubeService.init(app.config['CUBE_DIR'])
+
+    from .routes import bp as routes_bp
+    app.register_blueprint(routes_bp)
+
+    return app
@@ -0,0 +1,47 @@
+import re
+from flask import Blueprint, request, jsonify, make_response
+from .services import CubeService
+
+bp = Blueprint('routes', __name__)
+
+VARIABLES = ('t2mj', 'rh')
+DATE_PATTERN = re.compile(r'\d{8}', re.ASCII)
+
+def parse_query():
+    var_name = request.args.get('var', 't2mj')
+    if var_name not in VARIABLES:
+        raise ValueError(f'invalid var: {var_name}')
+    hour = int(request.args.get('hour', 0))
+    if not 0 <= hour <= 23:
+        raise ValueError(f'invalid hour: {hour}')
+    date = request.args.get('date')
+    if date and not DATE_PATTERN.fullmatch(date):
+        raise ValueError(f'invalid date: {date}')
+    date = date or CubeService.latest_date()
+    if date is None:
+        raise ValueError('no forecast available')
+    return date, var_name, hour
+
+@bp.route('/forecast/point', methods=['GET'])
+def point_forecast():
+    try:
+        date, var_name, hour = parse_query()
+        lat = float(request.args['lat'])
+        lon = float(request.args['lon'])
+        result = CubeService.point_value(date, var_name, hour, lat, lon)
+        if result is None:
+            return make_response(jsonify({'error': 'forecast not found'}), 404)
+        return make_response(jsonify(result), 200)
+    except (KeyError, ValueError) as e:
+        return make_response(jsonify({'error': str(e)}), 400)
+
+@bp.route('/forecast/city/<city>', methods=['GET'])
+def city_forecast(city):
+    try:
+        date, var_name, hour = parse_query()
+        result = CubeService.city_stats(date, var_name, hour, city)
+        if result is None:
+            return make_response(jsonify({'error': 'forecast not found'}), 404)
+        return make_response(jsonify(result), 200)
+    except ValueError as e:
+        return make_response(jsonify({'error': str(e)}), 400)
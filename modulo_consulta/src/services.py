@@ -0,0 +1,189 @@
+import os
+import json
+import time
+import threading
+from datetime import datetime
+from collections import OrderedDict
+import numpy as np
+
+MAX_OPEN_CUBES = 6
+LATEST_DATE_TTL = 60
+# Intervalo entre verificações de mudança na grade e nos índices dos municípios
+INDEX_CHECK_TTL = 60
+INDEX_FILES = ('grid.npz', 'regions.npz', 'regions.json')
+
+
+class CubeService:
+    cube_dir = None
+    lats = None
+    lons = None
+    # Grade regular: (lat0, passo, lon0, passo) para calcular a célula sem busca
+    grid_step = None
+    regions = {}
+    region_names = {}
+    cubes = OrderedDict()
+    latest = (None, 0.0)
+    index_version = None
+    index_checked_at = 0.0
+    # O servidor do Flask atende em várias threads: cubos abertos, data mais
+    # recente e índices só são alterados com este lock
+    lock = threading.Lock()
+
+    @staticmethod
+    def init(cube_dir):
+        CubeService.cube_dir = cube_dir
+        CubeService.cubes = OrderedDict()
+        CubeService.index_version = None
+        CubeService.refresh_indexes()
+
+    @staticmethod
+    def _index_version():
+        version = []
+        for name in INDEX_FILES:
+            try:
+                stat = os.stat(os.path.join(CubeService.cube_dir, name))
+                version.append((stat.st_mtime_ns, stat.st_size))
+            except OSError:
+                version.append(None)
+        return tuple(version)
+
+    @staticmethod
+    def refresh_indexes():
+        # Recarrega a grade e os índices quando os arquivos forem regravados (grade nova)
+        now = time.monotonic()
+        if CubeService.index_version is not None and now - CubeService.index_checked_at < INDEX_CHECK_TTL:
+            return
+        with CubeService.lock:
+            if CubeService.index_version is not None and now - CubeService.index_checked_at < INDEX_CHECK_TTL:
+                return
+            CubeService.index_checked_at = now
+            version = CubeService._index_version()
+            if version != CubeService.index_version:
+                CubeService.load_indexes()
+                CubeService.index_version = version
+
+    @staticmethod
+    def _regular_step(axis):
+        steps = np.diff(axis)
+        if steps.size and np.allclose(steps, steps[0], rtol=1e-4, atol=0):
+            return float(axis[0]), float(steps[0])
+        return None
+
+    @staticmethod
+    def load_indexes():
+        grid_path = os.path.join(CubeService.cube_dir, 'grid.npz')
+        regions_path = os.path.join(CubeService.cube_dir, 'regions.npz')
+        names_path = os.path.join(CubeService.cube_dir, 'regions.json')
+
+        if os.path.exists(grid_path):
+            with np.load(grid_path) as grid:
+                CubeService.lats = grid['lat']
+                CubeService.lons = grid['lon']
+            lat_step = CubeService._regular_step(CubeService.lats)
+            lon_step = CubeService._regular_step(CubeService.lons)
+            CubeService.grid_step = lat_step + lon_step if lat_step and lon_step else None
+
+        if os.path.exists(regions_path) and os.path.exists(names_path):
+            with np.load(regions_path) as regions:
+                CubeService.regions = {key: regions[key] for key in regions.files}
+            with open(names_path, encoding='utf-8') as f:
+                CubeService.region_names = json.load(f)
+
+    @staticmethod
+    def latest_date():
+        # Evita listar o diretório a cada requisição
+        date, checked_at = CubeService.latest
+        if date is not None and time.monotonic() - checked_at < LATEST_DATE_TTL:
+            return date
+
+        if not os.path.isdir(CubeService.cube_dir):
+            return None
+        dates = [d for d in os.listdir(CubeService.cube_dir)
+                 if os.path.isdir(os.path.join(CubeService.cube_dir, d))]
+        # Com o horizonte de vários dias há cubos de dias futuros, quase todos vazios:
+        # o padrão é o dia atual (ou o último dia disponível até hoje)
+        today = datetime.now().strftime('%Y%m%d')
+        past = [d for d in dates if d <= today]
+        date = max(past) if past else min(dates) if dates else None
+        with CubeService.lock:
+            CubeService.latest = (date, time.monotonic())
+        return date
+
+    @staticmethod
+    def get_cube(date, var_name):
+        key = (date, var_name)
+        with CubeService.lock:
+            cube = CubeService.cubes.get(key)
+            if cube is not None:
+                CubeService.cubes.move_to_end(key)
+                return cube
+
+            path = os.path.join(CubeService.cube_dir, date, f'{var_name}.npy')
+            if not os.path.exists(path):
+                return None
+
+            # O mapeamento é aberto uma vez e mantido entre requisições
+            cube = np.load(path, mmap_mode='r')
+            CubeService.cubes[key] = cube
+            while len(CubeService.cubes) > MAX_OPEN_CUBES:
+                CubeService.cubes.popitem(last=False)
+            return cube
+
+    @staticmethod
+    def nearest_cell(lat, lon):
+        CubeService.refresh_indexes()
+        if CubeService.lats is None:
+            raise ValueError('grid not available')
+
+        lats, lons = CubeService.lats, CubeService.lons
+        if not (min(lats[0], lats[-1]) <= lat <= max(lats[0], lats[-1])
+                and min(lons[0], lons[-1]) <= lon <= max(lons[0], lons[-1])):
+            return None
+        if CubeService.grid_step is not None:
+            # Grade regular (Go5km): índice calculado direto pelo passo
+            lat0, dlat, lon0, dlon = CubeService.grid_step
+            iy = min(max(int(round((lat - lat0) / dlat)), 0), len(lats) - 1)
+            ix = min(max(int(round((lon - lon0) / dlon)), 0), len(lons) - 1)
+            return iy, ix
+        iy = int(np.abs(lats - lat).argmin())
+        ix = int(np.abs(lons - lon).argmin())
+        return iy, ix
+
+    @staticmethod
+    def point_value(date, var_name, hour, lat, lon):
+        cube = CubeService.get_cube(date, var_name)
+        if cube is None:
+            return None
+        cell = CubeService.nearest_cell(lat, lon)
+        if cell is None:
+            return None
+        iy, ix = cell
+        value = float(cube[hour, iy, ix])
+        return {
+            'date': date,
+            'hour': hour,
+            'var': var_name,
+            'latitude': float(CubeService.lats[iy]),
+            'longitude': float(CubeService.lons[ix]),
+            'value': None if np.isnan(value) else value
+        }
+
+    @staticmethod
+    def city_stats(date, var_name, hour, city):
+        CubeService.refresh_indexes()
+        key = CubeService.region_names.get(city, city)
+        flat = CubeService.regions.get(key)
+        cube = CubeService.get_cube(date, var_name)
+        if flat is None or cube is None:
+            return None
+
+        values = cube[hour].reshape(-1)[flat]
+        valid = values[~np.isnan(values)]
+        stats = {'date': date, 'hour': hour, 'var': var_name, 'city': city, 'count': int(valid.size)}
+        if valid.size:
+            stats.update({
+                'min': float(valid.min()),
+                'max': float(valid.max()),
+                'mean': float(valid.mean())
+            })
+        return stats
@@ -0,0 +1,264 @@
+import os
+import sqlite3
+import time
+from contextlib import closing
+from collections import defaultdict
+from scheduler import SEVERITY_LEVELS
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+DIGEST_DB = os.environ.get("DIGEST_DB", os.path.join(BASE_DIR, "..", "modulo_alertas", "files", "digest.db"))
+# Janela de agrupamento: cada inscrito recebe no máximo um resumo por janela
+DIGEST_WINDOW_HOURS = float(os.environ.get("DIGEST_WINDOW_HOURS", 24))
+# Alertas com severidade igual ou maior são enviados imediatamente (além do resumo)
+DIGEST_URGENT_SEVERITY = int(os.environ.get("DIGEST_URGENT_SEVERITY", 3))
+
+# Para alertas sem "nivel" (ex: check_point_alerts): excesso sobre o limiar a partir do
+# qual o alerta sobe de nível (1 = aviso, 2 = alerta, 3 = urgente)
+SEVERITY_STEPS = {
+    "temperature": (2.0, 4.0),   # °C
+    "umidade": (5.0, 10.0)       # pontos percentuais
+}
+SEVERITY_LABELS = {1: "Aviso", 2: "Alerta", 3: "Urgente"}
+UNITS = {"temperature": "°C", "umidade": "%"}
+NAMES = {"temperature": "Temperatura", "umidade": "Umidade relativa"}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS digest_events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    usuario_id INTEGER NOT NULL,
+    email TEXT NOT NULL,
+    date TEXT NOT NULL,
+    hour INTEGER NOT NULL,
+    variable TEXT NOT NULL,
+    limit_type TEXT NOT NULL,
+    value REAL NOT NULL,
+    threshold REAL NOT NULL,
+    severity INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    urgent_sent INTEGER NOT NULL DEFAULT 0,
+    thumbnail TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_digest_events_user ON digest_events (usuario_id, created_at);
+"""
+
+
+def get_connection(db_path=None):
+    db_path = db_path or DIGEST_DB
+    directory = os.path.dirname(db_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    conn = sqlite3.connect(db_path, timeout=30)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(SCHEMA)
+    # Bancos criados antes das miniaturas não têm a coluna thumbnail
+    if "thumbnail" not in {row["name"] for row in conn.execute("PRAGMA table_info(digest_events)")}:
+        conn.execute("ALTER TABLE digest_events ADD COLUMN thumbnail TEXT")
+    return conn
+
+
+def severity(alerta):
+    """
+    Severidade do alerta (1-3), usada no resumo e na prioridade de envio.
+
+    Os eventos do estado dos alertas trazem o "nivel" (calculado com os passos
+    de escalonamento de todas as variáveis), limitado aqui às severidades do
+    scheduler; apenas alertas sem nível usam SEVERITY_STEPS.
+    """
+    if alerta.get("nivel"):
+        return min(max(int(alerta["nivel"]), SEVERITY_LEVELS[0]), SEVERITY_LEVELS[-1])
+    excesso = abs(alerta["valor"] - alerta["limiar"])
+    passos = SEVERITY_STEPS.get(alerta["tipo_variavel"], ())
+    return 1 + sum(excesso >= passo for passo in passos)
+
+
+def add_events(alertas, date, hour, db_path=None):
+    """
+    Guarda os alertas de uma hora (formato de check_point_alerts) até o envio.
+
+    Returns:
+        int: Número de alertas registrados
+    """
+    now = time.time()
+    rows = [
+        (a["usuario_id"], a["email"], date, int(hour), a["tipo_variavel"], a["limite"],
+         float(a["valor"]), float(a["limiar"]), severity(a), now, a.get("thumbnail"))
+        for a in alertas
+    ]
+    if rows:
+        with closing(get_connection(db_path)) as conn, conn:
+            conn.executemany(
+                "INSERT INTO digest_events (usuario_id, email, date, hour, variable, limit_type, "
+                "value, threshold, severity, created_at, thumbnail) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                rows)
+    return len(rows)
+
+
+def build_timeline(events):
+    """
+    Agrupa os eventos de um inscrito por variável e tipo de limite.
+
+    Returns:
+        dict: {(variável, limite): {"pico": evento, "horas": [eventos ordenados por data/hora]}}
+    """
+    grupos = defaultdict(list)
+    for event in events:
+        grupos[(event["variable"], event["limit_type"])].append(event)
+
+    timeline = {}
+    for (variable, limit_type), itens in sorted(grupos.items()):
+        itens.sort(key=lambda e: (e["date"], e["hour"]))
+        escolher = max if limit_type == "max" else min
+        timeline[(variable, limit_type)] = {
+            "pico": escolher(itens, key=lambda e: e["value"]),
+            "horas": itens
+        }
+    return timeline
+
+
+def _format_event_hour(event):
+    return f"{event['date'][6:8]}/{event['date'][4:6]} {event['hour']:02d}:00"
+
+
+def digest_attachments(events):
+    """Miniaturas exibidas no resumo (a do pico de cada variável), sem repetição."""
+    anexos = []
+    for grupo in build_timeline(events).values():
+        thumbnail = grupo["pico"].get("thumbnail")
+        if thumbnail and thumbnail not in anexos and os.path.exists(thumbnail):
+            anexos.append(thumbnail)
+    return anexos
+
+
+def build_digest(events):
+    """
+    Monta o corpo HTML do resumo com a linha do tempo de cada variável.
+
+    A miniatura do pico, quando existe, é referenciada pelo nome do arquivo
+    (cid:) e enviada como anexo (ver digest_attachments).
+    """
+    partes = ["<h2>Resumo de alertas meteorológicos</h2>"]
+    for (variable, limit_type), grupo in build_timeline(events).items():
+        unidade = UNITS.get(variable, "")
+        pico = grupo["pico"]
+        sentido = "acima do limite máximo" if limit_type == "max" else "abaixo do limite mínimo"
+        partes.append(
+            f"<h3>{NAMES.get(variable, variable)} {sentido} ({pico['threshold']:.1f}{unidade})</h3>"
+            f"<p>Pico: <b>{pico['value']:.1f}{unidade}</b> em {_format_event_hour(pico)} "
+            f"({SEVERITY_LABELS.get(pico['severity'], pico['severity'])})</p>"
+        )
+        if pico.get("thumbnail") and os.path.exists(pico["thumbnail"]):
+            partes.append(f'<p><img src="cid:{os.path.basename(pico["thumbnail"])}" alt="Mapa"></p>')
+        partes.append("<table><tr><th>Horário</th><th>Valor</th><th>Nível</th></tr>")
+        for event in grupo["horas"]:
+            partes.append(
+                f"<tr><td>{_format_event_hour(event)}</td><td>{event['value']:.1f}{unidade}</td>"
+                f"<td>{SEVERITY_LABELS.get(event['severity'], event['severity'])}</td></tr>")
+        partes.append("</table>")
+    return "\n".join(partes)
+
+
+def default_sender(destinatarios, corpo_email, anexos=None):
+    from sendEmail import enviar_email
+    enviar_email(destinatarios, corpo_email, os.getenv("EMAIL_REMETENTE", ""), anexos)
+
+
+def _mark_sent(ids, delete, db_path=None):
+    """Marca os alertas como enviados (urgentes) ou os remove (resumo enviado)."""
+    sql = "DELETE FROM digest_events WHERE id = ?" if delete else \
+        "UPDATE digest_events SET urgent_sent = 1 WHERE id = ?"
+    with closing(get_connection(db_path)) as conn, conn:
+        conn.executemany(sql, [(event_id,) for event_id in ids])
+
+
+def pending_messages(now=None, window_hours=None, urgent_severity=None, db_path=None):
+    """
+    Monta as mensagens devidas: um resumo por inscrito cuja janela terminou e,
+    para os demais, uma mensagem com os alertas urgentes ainda não enviados.
+
+    O resumo inclui os alertas urgentes da janela, então substitui a mensagem urgente.
+
+    Returns:
+        list: Mensagens (scheduler.Message) com on_sent atualizando o banco
+    """
+    from scheduler import Message
+
+    now = now or time.time()
+    window = (window_hours if window_hours is not None else DIGEST_WINDOW_HOURS) * 3600
+    urgent_severity = urgent_severity if urgent_severity is not None else DIGEST_URGENT_SEVERITY
+
+    por_usuario = defaultdict(list)
+    with closing(get_connection(db_path)) as conn:
+        for row in conn.execute("SELECT * FROM digest_events ORDER BY usuario_id, id"):
+            por_usuario[row["usuario_id"]].append(dict(row))
+
+    messages = []
+    for usuario_id, events in por_usuario.items():
+        email = events[-1]["email"]
+        inicio = min(e["created_at"] for e in events)
+        if now - inicio >= window:
+            ids = [e["id"] for e in events]
+            messages.append(Message(
+                usuario_id, [email], build_digest(events), max(e["severity"] for e in events),
+                created_at=inicio + window, anexos=digest_attachments(events),
+                on_sent=lambda ids=ids: _mark_sent(ids, True, db_path), kind="resumos"))
+            continue
+
+        urgentes = [e for e in events if e["severity"] >= urgent_severity and not e["urgent_sent"]]
+        if urgentes:
+            ids = [e["id"] for e in urgentes]
+            messages.append(Message(
+                usuario_id, [email], "<p><b>Alerta urgente</b></p>\n" + build_digest(urgentes),
+                max(e["severity"] for e in urgentes),
+                created_at=min(e["created_at"] for e in urgentes), anexos=digest_attachments(urgentes),
+                on_sent=lambda ids=ids: _mark_sent(ids, False, db_path), kind="urgentes"))
+    return messages
+
+
+def flush(now=None, sender=None, window_hours=None, urgent_severity=None, db_path=None, scheduler=None):
+    """
+    Envia os alertas urgentes pendentes e os resumos cuja janela terminou.
+
+    Um resumo é enviado quando o alerta mais antigo do inscrito tem mais de
+    window_hours; todos os alertas da janela vão em uma única mensagem e são
+    removidos em seguida. Alertas com severidade >= urgent_severity são enviados
+    de imediato e continuam na linha do tempo do resumo.
+
+    Args:
+        sender (callable, optional): sender(destinatarios, corpo_html); padrão enviar_email
+        scheduler (DispatchScheduler, optional): Agenda as mensagens por severidade em vez
+            de enviá-las em sequência; o banco é atualizado quando cada envio termina
+
+    Returns:
+        dict: {"urgentes": mensagens urgentes, "resumos": resumos enviados (ou agendados)}
+    """
+    messages = pending_messages(now, window_hours, urgent_severity, db_path)
+    enviados = {"urgentes": 0, "resumos": 0}
+    for message in messages:
+        if scheduler is not None:
+            if scheduler.submit(message):
+                enviados[message.kind] += 1
+            continue
+        try:
+            message.send(sender or default_sender)
+            message.on_sent()
+            enviados[message.kind] += 1
+        except Exception as e:
+            # Os alertas continuam pendentes e serão reenviados no próximo flush
+            print(f"Erro ao enviar alertas para o usuário {message.key}: {e}")
+    return enviados
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Envia os resumos de alertas pendentes")
+    parser.add_argument("--window-hours", type=float, default=None,
+                        help=f"Janela de agrupamento (padrão {DIGEST_WINDOW_HOURS})")
+    parser.add_argument("--urgent-severity", type=int, default=None,
+                        help=f"Severidade enviada imediatamente (padrão {DIGEST_URGENT_SEVERITY})")
+    args = parser.parse_args()
+
+    enviados = flush(window_hours=args.window_hours, urgent_severity=args.urgent_severity)
+    print(f"{enviados['urgentes']} alerta(s) urgente(s) e {enviados['resumos']} resumo(s) enviados")
@@ -0,0 +1,84 @@
+import os
+import time
+from collections import defaultdict
+
+from event_queue import get_queue
+from digest import add_events, flush, default_sender
+from scheduler import DispatchScheduler
+
+# Intervalo mínimo entre verificações dos resumos pendentes (envio por SMTP)
+FLUSH_INTERVAL_SECONDS = float(os.environ.get("DISPATCH_FLUSH_INTERVAL", 60))
+
+
+def process_batch(batch):
+    """
+    Grava um lote de eventos da fila no resumo de alertas.
+
+    Returns:
+        int: Número de eventos gravados
+    """
+    por_hora = defaultdict(list)
+    for _, evento in batch:
+        por_hora[(evento["date"], int(evento["hour"]))].append(evento)
+    for (date, hour), eventos in por_hora.items():
+        add_events(eventos, date, hour)
+    return len(batch)
+
+
+def run_worker(queue=None, batch_size=200, once=False):
+    """
+    Consome os eventos publicados pelo modulo_alertas e envia os resumos.
+
+    O consumo da fila e o envio por SMTP são independentes: os e-mails são
+    enviados pelo DispatchScheduler, em ordem de severidade, enquanto os
+    eventos continuam sendo consumidos (com backpressure sobre o gerador
+    quando a fila atinge o limite).
+
+    Args:
+        queue (EventQueue, optional): Fila; padrão EVENT_QUEUE_URL
+        batch_size (int): Eventos por lote
+        once (bool): Processa o que houver na fila, envia os resumos e encerra
+    """
+    queue = queue or get_queue()
+    scheduler = DispatchScheduler(default_sender)
+    try:
+        _consume_loop(queue, scheduler, batch_size, once)
+    finally:
+        scheduler.close()
+        if once:
+            print(f"Envios: {scheduler.stats()}")
+
+
+def _consume_loop(queue, scheduler, batch_size, once):
+    last_flush = 0.0
+    while True:
+        batch = queue.consume(batch_size, wait=0 if once else 5)
+        if batch:
+            ids = [event_id for event_id, _ in batch]
+            try:
+                process_batch(batch)
+                queue.ack(ids)
+            except Exception as e:
+                print(f"Erro ao processar lote de {len(batch)} eventos: {e}")
+                queue.nack(ids)
+
+        if once and batch:
+            continue
+        if once or time.monotonic() - last_flush >= FLUSH_INTERVAL_SECONDS:
+            enviados = flush(scheduler=scheduler)
+            if enviados["urgentes"] or enviados["resumos"]:
+                print(f"{enviados['urgentes']} alerta(s) urgente(s) e {enviados['resumos']} resumo(s) agendados")
+            last_flush = time.monotonic()
+        if once:
+            return
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Consome a fila de alertas e envia os resumos")
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--once", action="store_true", help="Esvazia a fila, envia e encerra (uso via cron)")
+    args = parser.parse_args()
+
+    run_worker(batch_size=args.batch_size, once=args.once)
@@ -0,0 +1,229 @@
+import os
+import time
+import threading
+from collections import OrderedDict, deque
+
+import numpy as np
+
+from instrumentation import record
+
+# Threads de envio
+DISPATCH_WORKERS = int(os.environ.get("DISPATCH_WORKERS", 4))
+# Máximo de envios simultâneos por severidade, ex: "3:4,2:2,1:1". Independente das
+# cotas, as severidades menores nunca ocupam a última thread livre (reservada aos urgentes)
+DISPATCH_QUOTAS = os.environ.get("DISPATCH_QUOTAS", "")
+# Severidades atendidas (a maior é a dos alertas urgentes); níveis acima são limitados à maior
+SEVERITY_LEVELS = (1, 2, 3)
+
+
+def parse_quotas(spec, workers):
+    """
+    Converte DISPATCH_QUOTAS em {severidade: máximo de envios simultâneos}.
+
+    Sem configuração: a severidade máxima usa todas as threads, a 2 metade e a 1 um quarto.
+    """
+    quotas = {SEVERITY_LEVELS[-1]: workers, 2: max(1, workers // 2), 1: max(1, workers // 4)}
+    for item in filter(None, (parte.strip() for parte in spec.split(","))):
+        nivel, limite = item.split(":")
+        quotas[int(nivel)] = max(1, int(limite))
+    return quotas
+
+
+class Message:
+    """
+    Mensagem a enviar para um inscrito.
+
+    Args:
+        key: Identifica o destinatário; uma mensagem nova com a mesma chave substitui a pendente
+        destinatarios (list): E-mails
+        corpo (str): Corpo HTML
+        severity (int): Maior severidade dos alertas da mensagem (define a prioridade)
+        created_at (float): Horário (time.time) do alerta mais antigo, para o tempo até o envio
+        on_sent (callable, optional): Chamado na thread de envio após o envio bem-sucedido
+        kind (str, optional): Tipo da mensagem (ex: "urgentes", "resumos"), apenas informativo
+        anexos (list, optional): Imagens referenciadas no corpo por cid:<nome do arquivo>
+    """
+
+    __slots__ = ("key", "destinatarios", "corpo", "severity", "created_at", "on_sent", "kind", "anexos",
+                 "enqueued_at")
+
+    def __init__(self, key, destinatarios, corpo, severity, created_at=None, on_sent=None, kind=None,
+                 anexos=None):
+        self.key = key
+        self.destinatarios = destinatarios
+        self.corpo = corpo
+        self.severity = int(severity)
+        self.created_at = created_at or time.time()
+        self.on_sent = on_sent
+        self.kind = kind
+        self.anexos = anexos or []
+        self.enqueued_at = None
+
+    def send(self, sender):
+        """Envia com sender(destinatarios, corpo), repassando os anexos apenas quando existem."""
+        if self.anexos:
+            sender(self.destinatarios, self.corpo, self.anexos)
+        else:
+            sender(self.destinatarios, self.corpo)
+
+
+class DispatchScheduler:
+    """
+    Envia mensagens por ordem de severidade, com cotas de threads por severidade.
+
+    Cada severidade tem sua fila (em ordem de chegada) e as threads sempre
+    pegam a mensagem da maior severidade cuja cota ainda não foi atingida. As
+    severidades menores não usam a última thread livre, então um acúmulo de
+    avisos nunca deixa um alerta urgente esperando por uma thread.
+
+    Uma mensagem pendente é descartada quando chega outra para a mesma chave
+    (o conteúdo mais recente já inclui os alertas anteriores); ela mantém a
+    posição e o horário de entrada da mensagem substituída. Mensagens cuja
+    chave está sendo enviada no momento são recusadas por submit, e os alertas
+    continuam pendentes para o próximo flush.
+
+    Para cada envio são registrados o tempo de espera na fila
+    (dispatch_queue_wait_sev<N>) e o tempo desde o alerta até o envio
+    (dispatch_time_to_send_sev<N>).
+    """
+
+    def __init__(self, sender, workers=None, quotas=None):
+        """
+        Args:
+            sender (callable): sender(destinatarios, corpo_html), ex: enviar_email
+            workers (int, optional): Threads de envio; padrão DISPATCH_WORKERS
+            quotas (dict, optional): {severidade: envios simultâneos}; padrão DISPATCH_QUOTAS
+        """
+        self.sender = sender
+        self.workers = workers or DISPATCH_WORKERS
+        self.quotas = quotas or parse_quotas(DISPATCH_QUOTAS, self.workers)
+        self._queues = {}          # {severidade: OrderedDict(key -> Message)}
+        self._running = {}         # {severidade: envios em andamento}
+        self._in_flight = set()
+        self._waits = {}           # {severidade: deque dos últimos tempos de espera}
+        self._stats = {"enviadas": 0, "substituidas": 0, "falhas": 0}
+        self._cond = threading.Condition()
+        self._closed = False
+        self._threads = [threading.Thread(target=self._run, daemon=True) for _ in range(self.workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, message):
+        """
+        Agenda uma mensagem.
+
+        Returns:
+            bool: False se já há um envio em andamento para a mesma chave
+        """
+        with self._cond:
+            if message.key in self._in_flight:
+                return False
+            message.enqueued_at = time.monotonic()
+            for nivel, fila in self._queues.items():
+                anterior = fila.get(message.key)
+                if anterior is None:
+                    continue
+                message.enqueued_at = anterior.enqueued_at
+                message.created_at = min(message.created_at, anterior.created_at)
+                self._stats["substituidas"] += 1
+                if nivel == message.severity:
+                    fila[message.key] = message
+                    return True
+                del fila[message.key]
+                break
+            self._queues.setdefault(message.severity, OrderedDict())[message.key] = message
+            self._cond.notify()
+            return True
+
+    def _next(self):
+        """Mensagem da maior severidade com cota livre (chamado com o lock)."""
+        ocupadas = sum(self._running.values())
+        maior = max(self.quotas)
+        for nivel in sorted(self._queues, reverse=True):
+            fila = self._queues[nivel]
+            if nivel < maior and self.workers > 1 and ocupadas >= self.workers - 1:
+                continue
+            if fila and self._running.get(nivel, 0) < self.quotas.get(nivel, 1):
+                _, message = fila.popitem(last=False)
+                return message
+        return None
+
+    def _run(self):
+        while True:
+            with self._cond:
+                message = self._next()
+                while message is None:
+                    if self._closed:
+                        return
+                    self._cond.wait()
+                    message = self._next()
+                nivel = message.severity
+                self._running[nivel] = self._running.get(nivel, 0) + 1
+                self._in_flight.add(message.key)
+
+            wait = time.monotonic() - message.enqueued_at
+            record(f"dispatch_queue_wait_sev{nivel}", wait)
+            try:
+                start = time.perf_counter()
+                message.send(self.sender)
+                record(f"dispatch_send_sev{nivel}", time.perf_counter() - start)
+                record(f"dispatch_time_to_send_sev{nivel}", time.time() - message.created_at)
+                if message.on_sent is not None:
+                    message.on_sent()
+                resultado = "enviadas"
+            except Exception as e:
+                # Os alertas continuam pendentes e entram de novo no próximo flush
+                print(f"Erro ao enviar mensagem para {message.destinatarios}: {e}")
+                resultado = "falhas"
+
+            with self._cond:
+                self._running[nivel] -= 1
+                self._in_flight.discard(message.key)
+                self._stats[resultado] += 1
+                self._waits.setdefault(nivel, deque(maxlen=1000)).append(wait)
+                self._cond.notify_all()
+
+    def pending(self):
+        with self._cond:
+            return sum(len(fila) for fila in self._queues.values()) + len(self._in_flight)
+
+    def join(self, timeout=None):
+        """Espera até todas as mensagens agendadas serem enviadas (ou falharem)."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while any(self._queues.values()) or self._in_flight:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def close(self, timeout=None):
+        """Envia o que estiver pendente e encerra as threads."""
+        self.join(timeout)
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def stats(self):
+        """
+        Contadores e tempos de espera na fila (p50/p95/máximo dos últimos envios) por severidade.
+        """
+        with self._cond:
+            resumo = dict(self._stats)
+            waits = {nivel: np.array(valores) for nivel, valores in self._waits.items() if valores}
+        resumo["espera"] = {
+            nivel: {"p50": float(np.percentile(v, 50)), "p95": float(np.percentile(v, 95)),
+                    "max": float(v.max())}
+            for nivel, v in sorted(waits.items(), reverse=True)
+        }
+        return resumo
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
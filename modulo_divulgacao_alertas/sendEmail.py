@@ -1,30 +1,52 @@
 import smtplib
 import email.message
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from email.mime.image import MIMEImage
 from dotenv import load_dotenv
 import os
 
-def enviar_email(destinatarios, corpo_email=None, email_remetente = ""):  
+from instrumentation import timed, count
+
+@timed()
+def enviar_email(destinatarios, corpo_email=None, email_remetente = "", anexos=None):  
     load_dotenv() 
     
-    msg = email.message.Message()
+    # Com anexos (miniaturas), cada imagem é referenciada no HTML por cid:<nome do arquivo>
+    anexos = [caminho for caminho in anexos or [] if os.path.exists(caminho)]
+    if anexos:
+        msg = MIMEMultipart('related')
+        msg.attach(MIMEText(corpo_email, 'html', 'utf-8'))
+        for caminho in anexos:
+            with open(caminho, 'rb') as f:
+                imagem = MIMEImage(f.read())
+            imagem.add_header('Content-ID', f"<{os.path.basename(caminho)}>")
+            imagem.add_header('Content-Disposition', 'inline', filename=os.path.basename(caminho))
+            msg.attach(imagem)
+    else:
+        msg = email.message.Message()
+        msg.add_header('Content-Type', 'text/html')
+        msg.set_payload(corpo_email)
     msg['Subject'] = "Alerta Meteorológico"
     msg['From'] = email_remetente
     msg['To'] = ", ".join(destinatarios)
 
     password = os.getenv("EMAIL_APP_PASSWORD")
-
-    msg.add_header('Content-Type', 'text/html')
-    msg.set_payload(corpo_email)
+    # Serializada uma única vez (com anexos, a mensagem inclui as imagens em base64)
+    conteudo = msg.as_string().encode('utf-8')
 
     s = smtplib.SMTP('smtp.gmail.com:587')
     s.starttls()
     s.login(msg['From'], password)
-    s.sendmail(msg['From'], destinatarios, msg.as_string().encode('utf-8'))
+    s.sendmail(msg['From'], destinatarios, conteudo)
     s.quit()
+    count("recipients", len(destinatarios))
+    count("bytes_sent", len(conteudo))
     print('Emails enviados com sucesso!')
 
-# Exemplo de uso
-destinatarios = [
-]
+if __name__ == "__main__":
+    # Exemplo de uso (executado apenas com python3 sendEmail.py, nunca na importação)
+    destinatarios = [
+    ]
 
-enviar_email(destinatarios, "teste de envio de email", "Insira aqui o email do remetente")
+    enviar_email(destinatarios, "teste de envio de email", "Insira aqui o email do remetente")
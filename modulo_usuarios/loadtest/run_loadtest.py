@@ -0,0 +1,316 @@
+import os
+import sys
+import json
+import time
+import logging
+import random
+import shutil
+import argparse
+import tempfile
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import requests
+from werkzeug.serving import make_server
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+BASELINES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines.json")
+DEFAULT_TOLERANCE = 0.25
+# Taxa de erros aceita antes de falhar, independente da baseline
+MAX_ERROR_RATE = 0.01
+
+# Requisições por segundo de cada operação
+DEFAULT_RATES = {"create": 20, "list": 1, "update": 50}
+CITIES = ["Goiânia", "Anápolis", "Rio Verde", "Aparecida de Goiânia", "Luziânia", None]
+
+
+def start_app(db_url, pool_size, max_overflow, pool_timeout):
+    """
+    Sobe a API de usuários em uma thread, com o pool de conexões configurado.
+
+    Returns:
+        tuple: (app, servidor, URL base)
+    """
+    os.environ["DB_URL"] = db_url
+    os.environ["DB_POOL_SIZE"] = str(pool_size)
+    os.environ["DB_MAX_OVERFLOW"] = str(max_overflow)
+    os.environ["DB_POOL_TIMEOUT"] = str(pool_timeout)
+    from src import create_app
+
+    app = create_app()
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return app, server, f"http://127.0.0.1:{server.server_port}"
+
+
+def seed_users(app, n, seed=0):
+    """Grava n inscritos diretamente no banco (em lotes) e retorna seus ids."""
+    from src import db
+    from src.models import User
+
+    rng = random.Random(seed)
+    with app.app_context():
+        for start in range(0, n, 5000):
+            rows = []
+            for i in range(start, min(n, start + 5000)):
+                city = rng.choice(CITIES)
+                rows.append({
+                    "username": f"seed{i}", "email": f"seed{i}@example.com", "alert": "temperature",
+                    "city": city,
+                    "latitude": rng.uniform(-19.5, -12.4) if city else None,
+                    "longitude": rng.uniform(-53.2, -45.9) if city else None
+                })
+            db.session.execute(db.insert(User), rows)
+            db.session.commit()
+        return [user_id for (user_id,) in db.session.query(User.id).all()]
+
+
+class PoolMonitor:
+    """Amostra o pool de conexões do SQLAlchemy durante o teste."""
+
+    def __init__(self, app, capacity, interval=0.02):
+        from src import db
+
+        with app.app_context():
+            self.pool = db.engine.pool
+        self.capacity = capacity
+        self.interval = interval
+        self.samples = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.samples.append(self.pool.checkedout())
+            time.sleep(self.interval)
+
+    def __enter__(self):
+        if hasattr(self.pool, "checkedout"):
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        return False
+
+    def summary(self):
+        if not self.samples:
+            return {"capacity": self.capacity, "max_checked_out": None, "saturated_fraction": None}
+        samples = np.array(self.samples)
+        return {
+            "capacity": self.capacity,
+            "max_checked_out": int(samples.max()),
+            "mean_checked_out": float(samples.mean()),
+            # Fração do tempo com todas as conexões em uso (novas requisições esperam pool_timeout)
+            "saturated_fraction": float((samples >= self.capacity).mean())
+        }
+
+
+def build_operations(base_url, user_ids, seed=0):
+    """
+    Requisições de cada operação: {nome: função(session) -> response}.
+    """
+    rng = random.Random(seed)
+    counter = itertools.count()
+
+    def create(session):
+        i = next(counter)
+        return session.post(f"{base_url}/users", json={
+            "username": f"load{i}", "email": f"load{i}@example.com", "alert": "temperature",
+            "city": rng.choice(CITIES)
+        }, timeout=60)
+
+    def list_all(session):
+        return session.get(f"{base_url}/users/all", timeout=60)
+
+    def update(session):
+        return session.put(f"{base_url}/users/{rng.choice(user_ids)}",
+                           json={"city": rng.choice(CITIES)}, timeout=60)
+
+    return {"create": create, "list": list_all, "update": update}
+
+
+def drive(operations, rates, duration, concurrency):
+    """
+    Dispara as operações em taxa fixa (carga aberta) durante `duration` segundos.
+
+    A latência é medida a partir do horário agendado de cada requisição, e não
+    do envio, para que a espera por uma thread livre quando o servidor não
+    acompanha a taxa também apareça nos percentis.
+
+    Returns:
+        dict: {operação: [(latência em segundos, status ou None em caso de exceção)]}
+    """
+    local = threading.local()
+    results = {name: [] for name in rates}
+    lock = threading.Lock()
+
+    def call(name, scheduled):
+        session = getattr(local, "session", None)
+        if session is None:
+            session = local.session = requests.Session()
+        try:
+            status = operations[name](session).status_code
+        except requests.RequestException:
+            status = None
+        with lock:
+            results[name].append((time.perf_counter() - scheduled, status))
+
+    # Agenda combinada de todas as operações, ordenada pelo horário de envio
+    schedule = sorted(
+        (k / rate, name) for name, rate in rates.items() if rate > 0
+        for k in range(int(duration * rate)))
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for offset, name in schedule:
+            delay = start + offset - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            executor.submit(call, name, start + offset)
+    return results, time.perf_counter() - start
+
+
+def summarize(results, elapsed):
+    summary = {}
+    for name, samples in results.items():
+        if not samples:
+            continue
+        latencies = np.array([latency for latency, _ in samples])
+        errors = sum(1 for _, status in samples if status is None or status >= 400)
+        summary[name] = {
+            "requests": len(samples),
+            "throughput": len(samples) / elapsed,
+            "error_rate": errors / len(samples),
+            "p50": float(np.percentile(latencies, 50)),
+            "p95": float(np.percentile(latencies, 95)),
+            "p99": float(np.percentile(latencies, 99))
+        }
+    return summary
+
+
+def compare_with_baselines(summary, baselines, tolerance):
+    """Retorna as operações cujo p95/p99 excedeu a baseline ou com erros acima de MAX_ERROR_RATE."""
+    regressions = []
+    for name, result in summary.items():
+        line = (f"{name:<8} {result['throughput']:7.1f} req/s   p50 {result['p50'] * 1000:8.1f} ms   "
+                f"p95 {result['p95'] * 1000:8.1f} ms   p99 {result['p99'] * 1000:8.1f} ms   "
+                f"erros {result['error_rate']:6.2%}")
+        status = "ok"
+        if result["error_rate"] > MAX_ERROR_RATE:
+            status = "ERROS"
+        baseline = baselines.get(name)
+        if baseline is None:
+            line += "   (sem baseline)"
+        else:
+            ratio = max(result["p95"] / baseline["p95"], result["p99"] / baseline["p99"])
+            line += f"   {ratio:5.2f}x baseline"
+            if ratio > 1 + tolerance:
+                status = "REGRESSÃO"
+        print(f"{line} {status}")
+        if status != "ok":
+            regressions.append(name)
+    return regressions
+
+
+def run(subscribers=10000, rates=None, duration=30, concurrency=32, db_url=None, pool_size=5,
+        max_overflow=10, pool_timeout=30, tolerance=DEFAULT_TOLERANCE, update_baselines=False, output=None):
+    """
+    Executa o teste de carga completo.
+
+    Returns:
+        int: Código de saída (1 se houver regressão ou erros acima do limite)
+    """
+    rates = rates or DEFAULT_RATES
+    workdir = None
+    if db_url is None:
+        workdir = tempfile.mkdtemp(prefix="cempa_loadtest_")
+        db_url = f"sqlite:///{os.path.join(workdir, 'users.db')}"
+
+    app, server, base_url = start_app(db_url, pool_size, max_overflow, pool_timeout)
+    try:
+        print(f"Gravando {subscribers} inscritos em {db_url}...")
+        user_ids = seed_users(app, subscribers)
+        operations = build_operations(base_url, user_ids)
+        print(f"Carga por {duration} s: " + ", ".join(f"{name} {rate} req/s" for name, rate in rates.items()))
+        with PoolMonitor(app, pool_size + max_overflow) as monitor:
+            results, elapsed = drive(operations, rates, duration, concurrency)
+    finally:
+        server.shutdown()
+        if workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    summary = summarize(results, elapsed)
+    pool = monitor.summary()
+
+    # As baselines só valem para os parâmetros com que foram gravadas
+    params = {"subscribers": subscribers, "rates": rates, "duration": duration}
+    stored = {}
+    if os.path.exists(BASELINES_PATH):
+        with open(BASELINES_PATH) as f:
+            stored = json.load(f)
+    baselines = stored.get("operations", {}) if stored.get("params") == params else {}
+
+    print(f"\n{'='*50}\nResultados ({subscribers} inscritos, {elapsed:.1f} s)\n{'='*50}")
+    if stored and not baselines and not update_baselines:
+        print(f"AVISO: baselines gravadas com outros parâmetros ({stored.get('params')}), comparação ignorada")
+    regressions = compare_with_baselines(summary, baselines, tolerance)
+    if pool["max_checked_out"] is not None:
+        print(f"pool     {pool['max_checked_out']}/{pool['capacity']} conexões no pico, "
+              f"saturado {pool['saturated_fraction']:.1%} do tempo")
+
+    if output:
+        with open(output, "w") as f:
+            json.dump({"subscribers": subscribers, "rates": rates, "operations": summary, "pool": pool},
+                      f, indent=2)
+
+    if update_baselines:
+        baselines.update({name: {"p95": result["p95"], "p99": result["p99"]}
+                          for name, result in summary.items()})
+        with open(BASELINES_PATH, "w") as f:
+            json.dump({"params": params, "operations": baselines}, f, indent=2, sort_keys=True)
+        print(f"\nBaselines atualizadas em {BASELINES_PATH}")
+        return 0
+
+    if regressions:
+        print(f"\nRegressões detectadas: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+def parse_rates(values):
+    """Converte ["create=20", "update=50"] em {"create": 20.0, "update": 50.0}."""
+    rates = dict(DEFAULT_RATES)
+    for value in values or []:
+        name, rate = value.split("=")
+        if name not in DEFAULT_RATES:
+            raise argparse.ArgumentTypeError(f"Operação desconhecida: {name}")
+        rates[name] = float(rate)
+    return rates
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Teste de carga da API de usuários")
+    parser.add_argument("--subscribers", type=int, default=10000, help="Inscritos gravados antes do teste")
+    parser.add_argument("--rate", nargs="*", metavar="OP=REQ_S",
+                        help=f"Taxa por operação (create, list, update); padrão {DEFAULT_RATES}")
+    parser.add_argument("--duration", type=float, default=30, help="Duração da carga em segundos")
+    parser.add_argument("--concurrency", type=int, default=32, help="Requisições simultâneas no cliente")
+    parser.add_argument("--db-url", help="Banco vazio a usar, ex: postgresql://... (padrão: SQLite temporário)")
+    parser.add_argument("--pool-size", type=int, default=5)
+    parser.add_argument("--max-overflow", type=int, default=10)
+    parser.add_argument("--pool-timeout", type=float, default=30)
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="Piora relativa do p95/p99 tolerada antes de falhar (0.25 = 25%%)")
+    parser.add_argument("--update-baselines", action="store_true", help="Grava p95/p99 como baseline")
+    parser.add_argument("--output", help="Salva os resultados em JSON")
+    args = parser.parse_args()
+
+    sys.exit(run(args.subscribers, parse_rates(args.rate), args.duration, args.concurrency, args.db_url,
+                 args.pool_size, args.max_overflow, args.pool_timeout, args.tolerance,
+                 args.update_baselines, args.output))
@@ -8,6 +8,8 @@ class User(db.Model):
     email = db.Column(db.String(120), unique=True, nullable=False)
     alert = db.Column(db.String(120), nullable=True)
     city = db.Column(db.String(120), nullable=True)
+    latitude = db.Column(db.Float, nullable=True)
+    longitude = db.Column(db.Float, nullable=True)
 
     def json(self):
         return {
@@ -15,5 +17,29 @@ class User(db.Model):
             'username': self.username,
             'email': self.email,
             'alert': self.alert,
-            'city': self.city
-        }
\ No newline at end of file
+            'city': self.city,
+            'latitude': self.latitude,
+            'longitude': self.longitude
+        }
+
+
+class UserThreshold(db.Model):
+    __tablename__ = 'user_thresholds'
+    __table_args__ = (db.UniqueConstraint('user_id', 'variable', 'limit_type'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False, index=True)
+    variable = db.Column(db.String(40), nullable=False)
+    limit_type = db.Column(db.String(3), nullable=False)
+    value = db.Column(db.Float, nullable=False)
+
+    user = db.relationship('User', backref=db.backref('thresholds', cascade='all, delete-orphan'))
+
+    def json(self):
+        return {
+            'id': self.id,
+            'user_id': self.user_id,
+            'variable': self.variable,
+            'limit_type': self.limit_type,
+            'value': self.value
+        }
@@ -1,5 +1,5 @@
 from flask import Blueprint, render_template_string, request, jsonify, make_response
-from .services import UserService
+from .services import UserService, ThresholdService
 from .form import Form
 
 bp = Blueprint('routes', __name__)
@@ -36,6 +36,48 @@ def get_users():
     except Exception as e:
         return make_response(jsonify({'error': str(e)}), 400)
 
+@bp.route('/users/points', methods=['GET'])
+def get_user_points():
+    try:
+        users = UserService.get_with_points()
+
+        if not users:
+            return make_response(jsonify({'message': 'no points found'}), 404)
+
+        return make_response(jsonify([u.json() for u in users]), 200)
+    except Exception as e:
+        return make_response(jsonify({'error': str(e)}), 400)
+
+@bp.route('/users/thresholds', methods=['GET'])
+def get_all_thresholds():
+    try:
+        thresholds = ThresholdService.get_all_with_users()
+
+        if not thresholds:
+            return make_response(jsonify({'message': 'no thresholds found'}), 404)
+
+        return make_response(jsonify(thresholds), 200)
+    except Exception as e:
+        return make_response(jsonify({'error': str(e)}), 400)
+
+@bp.route('/users/<int:id>/thresholds', methods=['GET'])
+def get_user_thresholds(id):
+    try:
+        thresholds = ThresholdService.get_for_user(id)
+        return make_response(jsonify([t.json() for t in thresholds]), 200)
+    except Exception as e:
+        return make_response(jsonify({'error': str(e)}), 400)
+
+@bp.route('/users/<int:id>/thresholds', methods=['PUT'])
+def set_user_thresholds(id):
+    try:
+        thresholds = ThresholdService.set_for_user(id, request.get_json())
+        if thresholds is None:
+            return make_response(jsonify({'error': 'user not found'}), 404)
+        return make_response(jsonify([t.json() for t in thresholds]), 200)
+    except Exception as e:
+        return make_response(jsonify({'error': str(e)}), 400)
+
 @bp.route('/users/<int:id>', methods=['DELETE'])
 def delete_user(id):
     try:
@@ -1,4 +1,4 @@
-from .models import User
+from .models import User, UserThreshold
 from . import db
 
 class UserService:
@@ -13,6 +13,10 @@ class UserService:
     def get_all():
         return User.query.all()
 
+    @staticmethod
+    def get_with_points():
+        return User.query.filter(User.latitude.isnot(None), User.longitude.isnot(None)).all()
+
     @staticmethod
     def delete(user_id):
         user = User.query.get(user_id)
@@ -31,3 +35,52 @@ class UserService:
             db.session.commit()
             return user
         return None
+
+
+class ThresholdService:
+    # Variáveis avaliadas pelo módulo de alertas (extremos por cidade e variáveis derivadas)
+    VARIABLES = ('temperature', 'umidade', 'indice_calor', 'ponto_orvalho', 'risco_fogo')
+    LIMIT_TYPES = ('max', 'min')
+
+    @staticmethod
+    def get_for_user(user_id):
+        return UserThreshold.query.filter_by(user_id=user_id).all()
+
+    @staticmethod
+    def set_for_user(user_id, data):
+        """
+        Substitui os limiares do usuário.
+
+        data: {"temperature": {"max": 32}, "umidade": {"min": 25}}
+        """
+        user = User.query.get(user_id)
+        if not user:
+            return None
+
+        thresholds = []
+        if not isinstance(data, dict):
+            raise ValueError("thresholds must be an object")
+        for variable, limits in data.items():
+            if variable not in ThresholdService.VARIABLES:
+                raise ValueError(f"invalid variable: {variable}")
+            if not isinstance(limits, dict):
+                raise ValueError(f"invalid limits for {variable}")
+            for limit_type, value in limits.items():
+                if limit_type not in ThresholdService.LIMIT_TYPES:
+                    raise ValueError(f"invalid limit type: {limit_type}")
+                thresholds.append(UserThreshold(user_id=user_id, variable=variable,
+                                                limit_type=limit_type, value=float(value)))
+
+        UserThreshold.query.filter_by(user_id=user_id).delete()
+        db.session.add_all(thresholds)
+        db.session.commit()
+        return ThresholdService.get_for_user(user_id)
+
+    @staticmethod
+    def get_all_with_users():
+        """Todos os limiares com o e-mail e a cidade do usuário (usado pelo módulo de alertas)."""
+        rows = (db.session.query(UserThreshold, User.email, User.city)
+                .join(User, UserThreshold.user_id == User.id)
+                .filter(User.city.isnot(None))
+                .all())
+        return [dict(threshold.json(), email=email, city=city) for threshold, email, city in rows]